@@ -0,0 +1,122 @@
+"""
+Manifest di checkpoint per l'elaborazione batch
+File JSONL accanto all'output con una riga per documento elaborato (percorso,
+dimensione, data di modifica, hash SHA-256 e stato). Le righe vengono solo
+aggiunte: in caso di più righe per lo stesso file vale l'ultima. Permette a
+un'esecuzione con --resume di saltare i documenti già elaborati con successo.
+Le righe vengono scritte nello stesso flush della riga esportata del documento,
+dopo di essa: un'interruzione tra le due scritture fa al più rielaborare il
+documento, e la riga doppia viene scartata dall'esportazione finale.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'errore'
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Calcola lo SHA-256 di un file leggendolo a blocchi"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BatchManifest:
+    """Registro append-only dello stato di ogni documento di un batch"""
+
+    def __init__(self, output_file, append=False):
+        self.path = Path(f"{output_file}.manifest.jsonl")
+        self.entries = {}
+        if append:
+            self.load()
+        self._pending = []
+        # Hash già calcolati da is_done: (percorso, dimensione, mtime) -> SHA-256
+        self._digests = {}
+        self._file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+
+    @staticmethod
+    def key(file_path):
+        """Chiave del documento nel manifest (percorso assoluto)"""
+        return str(Path(file_path).resolve())
+
+    def load(self):
+        """Legge il manifest esistente; per ogni file vale l'ultima riga"""
+        if not self.path.exists():
+            return
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Ultima riga troncata da un'interruzione
+                    continue
+                self.entries[entry['path']] = entry
+
+    def is_done(self, file_path):
+        """True se il file è già stato elaborato con successo e non è cambiato
+        (False se il file non esiste più: spostato o cancellato dopo essere stato visto)"""
+        entry = self.entries.get(self.key(file_path))
+        if not entry or entry.get('status') != STATUS_OK:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        if stat.st_size != entry.get('size'):
+            return False
+        if stat.st_mtime == entry.get('mtime'):
+            return True
+        # Data di modifica diversa: il file è invariato solo se l'hash coincide
+        return self.sha256(file_path, stat) == entry.get('sha256')
+
+    def sha256(self, file_path, stat):
+        """Hash del file, calcolato una sola volta per documento (finché non cambia)"""
+        version = (self.key(file_path), stat.st_size, stat.st_mtime)
+        digest = self._digests.get(version)
+        if digest is None:
+            digest = self._digests[version] = file_sha256(file_path)
+        return digest
+
+    def record(self, file_path, status, error=None):
+        """Aggiunge lo stato di un documento (scritto su disco al prossimo flush) e
+        restituisce la voce registrata. Un file spostato o cancellato dopo la lettura
+        viene registrato come errore: senza file non si può verificare né riprendere"""
+        try:
+            stat = os.stat(file_path)
+            size, mtime, digest = stat.st_size, stat.st_mtime, self.sha256(file_path, stat)
+        except OSError as e:
+            size = mtime = digest = None
+            status, error = STATUS_ERROR, error or f"File non più disponibile: {e}"
+        entry = {
+            'path': self.key(file_path),
+            'size': size,
+            'mtime': mtime,
+            'sha256': digest,
+            'status': status,
+            'error': error,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.entries[entry['path']] = entry
+        self._digests.pop((entry['path'], entry['size'], entry['mtime']), None)
+        self._pending.append(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    def flush(self):
+        """Scrive su disco le righe in sospeso"""
+        if self._file.closed or not self._pending:
+            return
+        self._file.writelines(self._pending)
+        self._pending = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Scrive le righe in sospeso e chiude il manifest"""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
@@ -5,19 +5,59 @@ Elabora automaticamente tutti i documenti in una cartella
 """
 
 import os
-import sys
+import argparse
+import signal
+from collections import deque
 from pathlib import Path
-import pandas as pd
-import PyPDF2
-from PIL import Image
-import pytesseract
-import re
 from datetime import datetime
+# pandas, PyPDF2, PIL, numpy e le regole di estrazione vengono importati nelle fasi che
+# li usano: --help, una cartella vuota o un'esecuzione da cron senza documenti partono subito
+from ocr_engine import BACKENDS
+from metrics import stage_metrics, STAGE_EXPORT
+from profiling import document_profiler, DEFAULT_THRESHOLD, DEFAULT_TOP
+from streaming_export import StreamingExporter
+from batch_manifest import BatchManifest, STATUS_OK, STATUS_ERROR
+from document_discovery import iter_documents, sniff_document_type
+from extraction_engine import ExtractionEngine, ExtractionPool, doc_label
+
+def is_supported_file(file_path):
+    """True se il file è un PDF o un'immagine supportata (dai magic bytes)"""
+    return sniff_document_type(file_path) is not None
 
 class BatchDocumentProcessor:
-    def __init__(self, input_folder, output_file):
+    def __init__(self, input_folder, output_file, workers=None, use_cache=True, stream=False,
+                 resume=False, recursive=False, show_rule_stats=False, triage=True,
+                 early_stop=False, preprocess=None, ocr_backend=None, id_layout=False, mrz=True,
+                 escalation=False, metrics=False, metrics_textfile=None, profile=False,
+                 profile_threshold=DEFAULT_THRESHOLD, profile_top=DEFAULT_TOP):
         self.input_folder = Path(input_folder)
         self.output_file = output_file
+        self.workers = workers or os.cpu_count() or 1
+        self.recursive = recursive
+        self.show_rule_stats = show_rule_stats
+        # Estrazione (triage, OCR, regole) delegata al motore senza interfaccia; con più
+        # worker ogni processo ne crea uno con le stesse opzioni
+        self.engine = ExtractionEngine(ocr_backend=ocr_backend, preprocess=preprocess,
+                                       id_layout=id_layout, mrz=mrz, escalation=escalation,
+                                       triage=triage, early_stop=early_stop, use_cache=use_cache)
+        self.escalation = escalation
+        # Tracce cProfile dei documenti più lenti della soglia (<output>.profiles/)
+        self.profile = profile
+        self.profile_threshold = profile_threshold
+        if profile:
+            document_profiler.configure(f"{output_file}.profiles", profile_threshold, profile_top)
+        # Tempi per fase di ogni documento (<output>.metrics.jsonl e .prom); servono
+        # anche al riepilogo delle tracce
+        self.metrics = metrics or bool(metrics_textfile) or profile
+        self.metrics_textfile = metrics_textfile or f"{output_file}.metrics.prom"
+        if self.metrics:
+            stage_metrics.enabled = True
+        # La ripresa richiede lo stream: le righe già elaborate restano nel JSONL
+        self.resume = resume
+        self.stream = stream or resume
+        self.exporter = None
+        self.manifest = None
+        self.skipped = 0
         self.all_data = []
         
     def process_all_documents(self):
@@ -26,209 +66,229 @@ class BatchDocumentProcessor:
             print(f"ERRORE: La cartella {self.input_folder} non esiste!")
             return
         
-        # Trova tutti i file PDF e immagini
-        files = []
-        for ext in ['*.pdf', '*.PDF', '*.jpg', '*.JPG', '*.jpeg', '*.JPEG', '*.png', '*.PNG']:
-            files.extend(self.input_folder.glob(ext))
-        
-        if not files:
-            print(f"Nessun documento trovato in {self.input_folder}")
+        # La cartella viene visitata man mano: l'estrazione parte col primo documento
+        # trovato e il totale si conosce solo alla fine
+        files = iter_documents(self.input_folder, recursive=self.recursive)
+        
+        print(f"Motore OCR: {self.engine.ocr_backend}")
+        if self.workers > 1:
+            print(f"Elaborazione parallela con {self.workers} processi\n")
+        
+        if self.stream:
+            self.manifest = BatchManifest(self.output_file, append=self.resume)
+            if self.resume:
+                files = self.skip_completed(files)
+            self.exporter = StreamingExporter(self.output_file, append=self.resume,
+                                              on_flush=self.manifest.flush)
+            print(f"Scrittura incrementale in: {self.exporter.jsonl_path}\n")
+        self.open_metrics_log(append=self.resume)
+        
+        print(f"Ricerca dei documenti in {self.input_folder}\n")
+        processed = 0
+        try:
+            results = self.engine.extract_many(self.sources(files), self.workers, ordered=True)
+            for processed, result in enumerate(results, 1):
+                print(f"[{processed}] Elaborazione: {result.path.name}")
+                self.handle_result(result)
+        finally:
+            if not processed and not self.skipped:
+                print(f"Nessun documento trovato in {self.input_folder}")
+            else:
+                print(f"\nTrovati {processed + self.skipped} documenti, {processed} elaborati")
+            if self.skipped:
+                print(f"Ripresa: {self.skipped} documenti già elaborati sono stati saltati")
+            # Esporta tutti i dati (anche se l'elaborazione è stata interrotta)
+            with stage_metrics.batch_stage(STAGE_EXPORT):
+                self.export_data()
+            self.print_rule_stats()
+            self.print_metrics()
+            self.print_profile()
+    
+    def open_metrics_log(self, append=False):
+        """Apre il log JSON lines dei tempi per documento, se le metriche sono attive"""
+        if self.metrics:
+            stage_metrics.open_log(f"{self.output_file}.metrics.jsonl", append=append)
+    
+    def print_metrics(self):
+        """Stampa i percentili per fase e scrive il file per Prometheus"""
+        if not self.metrics:
             return
-        
-        print(f"Trovati {len(files)} documenti da elaborare\n")
-        
-        for idx, file_path in enumerate(files, 1):
-            print(f"[{idx}/{len(files)}] Elaborazione: {file_path.name}")
-            try:
-                data = self.process_single_document(file_path)
-                data['Nome_File'] = file_path.name
-                data['Data_Elaborazione'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self.all_data.append(data)
-                print(f"  ✓ Completato\n")
-            except Exception as e:
-                print(f"  ✗ Errore: {str(e)}\n")
-        
-        # Esporta tutti i dati
-        self.export_data()
+        stage_metrics.close_log()
+        if stage_metrics.samples:
+            print("\nTempi per fase (p50/p95/p99):")
+            print(stage_metrics.format_table())
+            stage_metrics.write_prometheus(self.metrics_textfile)
+            print(f"✓ Tempi per documento: {self.output_file}.metrics.jsonl")
+            print(f"✓ Percentili per Prometheus: {self.metrics_textfile}")
     
-    def process_single_document(self, file_path):
-        """Elabora un singolo documento"""
-        # Estrae il testo
-        if file_path.suffix.lower() == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
+    def print_profile(self):
+        """Stampa le funzioni più costose su tutti i documenti e dove sono le tracce"""
+        if not self.profile or not document_profiler.documents:
+            return
+        print(f"\nFunzioni più costose su {document_profiler.documents} documenti (tempo proprio):")
+        print(document_profiler.format_table())
+        if document_profiler.saved:
+            print(f"✓ {document_profiler.saved} tracce di documenti oltre {self.profile_threshold:g}s "
+                  f"in: {document_profiler.folder}")
         else:
-            text = self.extract_text_from_image(file_path)
-        
-        data = {}
-        
-        # Determina il tipo di documento e estrae i dati appropriati
-        if self.is_visura_camerale(text):
-            data.update(self.parse_visura_camerale(text))
-            data['Tipo_File'] = 'Visura Camerale'
-        elif self.is_documento_identita(text):
-            data.update(self.parse_documento_identita(text))
-            data['Tipo_File'] = 'Documento Identità'
+            print(f"Nessun documento oltre {self.profile_threshold:g}s: nessuna traccia salvata")
+    
+    def print_rule_stats(self):
+        """Stampa percentuale di successo e tempi delle regole di estrazione per campo
+        e, con l'OCR a livelli, i documenti accettati a ogni livello"""
+        if not (self.show_rule_stats or self.escalation):
+            return
+        from rule_engine import rule_stats
+        from ocr_escalation import tier_stats
+        if self.show_rule_stats and rule_stats.fields:
+            print("\nStatistiche regole di estrazione:")
+            print(rule_stats.format_table())
+        if self.escalation and tier_stats.hits:
+            print("\nImmagini accettate per livello di OCR:")
+            print(tier_stats.format_table())
+    
+    def handle_result(self, result):
+        """Registra il risultato di un documento (ExtractionResult) e stampa l'esito"""
+        if result.error is None:
+            # Lo stato va registrato prima della riga: se la riga fa scattare il flush
+            # dello stream, la voce del manifest viene scritta nello stesso flush
+            entry = self.record_status(result.path, STATUS_OK)
+            row = self.row(result)
+            if entry is not None and entry['status'] != STATUS_OK:
+                # File sparito dopo la lettura: i dati estratti restano, con l'errore
+                row['Errore'] = entry['error']
+            self.record_row(row, BatchManifest.key(result.path))
+            if 'Errore' in row:
+                print(f"  ✗ Errore: {row['Errore']}\n")
+            else:
+                print(f"  ✓ Completato\n")
         else:
-            data['Tipo_File'] = 'Non Riconosciuto'
-        
+            self.record_status(result.path, STATUS_ERROR, result.error)
+            print(f"  ✗ Errore: {result.error}\n")
+    
+    def row(self, result):
+        """Riga esportata per un documento: campi estratti, tipo e confidenza, file e data"""
+        data = dict(result.data)
+        data['Tipo_File'] = doc_label(result.doc_type)
+        data['Confidenza_Tipo'] = round(result.confidence, 2)
+        data['Nome_File'] = result.path.name
+        data['Data_Elaborazione'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         return data
     
-    def extract_text_from_pdf(self, file_path):
-        """Estrae il testo da un file PDF"""
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+    def watch_folder(self, poll_interval=1.0, settle_time=1.0):
+        """Modalità continua: elabora i documenti man mano che arrivano nella cartella"""
+        if not self.input_folder.exists():
+            print(f"ERRORE: La cartella {self.input_folder} non esiste!")
+            return
+        
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from folder_watcher import FolderWatcher
+        
+        # Stream e manifest in append: un riavvio non rielabora i documenti già fatti
+        self.stream = True
+        self.manifest = BatchManifest(self.output_file, append=True)
+        self.exporter = StreamingExporter(self.output_file, append=True, flush_every=1,
+                                          on_flush=self.manifest.flush)
+        watcher = FolderWatcher(self.input_folder, is_supported_file,
+                                poll_interval=poll_interval, settle_time=settle_time,
+                                recursive=self.recursive)
+        pool = ExtractionPool(self.engine, self.workers)
+        
+        self.open_metrics_log(append=True)
+        print(f"In ascolto su {self.input_folder} ({watcher.mode}), output: {self.exporter.jsonl_path}")
+        print("Premi Ctrl+C per terminare\n")
+        
+        queued = deque()
+        in_flight = set()
+        processed = 0
+        try:
+            for ready in watcher.iter_ready():
+                queued.extend(Path(p) for p in ready if self.is_pending(p))
+                
+                # Concorrenza limitata: al massimo un task in corso per worker
+                while queued and len(in_flight) < self.workers:
+                    file_path = queued.popleft()
+                    in_flight.add(pool.submit((self.document_label(file_path), file_path)))
+                
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        in_flight.remove(future)
+                        result = pool.collect(future)
+                        processed += 1
+                        print(f"[{processed}] Elaborazione: {result.path.name}")
+                        self.handle_result(result)
+                    # Percentili aggiornati per chi legge il file durante l'ascolto
+                    if done and self.metrics:
+                        stage_metrics.write_prometheus(self.metrics_textfile)
+        except KeyboardInterrupt:
+            print("\nArresto in corso, attendo i documenti in elaborazione...")
+        finally:
+            pool.shutdown(wait=True)
+            for future in in_flight:
+                self.handle_result(pool.collect(future))
+            with stage_metrics.batch_stage(STAGE_EXPORT):
+                self.export_data()
+            self.print_rule_stats()
+            self.print_metrics()
+            self.print_profile()
     
-    def extract_text_from_image(self, file_path):
-        """Estrae il testo da un'immagine usando OCR"""
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image, lang='ita')
-        return text
+    def is_pending(self, file_path):
+        """True se il file va elaborato: esiste ancora (file temporanei rinominati,
+        cartella svuotata dopo l'elaborazione) e non è già fatto secondo il manifest"""
+        try:
+            return os.path.isfile(file_path) and not self.manifest.is_done(file_path)
+        except OSError:
+            return False
     
-    def is_visura_camerale(self, text):
-        """Determina se il testo è di una visura camerale"""
-        keywords = ['camera di commercio', 'visura', 'rea', 'partita iva', 'codice fiscale']
-        text_lower = text.lower()
-        return sum(1 for keyword in keywords if keyword in text_lower) >= 2
+    def skip_completed(self, files):
+        """Esclude i file già elaborati con successo secondo il manifest"""
+        for file_path in files:
+            if self.manifest.is_done(file_path):
+                self.skipped += 1
+            else:
+                yield file_path
     
-    def is_documento_identita(self, text):
-        """Determina se il testo è di un documento d'identità"""
-        keywords = ['carta identita', 'patente', 'passaporto', 'documento', 'rilasciato']
-        text_lower = text.lower()
-        return sum(1 for keyword in keywords if keyword in text_lower) >= 2
+    def record_status(self, file_path, status, error=None):
+        """Registra lo stato del documento nel manifest di checkpoint e restituisce la
+        voce registrata (None senza manifest)"""
+        if self.manifest is not None:
+            return self.manifest.record(file_path, status, error)
+        return None
     
-    def parse_visura_camerale(self, text):
-        """Analizza il testo della visura camerale ed estrae i dati"""
-        data = {}
-        
-        # Denominazione/Ragione Sociale
-        denominazione = self.extract_pattern(text, r"(?:Denominazione|Ragione sociale)[:\s]*([A-Z][^\n]+)")
-        if denominazione:
-            data['Denominazione'] = denominazione.strip()
-        
-        # Partita IVA
-        piva = self.extract_pattern(text, r"(?:P\.IVA|Partita IVA)[:\s]*(\d{11})")
-        if piva:
-            data['Partita_IVA'] = piva
-        
-        # Codice Fiscale
-        cf = self.extract_pattern(text, r"(?:Codice Fiscale|C\.F\.)[:\s]*([A-Z0-9]{11,16})")
-        if cf:
-            data['Codice_Fiscale'] = cf
-        
-        # Numero REA
-        rea = self.extract_pattern(text, r"(?:REA|N\. REA)[:\s]*([A-Z]{2}[\s\-]?\d+)")
-        if rea:
-            data['Numero_REA'] = rea
-        
-        # Forma giuridica
-        forma = self.extract_pattern(text, r"(?:Forma giuridica|Natura giuridica)[:\s]*([^\n]+)")
-        if forma:
-            data['Forma_Giuridica'] = forma.strip()
-        
-        # Sede legale
-        sede = self.extract_pattern(text, r"(?:Sede legale|Indirizzo)[:\s]*([^\n]+?)(?:\d{5})")
-        if sede:
-            data['Sede_Legale'] = sede.strip()
-        
-        # CAP
-        cap = self.extract_pattern(text, r"(\d{5})")
-        if cap:
-            data['CAP'] = cap
-        
-        # Comune
-        comune = self.extract_pattern(text, r"\d{5}\s+([A-Z][A-Za-z\s]+?)(?:\(|Provincia)")
-        if comune:
-            data['Comune'] = comune.strip()
-        
-        # Provincia
-        provincia = self.extract_pattern(text, r"(?:Provincia|\()\s*([A-Z]{2})\s*(?:\)|$)")
-        if provincia:
-            data['Provincia'] = provincia
-        
-        # Data costituzione
-        data_cost = self.extract_pattern(text, r"(?:Data costituzione|Costituita il)[:\s]*(\d{2}/\d{2}/\d{4})")
-        if data_cost:
-            data['Data_Costituzione'] = data_cost
-        
-        # Capitale sociale
-        capitale = self.extract_pattern(text, r"(?:Capitale sociale|Capitale)[:\s]*(?:€|EUR)?\s*([\d.,]+)")
-        if capitale:
-            data['Capitale_Sociale'] = capitale
-        
-        # Stato attività
-        stato = self.extract_pattern(text, r"(?:Stato)[:\s]*(ATTIVA|CESSATA|SOSPESA)")
-        if stato:
-            data['Stato_Attivita'] = stato
-        
-        return data
+    def record_row(self, data, key=None):
+        """Registra una riga: su stream se attivo (key: chiave del documento per scartare
+        le righe di elaborazioni precedenti), altrimenti in memoria"""
+        if self.exporter is not None:
+            self.exporter.write_row(data, key)
+        else:
+            self.all_data.append(data)
     
-    def parse_documento_identita(self, text):
-        """Analizza il testo del documento d'identità ed estrae i dati"""
-        data = {}
-        
-        # Nome
-        nome = self.extract_pattern(text, r"(?:Nome|NOME)[:\s]*([A-Z][a-z]+)")
-        if nome:
-            data['Nome'] = nome
-        
-        # Cognome
-        cognome = self.extract_pattern(text, r"(?:Cognome|COGNOME)[:\s]*([A-Z]+)")
-        if cognome:
-            data['Cognome'] = cognome
-        
-        # Data di nascita
-        data_nascita = self.extract_pattern(text, r"(?:Nat[oa]|Data di nascita)[:\s]*(?:il\s*)?(\d{2}[/\.-]\d{2}[/\.-]\d{4})")
-        if data_nascita:
-            data['Data_Nascita'] = data_nascita
-        
-        # Luogo di nascita
-        luogo_nascita = self.extract_pattern(text, r"(?:Nat[oa]\s*a|Luogo di nascita)[:\s]*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)")
-        if luogo_nascita:
-            data['Luogo_Nascita'] = luogo_nascita
-        
-        # Codice Fiscale
-        cf = self.extract_pattern(text, r"([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])")
-        if cf:
-            data['CF_Persona'] = cf
-        
-        # Numero documento
-        numero_doc = self.extract_pattern(text, r"(?:N\.|Numero|NUMERO)[:\s]*([A-Z]{2}\d{7}|[A-Z0-9]{6,9})")
-        if numero_doc:
-            data['Numero_Documento'] = numero_doc
-        
-        # Data rilascio
-        data_rilascio = self.extract_pattern(text, r"(?:Rilasciato|Emesso|Data di rilascio)[:\s]*(?:il\s*)?(\d{2}[/\.-]\d{2}[/\.-]\d{4})")
-        if data_rilascio:
-            data['Data_Rilascio'] = data_rilascio
-        
-        # Data scadenza
-        data_scadenza = self.extract_pattern(text, r"(?:Scadenza|Valida fino al)[:\s]*(\d{2}[/\.-]\d{2}[/\.-]\d{4})")
-        if data_scadenza:
-            data['Data_Scadenza'] = data_scadenza
-        
-        # Tipo documento
-        tipo_doc = self.extract_pattern(text, r"(CARTA D'IDENTITA|PATENTE|PASSAPORTO)")
-        if tipo_doc:
-            data['Tipo_Documento'] = tipo_doc
-        
-        return data
+    def sources(self, files):
+        """Elementi per il motore: (percorso relativo alla cartella, file)"""
+        for file_path in files:
+            yield self.document_label(file_path), file_path
     
-    def extract_pattern(self, text, pattern):
-        """Estrae un pattern dal testo usando regex"""
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-        return match.group(1) if match else None
+    def document_label(self, file_path):
+        """Percorso del documento relativo alla cartella di input (nome nelle metriche e
+        nelle tracce)"""
+        try:
+            return str(Path(file_path).relative_to(self.input_folder))
+        except ValueError:
+            return Path(file_path).name
     
     def export_data(self):
         """Esporta tutti i dati in Excel e CSV"""
+        if self.exporter is not None:
+            self.export_stream()
+            return
+        
         if not self.all_data:
             print("Nessun dato da esportare")
             return
         
         # Crea DataFrame
+        import pandas as pd
         df = pd.DataFrame(self.all_data)
         
         # Esporta in Excel
@@ -242,19 +302,125 @@ class BatchDocumentProcessor:
         print(f"✓ Dati esportati in CSV: {csv_file}")
         
         print(f"\nTotale documenti elaborati: {len(self.all_data)}")
+    
+    def export_stream(self):
+        """Chiude lo stream JSONL e genera Excel e CSV a partire da esso"""
+        total = self.exporter.close()
+        self.manifest.close()
+        if not total:
+            print("Nessun dato da esportare")
+            return
+        
+        print(f"\n✓ Dati esportati in JSONL: {self.exporter.jsonl_path}")
+        print(f"✓ Dati esportati in Excel: {self.exporter.excel_path}")
+        print(f"✓ Dati esportati in CSV: {self.exporter.csv_path}")
+        print(f"\nTotale documenti elaborati: {total}")
+
+def parse_args(argv=None):
+    """Legge gli argomenti da riga di comando"""
+    parser = argparse.ArgumentParser(
+        description="Elabora tutti i documenti presenti in una cartella",
+        epilog="Esempio:\n  python batch_processor.py ./documenti risultati --workers 4",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("cartella_documenti", help="Cartella contenente i documenti")
+    parser.add_argument("nome_output", nargs="?",
+                        default=f"risultati_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                        help="Nome dei file di output (senza estensione)")
+    parser.add_argument("--recursive", "-r", action="store_true",
+                        help="Cerca i documenti anche nelle sottocartelle")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Numero di processi paralleli (default: numero di core)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Scrive ogni riga su <output>.jsonl appena elaborata; Excel e CSV "
+                             "vengono generati dallo stream alla fine")
+    parser.add_argument("--resume", action="store_true",
+                        help="Riprende un'elaborazione interrotta con lo stesso nome_output: "
+                             "salta i documenti già elaborati con successo (implica --stream)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Modalità continua: resta in ascolto sulla cartella ed elabora "
+                             "i nuovi documenti appena arrivano (Ctrl+C per terminare)")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Intervallo di controllo in secondi per --watch senza watchdog (default: 1)")
+    parser.add_argument("--rule-stats", action="store_true",
+                        help="Stampa al termine successi e tempi per campo delle regole di estrazione")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disabilita la cache su disco del testo estratto")
+    parser.add_argument("--no-triage", action="store_true",
+                        help="Estrae sempre tutto il PDF, anche se dalla prima pagina "
+                             "non risulta una visura o un documento d'identità")
+    parser.add_argument("--preprocess", dest="preprocess", action="store_true", default=None,
+                        help="Ritaglia, riduce a 300 DPI, raddrizza e binarizza le immagini prima "
+                             "dell'OCR (default: DOC_EXTRACTOR_PREPROCESS, disattivato)")
+    parser.add_argument("--no-preprocess", dest="preprocess", action="store_false",
+                        help="Passa le immagini all'OCR solo convertite in scala di grigi, anche "
+                             "con DOC_EXTRACTOR_PREPROCESS=1")
+    parser.add_argument("--ocr-backend", choices=BACKENDS, default=None,
+                        help="Motore OCR: tesserocr (nel processo, senza avviare tesseract per ogni "
+                             "immagine), pytesseract, oppure auto (default: DOC_EXTRACTOR_OCR_BACKEND "
+                             "o auto)")
+    parser.add_argument("--id-layout", action="store_true",
+                        help="Legge le foto di CIE, carta d'identità cartacea e patente a zone "
+                             "(OCR di ogni campo con PSM e caratteri ammessi); se il formato "
+                             "non è riconosciuto usa l'OCR della pagina intera")
+    parser.add_argument("--no-mrz", action="store_true",
+                        help="Non cerca la MRZ di passaporti e CIE: le foto vengono sempre "
+                             "lette per intero")
+    parser.add_argument("--ocr-escalation", action="store_true",
+                        help="OCR delle immagini a livelli: lettura rapida a 200 DPI, riletta "
+                             "(risoluzione standard, altro PSM e, con --preprocess, 400 DPI) "
+                             "solo se codice fiscale, partita IVA o date non superano i "
+                             "controlli; a fine elaborazione stampa i documenti accettati per "
+                             "livello")
+    parser.add_argument("--early-stop", action="store_true",
+                        help="Legge le visure solo fino a quando i campi usati dal template "
+                             "(denominazione, P.IVA, sede, ...) sono stati trovati")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Misura i tempi per fase (lettura, testo, OCR, classificazione, "
+                             "parsing, esportazione): una riga JSON per documento in "
+                             "<output>.metrics.jsonl, percentili p50/p95/p99 a fine elaborazione "
+                             "e in <output>.metrics.prom (textfile di Prometheus)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Esegue ogni documento sotto cProfile: i documenti oltre "
+                             "--profile-threshold secondi vengono salvati in <output>.profiles/ "
+                             "(traccia .prof e riepilogo .txt con i tempi per fase); a fine "
+                             "elaborazione stampa le funzioni più costose (implica --metrics)")
+    parser.add_argument("--profile-threshold", type=float, default=DEFAULT_THRESHOLD, metavar="SECONDI",
+                        help=f"Tempo oltre cui la traccia di un documento viene salvata "
+                             f"(default: {DEFAULT_THRESHOLD:g}; 0 le salva tutte)")
+    parser.add_argument("--profile-top", type=int, default=DEFAULT_TOP, metavar="N",
+                        help=f"Funzioni nella tabella finale e nei riepiloghi (default: {DEFAULT_TOP})")
+    parser.add_argument("--metrics-textfile", metavar="FILE",
+                        help="Percorso del file per Prometheus (es. nella cartella del textfile "
+                             "collector di node_exporter); implica --metrics")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers deve essere almeno 1")
+    return args
 
 def main():
-    if len(sys.argv) < 2:
-        print("Uso: python batch_processor.py <cartella_documenti> [nome_output]")
-        print("\nEsempio:")
-        print("  python batch_processor.py ./documenti risultati")
-        sys.exit(1)
-    
-    input_folder = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else f"risultati_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    args = parse_args()
     
-    processor = BatchDocumentProcessor(input_folder, output_file)
-    processor.process_all_documents()
+    processor = BatchDocumentProcessor(args.cartella_documenti, args.nome_output,
+                                       workers=args.workers, use_cache=not args.no_cache,
+                                       stream=args.stream, resume=args.resume,
+                                       recursive=args.recursive, show_rule_stats=args.rule_stats,
+                                       triage=not args.no_triage, early_stop=args.early_stop,
+                                       preprocess=args.preprocess,
+                                       ocr_backend=args.ocr_backend,
+                                       id_layout=args.id_layout, mrz=not args.no_mrz,
+                                       escalation=args.ocr_escalation,
+                                       metrics=args.metrics,
+                                       metrics_textfile=args.metrics_textfile,
+                                       profile=args.profile,
+                                       profile_threshold=args.profile_threshold,
+                                       profile_top=args.profile_top)
+    if args.watch:
+        # Arresto pulito anche con SIGTERM (systemd, docker stop)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        processor.watch_folder(poll_interval=args.poll_interval)
+    else:
+        processor.process_all_documents()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,184 @@
+"""
+Benchmark della lettura a zone dei documenti d'identità
+Disegna carte sintetiche per ogni formato (CIE fronte e retro, carta cartacea,
+patente) con i valori nelle zone previste e la MRZ sul retro della CIE, le
+incolla ruotate su una foto e misura localizzazione, allineamento delle zone e
+individuazione della fascia MRZ. Se tesseract è installato confronta tempo e
+campi corretti della lettura a zone e della MRZ con l'OCR della pagina intera
+(--psm 6 e regole di estrazione).
+
+Uso: python benchmarks/bench_id_layout.py [--megapixel 12] [--rotazione 3] [--motore auto]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_preprocessing import background, place_on_photo
+from id_card_layout import (LAYOUTS, CARD_WIDTH, ID1_RATIO, LAYOUT_CIE_FRONTE, LAYOUT_CIE_RETRO,
+                            LAYOUT_CARTACEA, LAYOUT_PATENTE, locate_card, read_document_image)
+from image_preprocessing import preprocess_image
+from mrz import check_digit, find_mrz_band
+from ocr_engine import get_engine, BACKENDS
+from rule_engine import parse_documento_identita
+
+try:
+    import pytesseract
+    pytesseract.get_tesseract_version()
+    TESSERACT = True
+except Exception:
+    TESSERACT = False
+
+# Per formato: intestazione, proporzioni, testo nelle zone e campi attesi
+SAMPLES = {
+    LAYOUT_CIE_FRONTE: ("REPUBBLICA ITALIANA  CARTA DI IDENTITA' / IDENTITY CARD", ID1_RATIO, {
+        'Numero_Documento': 'CA12345AB', 'Comune_Rilascio': 'ROMA', 'Cognome': 'ROSSI',
+        'Nome': 'MARIO', 'Nascita': 'ROMA (RM) 01.02.1980', 'Sesso': 'M',
+        'Data_Rilascio': '01.02.2020', 'Data_Scadenza': '01.02.2030',
+    }, {
+        'Numero_Documento': 'CA12345AB', 'Comune_Rilascio': 'ROMA', 'Cognome': 'ROSSI',
+        'Nome': 'MARIO', 'Luogo_Nascita': 'ROMA', 'Provincia_Nascita': 'RM',
+        'Data_Nascita': '01/02/1980', 'Sesso': 'M', 'Data_Rilascio': '01/02/2020',
+        'Data_Scadenza': '01/02/2030',
+    }),
+    LAYOUT_CIE_RETRO: ("CODICE FISCALE / FISCAL CODE", ID1_RATIO, {
+        'CF_Persona': 'RSSMRA80B01H501T', 'Residenza': 'VIA ROMA 1 ROMA (RM)',
+    }, {
+        'CF_Persona': 'RSSMRA80B01H501T', 'Residenza': 'VIA ROMA 1 ROMA (RM)',
+    }),
+    LAYOUT_CARTACEA: ("REPUBBLICA ITALIANA  CARTA D'IDENTITA'", 1.35, {
+        'Numero_Documento': 'AT1234567', 'Cognome': 'BIANCHI', 'Nome': 'ANNA',
+        'Data_Nascita': '15/07/1975', 'Luogo_Nascita': 'MILANO (MI)',
+        'Residenza': 'VIA DANTE 5 MILANO',
+    }, {
+        'Numero_Documento': 'AT1234567', 'Cognome': 'BIANCHI', 'Nome': 'ANNA',
+        'Data_Nascita': '15/07/1975', 'Luogo_Nascita': 'MILANO (MI)',
+        'Residenza': 'VIA DANTE 5 MILANO',
+    }),
+    LAYOUT_PATENTE: ("PATENTE DI GUIDA  REPUBBLICA ITALIANA", ID1_RATIO, {
+        'Cognome': 'VERDI', 'Nome': 'LUCA', 'Nascita': '03/04/85 TORINO (TO)',
+        'Data_Rilascio': '10/05/2015', 'Comune_Rilascio': 'MIT-UCO',
+        'Data_Scadenza': '03/04/2026', 'Numero_Documento': 'U1A123456B',
+    }, {
+        'Cognome': 'VERDI', 'Nome': 'LUCA', 'Luogo_Nascita': 'TORINO', 'Provincia_Nascita': 'TO',
+        'Data_Nascita': '03/04/1985', 'Data_Rilascio': '10/05/2015', 'Comune_Rilascio': 'MIT-UCO',
+        'Data_Scadenza': '03/04/2026', 'Numero_Documento': 'U1A123456B',
+    }),
+}
+
+def td1_mrz(number, birth, sex, expiry, surname, name):
+    """Righe di una MRZ TD1 italiana con cifre di controllo corrette"""
+    line1 = f"C<ITA{number}{check_digit(number)}".ljust(30, '<')
+    line2 = f"{birth}{check_digit(birth)}{sex}{expiry}{check_digit(expiry)}ITA".ljust(29, '<')
+    line2 += check_digit(line1[5:30] + line2[0:7] + line2[8:15] + line2[18:29])
+    return [line1, line2, f"{surname}<<{name}".ljust(30, '<')]
+
+# MRZ sul retro della CIE (stessa persona del fronte) e fascia in cui viene disegnata
+MRZ_SAMPLES = {
+    LAYOUT_CIE_RETRO: td1_mrz('CA12345AB', '800201', 'M', '300201', 'ROSSI', 'MARIO'),
+}
+MRZ_EXPECTED = {
+    LAYOUT_CIE_RETRO: {
+        'Numero_Documento': 'CA12345AB', 'Cognome': 'ROSSI', 'Nome': 'MARIO',
+        'Data_Nascita': '01/02/1980', 'Sesso': 'M', 'Data_Scadenza': '01/02/2030',
+    },
+}
+MRZ_TOP = 0.64
+
+def make_card(layout_name):
+    """Carta sintetica con intestazione e valori disegnati nelle zone del formato"""
+    header, ratio, values, _ = SAMPLES[layout_name]
+    card = Image.new('L', (CARD_WIDTH, int(CARD_WIDTH / ratio)), 235)
+    draw = ImageDraw.Draw(card)
+    width, height = card.size
+    draw.text((int(0.03 * width), int(0.16 * height)), header, fill=20,
+              font=ImageFont.load_default(size=int(0.045 * height)))
+    for region in LAYOUTS[layout_name].regions:
+        left, top, right, bottom = region.box
+        font = ImageFont.load_default(size=int((bottom - top) * height * 0.6))
+        draw.text((int(left * width) + 4, int(top * height) + 2), values[region.field],
+                  fill=20, font=font)
+    if layout_name in MRZ_SAMPLES:
+        font = ImageFont.load_default(size=int(0.075 * height))
+        for row, line in enumerate(MRZ_SAMPLES[layout_name]):
+            draw.text((int(0.05 * width), int((MRZ_TOP + row * 0.1) * height)), line,
+                      fill=20, font=font)
+    return card
+
+def mrz_found(located, layout_name):
+    """Per le carte con MRZ: 'sì' se la fascia trovata copre quella disegnata"""
+    if layout_name not in MRZ_SAMPLES:
+        return '-'
+    bbox = find_mrz_band(located)
+    if bbox is None:
+        return 'no'
+    top, bottom = bbox[1] / located.size[1], bbox[3] / located.size[1]
+    return 'sì' if top <= MRZ_TOP + 0.02 and bottom >= MRZ_TOP + 0.27 else 'parziale'
+
+def dark_fraction(image):
+    """Quota di pixel scuri (testo) di un'immagine in scala di grigi"""
+    return float((np.asarray(image) < 128).mean())
+
+def region_alignment(card, located, layout_name):
+    """Somiglianza (0-1) tra il testo nelle zone della carta originale e di quella localizzata"""
+    scores = []
+    for region in LAYOUTS[layout_name].regions:
+        boxes = []
+        for image in (card, located):
+            width, height = image.size
+            left, top, right, bottom = region.box
+            boxes.append(dark_fraction(image.crop((int(left * width), int(top * height),
+                                                   int(right * width), int(bottom * height)))))
+        scores.append(min(boxes) / max(boxes) if max(boxes) else 0.0)
+    return sum(scores) / len(scores)
+
+def correct_fields(found, expected):
+    return sum(found.get(field) == value for field, value in expected.items())
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lettura a zone dei documenti")
+    parser.add_argument('--megapixel', type=float, default=12)
+    parser.add_argument('--rotazione', type=float, default=3.0)
+    parser.add_argument('--motore', choices=BACKENDS, default=None)
+    args = parser.parse_args()
+
+    engine = get_engine(args.motore)
+    if not TESSERACT:
+        print("tesseract non disponibile: misurate solo localizzazione, allineamento delle zone e fascia MRZ\n")
+    print(f"{'Formato':<15} {'Localizzazione':>14} {'Allineamento zone':>18} {'Fascia MRZ':>11}"
+          + (f" {'Pagina intera':>14} {'Campi':>6} {'Zone/MRZ':>8} {'Campi':>6}" if TESSERACT else ""))
+    for index, layout_name in enumerate(SAMPLES):
+        card = make_card(layout_name)
+        photo = background(args.megapixel)
+        card_width = int(photo.size[0] * 0.55)
+        scaled = card.resize((card_width, int(card_width * card.size[1] / card.size[0])), Image.BICUBIC)
+        photo, _ = place_on_photo(scaled, photo, args.rotazione, random.Random(index))
+
+        located, seconds = timed(lambda: locate_card(photo))
+        line = (f"{layout_name:<15} {seconds * 1000:>12.0f}ms "
+                f"{region_alignment(card, located, layout_name):>18.2f} "
+                f"{mrz_found(located, layout_name):>11}")
+        if TESSERACT:
+            expected = {**SAMPLES[layout_name][3], **MRZ_EXPECTED.get(layout_name, {})}
+            full, full_time = timed(lambda: parse_documento_identita(
+                engine.image_to_string(preprocess_image(photo), 'ita', '--psm 6')))
+            text, zone_time = timed(lambda: read_document_image(photo, engine, layout=True))
+            zones = parse_documento_identita(text) if text else {}
+            line += (f" {full_time:>12.2f}s {correct_fields(full, expected):>3}/{len(expected):<2}"
+                     f" {zone_time:>6.2f}s {correct_fields(zones, expected):>3}/{len(expected):<2}")
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark del tempo di avvio dei punti di ingresso
+Misura in processi nuovi il tempo di `batch_processor.py --help`, di
+`batch_processor.py` su una cartella vuota e dell'import dell'app desktop, e
+quali moduli pesanti (pandas, numpy, PyPDF2, PIL, pytesseract) vengono
+caricati. Con --confronta esegue gli stessi casi su un altro commit (estratto
+con git archive in una cartella temporanea) e riporta la differenza.
+
+Uso: python benchmarks/bench_startup.py [--ripetizioni 10] [--confronta HEAD~1]
+"""
+
+import argparse
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ('pandas', 'numpy', 'PyPDF2', 'PIL', 'pytesseract', 'tesserocr', 'openpyxl')
+
+# Esegue uno script come farebbe `python script args` (o lo importa soltanto) e
+# stampa su stderr i moduli pesanti caricati
+RUNNER = """
+import json, runpy, sys
+script, main, args = sys.argv[1], sys.argv[2] == '1', sys.argv[3:]
+sys.argv = [script, *args]
+try:
+    runpy.run_path(script, run_name='__main__' if main else 'bench_startup')
+except SystemExit:
+    pass
+sys.stderr.write('\\nMODULI:' + json.dumps([m for m in %r if m in sys.modules]) + '\\n')
+""" % (HEAVY_MODULES,)
+
+def scenarios(empty_folder, output):
+    """Casi misurati: (nome, script, eseguito come __main__, argomenti)"""
+    return [
+        ('batch --help', 'batch_processor.py', True, ['--help']),
+        ('batch cartella vuota', 'batch_processor.py', True, [empty_folder, output, '--workers', '1']),
+        ('app desktop (import)', 'document_extractor.py', False, []),
+    ]
+
+def run(root, script, main, args):
+    """Tempo di un processo nuovo e moduli pesanti caricati"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', RUNNER, script, '1' if main else '0', *args],
+                            cwd=root, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    modules = None
+    for line in result.stderr.splitlines():
+        if line.startswith('MODULI:'):
+            modules = json.loads(line[len('MODULI:'):])
+    if modules is None:
+        raise RuntimeError(f"{script} non eseguito:\n{result.stderr[-2000:]}")
+    return seconds, modules
+
+def measure(root, cases, repetitions):
+    """Per ogni caso: (mediana, minimo, moduli pesanti)"""
+    results = {}
+    for name, script, main, args in cases:
+        # Un'esecuzione a vuoto: bytecode compilato e file già nella cache del sistema
+        run(root, script, main, args)
+        times, modules = [], []
+        for _ in range(repetitions):
+            seconds, modules = run(root, script, main, args)
+            times.append(seconds)
+        results[name] = (statistics.median(times), min(times), modules)
+    return results
+
+def checkout(revision, folder):
+    """Estrae i file del commit indicato nella cartella (senza toccare la copia di lavoro)"""
+    archive = subprocess.run(['git', 'archive', '--format=tar', revision], cwd=ROOT,
+                             capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(folder)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del tempo di avvio")
+    parser.add_argument('--ripetizioni', type=int, default=10)
+    parser.add_argument('--confronta', metavar='COMMIT',
+                        help="Commit (o branch/tag) con cui confrontare i tempi")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp:
+        empty = Path(temp) / 'vuota'
+        empty.mkdir()
+        cases = scenarios(str(empty), str(Path(temp) / 'risultati'))
+        current = measure(ROOT, cases, args.ripetizioni)
+        baseline = None
+        if args.confronta:
+            folder = Path(temp) / 'confronto'
+            folder.mkdir()
+            checkout(args.confronta, folder)
+            baseline = measure(folder, cases, args.ripetizioni)
+
+    print(f"{'Caso':<22} {'Mediana':>9} {'Minimo':>9}" + (f" {args.confronta:>12} {'Guadagno':>9}" if baseline else "")
+          + "  Moduli pesanti caricati")
+    for name, *_ in cases:
+        median, fastest, modules = current[name]
+        line = f"{name:<22} {median * 1000:>7.0f}ms {fastest * 1000:>7.0f}ms"
+        if baseline:
+            before = baseline[name][0]
+            line += f" {before * 1000:>10.0f}ms {before / median:>8.1f}x"
+        print(f"{line}  {', '.join(modules) or '-'}")
+    if baseline:
+        print(f"\nModuli pesanti in {args.confronta}:")
+        for name, *_ in cases:
+            print(f"  {name:<22} {', '.join(baseline[name][2]) or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Benchmark riproducibile dell'intera estrazione
+Genera un corpus sintetico deterministico (visure PDF da 1 a 60 pagine, foto di
+carte d'identità a più risoluzioni e livelli di rumore) e misura separatamente
+ogni fase: testo del PDF, preprocessing, OCR, classificazione, estrazione dei
+campi (parse_visura_camerale / parse_documento_identita), mappatura sul
+template ed esportazione. I risultati vanno in un file JSON con commit, ambiente
+e parametri, da confrontare tra commit diversi con --confronta.
+
+Senza tesseract la fase di OCR viene saltata e classificazione ed estrazione
+delle carte lavorano sul testo stampato sulla carta.
+
+Uso: python benchmarks/bench_suite.py [--pagine 1 10 60] [--megapixel 12 24 48]
+     [--rumore 0 12] [--ripetizioni 3] [--output risultati.json] [--confronta base.json]
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import PyPDF2
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_preprocessing import make_id_photo, CARD_FIELDS
+from bench_visura_scan import HEADER, FILLER
+from document_classifier import classify_document
+from image_preprocessing import preprocess_image, FULL_PREPROCESS
+from ocr_engine import get_engine, BACKENDS
+from pdf_text import extract_pdf_document_text
+from rule_engine import parse_visura_camerale, parse_documento_identita
+from streaming_export import StreamingExporter
+from template_mapping import map_records_to_template
+
+try:
+    import pytesseract
+    TESSERACT_VERSION = str(pytesseract.get_tesseract_version())
+except Exception:
+    TESSERACT_VERSION = None
+
+# Versione del formato del file dei risultati
+RESULTS_VERSION = 1
+# Righe di testo per pagina della visura sintetica
+LINES_PER_PAGE = 60
+# Rotazione delle carte nelle foto sintetiche
+ID_ROTATION = 3.0
+# Testo stampato sulla carta: usato al posto dell'OCR se tesseract non c'è
+ID_TEXT = "CARTA DI IDENTITA' - REPUBBLICA ITALIANA\n" + "\n".join(
+    f"{label}: {value}" for label, value in CARD_FIELDS.items())
+# Variazioni oltre cui il confronto segnala una fase
+COMPARE_THRESHOLD = 0.10
+
+def visura_pages(pages, seed=0):
+    """Righe di ogni pagina di una visura sintetica (dati dell'impresa nella prima)"""
+    rng = random.Random(seed)
+    result = []
+    for page in range(pages):
+        lines = [f"Pagina {page + 1} di {pages}", ""]
+        if page == 0:
+            lines.extend(HEADER.splitlines())
+        lines.extend(rng.choice(FILLER) for _ in range(LINES_PER_PAGE - len(lines)))
+        result.append(lines)
+    return result
+
+def _escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def make_pdf(pages):
+    """PDF minimale con uno strato di testo per pagina (Helvetica, A4), sempre
+    identico a parità di contenuto: nessuna data o identificativo casuale"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 10 Tf 50 800 Td 12 TL"]
+        ops.extend(f"({_escape(line)}) Tj T*" for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode('cp1252', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(content)
+    content += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    content += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    content += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return content
+
+def add_noise(image, sigma, seed=0):
+    """Rumore gaussiano (deviazione standard in livelli di grigio) con seme fisso"""
+    if not sigma:
+        return image
+    pixels = np.asarray(image, dtype=np.int16)
+    noise = np.random.default_rng(seed).normal(0, sigma, pixels.shape).astype(np.int16)
+    return Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+
+def build_corpus(pages, megapixels, noise_levels):
+    """Documenti del corpus: (nome, tipo, parametri, contenuto in byte)"""
+    corpus = []
+    for count in pages:
+        corpus.append((f"visura_{count}p", 'visura', {'pagine': count},
+                       make_pdf(visura_pages(count, seed=count))))
+    for index, mp in enumerate(megapixels):
+        # Stessa foto per tutti i livelli di rumore: cambia solo il rumore
+        photo, _ = make_id_photo(mp, ID_ROTATION, seed=index)
+        for sigma in noise_levels:
+            buffer = io.BytesIO()
+            add_noise(photo, sigma, seed=index).save(buffer, format='JPEG', quality=90)
+            corpus.append((f"carta_{mp:g}mp_rumore{sigma:g}", 'carta',
+                           {'megapixel': mp, 'rumore': sigma}, buffer.getvalue()))
+    return corpus
+
+def measure(function, repetitions):
+    """Esegue la funzione più volte: (ultimo risultato, tempi in secondi)"""
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+class Suite:
+    """Raccoglie i tempi per documento e fase"""
+
+    def __init__(self, repetitions):
+        self.repetitions = repetitions
+        self.results = []
+
+    def stage(self, document, stage, function):
+        result, times = measure(function, self.repetitions)
+        self.results.append({
+            'documento': document, 'fase': stage,
+            'min_s': min(times), 'mediana_s': statistics.median(times),
+            'ripetizioni': len(times),
+        })
+        return result
+
+def run_visura(suite, name, content):
+    text = suite.stage(name, 'testo_pdf', lambda: extract_pdf_document_text(content))
+    suite.stage(name, 'classificazione', lambda: classify_document(text))
+    return suite.stage(name, 'parsing', lambda: parse_visura_camerale(text))
+
+def run_card(suite, name, content, engine):
+    image = Image.open(io.BytesIO(content))
+    image.load()
+    processed = suite.stage(name, 'preprocessing', lambda: preprocess_image(image, FULL_PREPROCESS))
+    text = ID_TEXT
+    if engine is not None:
+        text = suite.stage(name, 'ocr', lambda: engine.image_to_string(processed, 'ita', ''))
+    suite.stage(name, 'classificazione', lambda: classify_document(text))
+    return suite.stage(name, 'parsing', lambda: parse_documento_identita(text))
+
+def run_outputs(suite, visure, documenti, rows):
+    """Mappatura sul template ed esportazione di `rows` righe (coppie del corpus ripetute)"""
+    pairs = [(visure[index % len(visure)] if visure else {},
+              documenti[index % len(documenti)] if documenti else {}) for index in range(rows)]
+    name = f"{rows}_righe"
+    frame = suite.stage(name, 'mappatura_template', lambda: map_records_to_template(pairs))
+    with tempfile.TemporaryDirectory() as folder:
+        output = Path(folder) / 'risultati'
+
+        def export_pandas():
+            frame.to_excel(f"{output}.xlsx", index=False)
+            frame.to_csv(f"{output}.csv", index=False, sep=';', encoding='utf-8-sig')
+
+        def export_stream():
+            exporter = StreamingExporter(output)
+            for row in frame.to_dict('records'):
+                exporter.write_row(row)
+            return exporter.close()
+
+        suite.stage(name, 'esportazione', export_pandas)
+        suite.stage(name, 'esportazione_stream', export_stream)
+
+def git_commit():
+    """Commit corrente e presenza di modifiche non committate (None fuori da git)"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+def environment(engine):
+    return {
+        'python': platform.python_version(),
+        'piattaforma': platform.platform(),
+        'processore': platform.processor() or platform.machine(),
+        'motore_ocr': engine.cache_label if engine is not None else None,
+        'tesseract': TESSERACT_VERSION,
+        'pacchetti': {'numpy': np.__version__, 'pandas': pd.__version__,
+                      'Pillow': Image.__version__, 'PyPDF2': PyPDF2.__version__},
+    }
+
+def print_table(results):
+    print(f"{'Documento':<26} {'Fase':<20} {'Minimo':>10} {'Mediana':>10}")
+    for result in results:
+        print(f"{result['documento']:<26} {result['fase']:<20} "
+              f"{result['min_s'] * 1000:>8.1f}ms {result['mediana_s'] * 1000:>8.1f}ms")
+
+def print_comparison(baseline, results):
+    """Variazione del tempo minimo rispetto a un file di risultati precedente"""
+    previous = {(item['documento'], item['fase']): item['min_s'] for item in baseline['risultati']}
+    print(f"\nConfronto con {(baseline.get('commit') or '?')[:10]} "
+          f"(variazioni oltre {COMPARE_THRESHOLD:.0%} segnalate)")
+    print(f"{'Documento':<26} {'Fase':<20} {'Prima':>10} {'Ora':>10} {'Variazione':>11}")
+    for result in results:
+        before = previous.get((result['documento'], result['fase']))
+        if not before:
+            continue
+        change = result['min_s'] / before - 1
+        flag = '  <--' if abs(change) > COMPARE_THRESHOLD else ''
+        print(f"{result['documento']:<26} {result['fase']:<20} {before * 1000:>8.1f}ms "
+              f"{result['min_s'] * 1000:>8.1f}ms {change:>+10.0%}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark riproducibile dell'estrazione")
+    parser.add_argument('--pagine', type=int, nargs='+', default=[1, 10, 30, 60])
+    parser.add_argument('--megapixel', type=float, nargs='+', default=[12, 24, 48])
+    parser.add_argument('--rumore', type=float, nargs='+', default=[0, 12],
+                        help="Deviazione standard del rumore gaussiano (livelli di grigio)")
+    parser.add_argument('--righe', type=int, default=500, help="Righe mappate ed esportate")
+    parser.add_argument('--ripetizioni', type=int, default=3)
+    parser.add_argument('--motore', choices=BACKENDS, default=None)
+    parser.add_argument('--no-ocr', action='store_true', help="Salta l'OCR anche con tesseract installato")
+    parser.add_argument('--output', help="File JSON dei risultati (default: bench_suite_<commit>.json)")
+    parser.add_argument('--confronta', help="File JSON di una esecuzione precedente")
+    args = parser.parse_args()
+
+    engine = get_engine(args.motore) if TESSERACT_VERSION and not args.no_ocr else None
+    if engine is None:
+        print("OCR non misurato: classificazione ed estrazione delle carte usano il testo stampato\n")
+
+    corpus = build_corpus(args.pagine, args.megapixel, args.rumore)
+    suite = Suite(args.ripetizioni)
+    visure, documenti = [], []
+    for name, kind, _, content in corpus:
+        if kind == 'visura':
+            visure.append(run_visura(suite, name, content))
+        else:
+            documenti.append(run_card(suite, name, content, engine))
+    run_outputs(suite, visure, documenti, args.righe)
+    print_table(suite.results)
+
+    commit, dirty = git_commit()
+    report = {
+        'versione': RESULTS_VERSION,
+        'commit': commit,
+        'modifiche_locali': dirty,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': environment(engine),
+        'parametri': {key: value for key, value in vars(args).items()
+                      if key not in ('output', 'confronta')},
+        'corpus': [{'documento': name, 'tipo': kind, 'byte': len(content), **params}
+                   for name, kind, params, content in corpus],
+        'risultati': suite.results,
+    }
+    output = Path(args.output or f"bench_suite_{(commit or 'nogit')[:10]}.json")
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"\n✓ Risultati salvati in {output}")
+
+    if args.confronta:
+        print_comparison(json.loads(Path(args.confronta).read_text(encoding='utf-8')), suite.results)
+
+if __name__ == "__main__":
+    main()
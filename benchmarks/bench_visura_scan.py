@@ -0,0 +1,102 @@
+"""
+Benchmark dell'estrazione dei campi dalla visura camerale
+Confronta la ricerca tradizionale (ogni pattern scorre l'intero testo) con la
+scansione unica delle ancore su visure sintetiche di lunghezza crescente, con
+i campi all'inizio, alla fine o assenti, e verifica che i campi estratti siano
+identici.
+
+Uso: python benchmarks/bench_visura_scan.py [--pagine 1 10 50] [--ripetizioni 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rule_engine import VISURA_RULES
+
+HEADER = """VISURA ORDINARIA SOCIETA' DI CAPITALE
+
+ROSSI COSTRUZIONI S.R.L.
+Denominazione: ROSSI COSTRUZIONI S.R.L.
+Forma giuridica: società a responsabilità limitata
+Sede legale: Via Roma 12 CAP 20121 Milano (MI)
+Codice fiscale e n.iscr. al Registro Imprese: 01234567890
+Partita IVA: 01234567890
+Numero REA: MI - 1234567
+Data atto di costituzione: 15/03/2005
+Data inizio attività: 01/04/2005
+Capitale sociale: € 10.000,00
+Stato attività: ATTIVA
+Codice ATECO: 41.20.00
+Attività prevalente: costruzione di edifici residenziali e commercio di materiali edili
+Amministratore Unico: MARIO ROSSI
+Soci e titolari di diritti su azioni e quote: 2
+"""
+
+FILLER = [
+    "Il presente documento è rilasciato ai sensi dell'articolo 8 della legge 580/1993.",
+    "Informazioni tratte dal Registro delle Imprese, aggiornate alla data di estrazione.",
+    "Atto del 12/06/2015 depositato presso l'ufficio competente, protocollo n. 45678.",
+    "Trasferimento di quote tra soci con atto notarile registrato.",
+    "Modifica dell'oggetto sociale e delle sedi secondarie dell'impresa.",
+    "Pratica evasa dall'ufficio in data 03/09/2019, nessuna annotazione.",
+    "Unità locale n. 2: magazzino, attività secondaria di deposito merci.",
+]
+
+# Posizione dei dati dell'impresa nella visura sintetica
+SCENARIOS = {
+    'in testa': 'campi nella prima pagina',
+    'in fondo': "campi dopo l'ultima pagina",
+    'assenti': 'nessun campo (es. documento non riconosciuto)',
+}
+
+def make_visura(pages, scenario='in testa', seed=0):
+    """Visura sintetica: pagine di testo di riempimento e, se previsti, i campi"""
+    rng = random.Random(seed)
+    lines = []
+    for page in range(pages):
+        lines.append(f"\nPagina {page + 1} di {pages}\n")
+        lines.extend(rng.choice(FILLER) for _ in range(60))
+    if scenario == 'in testa':
+        lines.insert(0, HEADER)
+    elif scenario == 'in fondo':
+        lines.append(HEADER)
+    return "\n".join(lines)
+
+def best_time(function, repetitions):
+    """Tempo minimo su più ripetizioni"""
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scansione unica della visura")
+    parser.add_argument('--pagine', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--ripetizioni', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'Campi':<9} {'Pagine':>6} {'Caratteri':>10} {'Pattern per pattern':>20} "
+          f"{'Scansione unica':>16} {'Speedup':>8}")
+    for scenario, pages in ((scenario, pages) for scenario in SCENARIOS for pages in args.pagine):
+        text = make_visura(pages, scenario)
+        naive = VISURA_RULES.extract(text, stats=None, single_scan=False)
+        single = VISURA_RULES.extract(text, stats=None, single_scan=True)
+        if naive != single:
+            print(f"ATTENZIONE: risultati diversi ({scenario}, {pages} pagine)")
+
+        naive_time = best_time(lambda: VISURA_RULES.extract(text, stats=None, single_scan=False),
+                               args.ripetizioni)
+        single_time = best_time(lambda: VISURA_RULES.extract(text, stats=None, single_scan=True),
+                                args.ripetizioni)
+        print(f"{scenario:<9} {pages:>6} {len(text):>10} {naive_time * 1000:>18.2f}ms "
+              f"{single_time * 1000:>14.2f}ms {naive_time / single_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Classificazione del tipo di documento dal testo estratto
+Tutti i tipi vengono valutati insieme in un'unica passata sul testo, diviso in
+blocchi portati in minuscolo uno alla volta: appena la visura raggiunge un
+numero decisivo di parole chiave la scansione si ferma, senza leggere il resto
+di documenti lunghi. Oltre al tipo viene restituita una confidenza (0-1).
+"""
+
+from collections import namedtuple
+
+DOC_VISURA = 'visura_camerale'
+DOC_IDENTITA = 'documento_identita'
+
+# Tipi in ordine di priorità, con le rispettive parole chiave (in minuscolo)
+DOCUMENT_KEYWORDS = (
+    (DOC_VISURA, ('camera di commercio', 'visura', 'rea', 'partita iva')),
+    (DOC_IDENTITA, (
+        'carta identita', 'identity card', 'patente', 'passaporto',
+        'documento', 'rilasciato', 'luogo di nascita', 'data di nascita',
+        'residenza', 'comune di', 'cittadinanza', 'codice fiscale',
+    )),
+)
+
+# Parole chiave necessarie per riconoscere un tipo
+MIN_HITS = 2
+# Con questo numero di parole chiave del tipo prioritario la scansione si ferma
+DECISIVE_HITS = 3
+# Dimensione dei blocchi di testo esaminati ad ogni passo
+CHUNK_CHARS = 4096
+
+# Risultato: tipo (None se non riconosciuto), confidenza del tipo e punteggi di tutti i tipi
+Classification = namedtuple('Classification', ['doc_type', 'confidence', 'scores'])
+
+def classify_document(text, chunk_chars=CHUNK_CHARS):
+    """Classifica il testo in una sola passata con uscita anticipata
+
+    La confidenza è la quota di parole chiave del tipo trovate nel testo
+    esaminato; con l'uscita anticipata è un limite inferiore.
+    """
+    remaining = {doc_type: list(keywords) for doc_type, keywords in DOCUMENT_KEYWORDS}
+    hits = dict.fromkeys(remaining, 0)
+    first_type = DOCUMENT_KEYWORDS[0][0]
+    # Sovrapposizione tra blocchi per le parole chiave a cavallo di due blocchi
+    overlap = max(len(keyword) for _, keywords in DOCUMENT_KEYWORDS for keyword in keywords) - 1
+
+    for start in range(0, len(text), chunk_chars):
+        chunk = text[max(0, start - overlap):start + chunk_chars].lower()
+        for doc_type, keywords in remaining.items():
+            found = [keyword for keyword in keywords if keyword in chunk]
+            for keyword in found:
+                keywords.remove(keyword)
+            hits[doc_type] += len(found)
+        if hits[first_type] >= DECISIVE_HITS:
+            break
+
+    scores = {doc_type: hits[doc_type] / len(keywords) for doc_type, keywords in DOCUMENT_KEYWORDS}
+    for doc_type, _ in DOCUMENT_KEYWORDS:
+        if hits[doc_type] >= MIN_HITS:
+            return Classification(doc_type, scores[doc_type], scores)
+    return Classification(None, 0.0, scores)
+
+def is_visura_camerale(text):
+    """Determina se il testo è di una visura camerale"""
+    return classify_document(text).doc_type == DOC_VISURA
+
+def is_documento_identita(text):
+    """Determina se il testo è di un documento d'identità (e non di una visura)"""
+    return classify_document(text).doc_type == DOC_IDENTITA
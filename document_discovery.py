@@ -0,0 +1,85 @@
+"""
+Individuazione dei documenti da elaborare in una cartella
+Un'unica visita con os.scandir (opzionalmente ricorsiva) che restituisce i file
+in modo lazy, senza duplicati, riconoscendo il tipo dai primi byte del file
+(magic bytes) invece che dall'estensione.
+"""
+
+import os
+from pathlib import Path
+
+# Tipi di documento riconosciuti
+KIND_PDF = 'pdf'
+KIND_IMAGE = 'image'
+
+# Firme iniziali dei formati supportati
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',          # JPEG
+    b'\x89PNG\r\n\x1a\n',     # PNG
+)
+# L'intestazione %PDF- può essere preceduta da byte spuri (max 1024 per specifica)
+PDF_SIGNATURE = b'%PDF-'
+SNIFF_BYTES = 1024
+
+def sniff_bytes(head):
+    """Riconosce il tipo di documento dai primi byte del contenuto"""
+    if head.startswith(IMAGE_SIGNATURES):
+        return KIND_IMAGE
+    if PDF_SIGNATURE in head[:SNIFF_BYTES]:
+        return KIND_PDF
+    return None
+
+def sniff_document_type(file_path):
+    """Riconosce il tipo di un file dai magic bytes (None se non supportato)"""
+    try:
+        with open(file_path, 'rb') as file:
+            return sniff_bytes(file.read(SNIFF_BYTES))
+    except OSError:
+        return None
+
+def iter_documents(root, recursive=False):
+    """Genera i percorsi dei documenti supportati, senza duplicati, man mano che li trova"""
+    seen_files = set()
+    seen_dirs = set()
+    stack = [str(root)]
+
+    while stack:
+        directory = stack.pop()
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            continue
+        # Evita cicli di link simbolici e cartelle visitate due volte
+        if (stat.st_dev, stat.st_ino) in seen_dirs:
+            continue
+        seen_dirs.add((stat.st_dev, stat.st_ino))
+
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if recursive:
+                                subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    # Lo stesso file raggiunto da percorsi diversi (link, maiuscole/minuscole)
+                    identity = (stat.st_dev, stat.st_ino)
+                    if not stat.st_ino:
+                        # Su Windows DirEntry.stat() non riporta l'inode
+                        identity = os.path.normcase(os.path.realpath(entry.path))
+                    if identity in seen_files:
+                        continue
+                    seen_files.add(identity)
+                    if sniff_document_type(entry.path) is not None:
+                        yield Path(entry.path)
+        except OSError:
+            continue
+
+        # Visita le sottocartelle nell'ordine in cui sono state trovate
+        stack.extend(reversed(subdirs))
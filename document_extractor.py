@@ -6,14 +6,14 @@ Esporta i dati in formato Excel e CSV su una singola riga
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import pandas as pd
-from pathlib import Path
-import re
 from datetime import datetime
-import PyPDF2
-from PIL import Image
-import pytesseract
 import os
+# PIL, numpy, PyPDF2 e le regole di estrazione vengono importati alla prima estrazione:
+# la finestra si apre subito. L'esportazione non usa pandas.
+from ocr_engine import available_backends, DEFAULT_BACKEND, BACKEND_AUTO
+from streaming_export import write_csv, write_excel
+from extraction_engine import ExtractionEngine
+from document_classifier import DOC_VISURA, DOC_IDENTITA
 
 class DocumentExtractorApp:
     def __init__(self, root):
@@ -88,6 +88,28 @@ class DocumentExtractorApp:
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
         main_frame.columnconfigure(0, weight=1)
+        # Motore OCR
+        ocr_frame = ttk.Frame(main_frame)
+        ocr_frame.grid(row=5, column=0, columnspan=3, pady=5)
+        
+        backends = available_backends()
+        self.ocr_backend_var = tk.StringVar(value=DEFAULT_BACKEND if DEFAULT_BACKEND in backends else BACKEND_AUTO)
+        ttk.Label(ocr_frame, text="Motore OCR:").grid(row=0, column=0, padx=5)
+        ttk.Combobox(ocr_frame, textvariable=self.ocr_backend_var, values=backends,
+                     state="readonly", width=15).grid(row=0, column=1)
+        # Lettura a zone di CIE, carta cartacea e patente (se il formato è riconosciuto)
+        self.id_layout_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(ocr_frame, text="Lettura a zone dei documenti d'identità",
+                        variable=self.id_layout_var).grid(row=0, column=2, padx=10)
+        # MRZ di passaporti e CIE: se valida evita l'OCR della pagina intera
+        self.mrz_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(ocr_frame, text="Lettura della MRZ",
+                        variable=self.mrz_var).grid(row=0, column=3, padx=10)
+        # OCR a livelli: riletture solo se codice fiscale, partita IVA o date non tornano
+        self.escalation_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(ocr_frame, text="OCR a livelli",
+                        variable=self.escalation_var).grid(row=0, column=4, padx=10)
+        
         main_frame.rowconfigure(3, weight=1)
         data_frame.columnconfigure(0, weight=1)
         data_frame.rowconfigure(0, weight=1)
@@ -118,8 +140,7 @@ class DocumentExtractorApp:
             return
         
         try:
-            text = self.extract_text_from_pdf(file_path)
-            self.parse_visura_camerale(text)
+            self.data.update(self.engine().extract(file_path, doc_type=DOC_VISURA).data)
             self.update_treeview()
             messagebox.showinfo("Successo", "Dati estratti dalla visura camerale!")
         except Exception as e:
@@ -133,147 +154,17 @@ class DocumentExtractorApp:
             return
         
         try:
-            if file_path.lower().endswith('.pdf'):
-                text = self.extract_text_from_pdf(file_path)
-            else:
-                text = self.extract_text_from_image(file_path)
-            
-            self.parse_documento_identita(text)
+            # PDF o immagine riconosciuti dal contenuto del file
+            self.data.update(self.engine().extract(file_path, doc_type=DOC_IDENTITA).data)
             self.update_treeview()
             messagebox.showinfo("Successo", "Dati estratti dal documento d'identità!")
         except Exception as e:
             messagebox.showerror("Errore", f"Errore nell'estrazione: {str(e)}")
     
-    def extract_text_from_pdf(self, file_path):
-        """Estrae il testo da un file PDF"""
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
-    
-    def extract_text_from_image(self, file_path):
-        """Estrae il testo da un'immagine usando OCR"""
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image, lang='ita')
-        return text
-    
-    def parse_visura_camerale(self, text):
-        """Analizza il testo della visura camerale ed estrae i dati"""
-        
-        # Denominazione/Ragione Sociale
-        denominazione = self.extract_pattern(text, r"(?:Denominazione|Ragione sociale)[:\s]*([A-Z][^\n]+)")
-        if denominazione:
-            self.data['Denominazione'] = denominazione.strip()
-        
-        # Partita IVA
-        piva = self.extract_pattern(text, r"(?:P\.IVA|Partita IVA)[:\s]*(\d{11})")
-        if piva:
-            self.data['Partita_IVA'] = piva
-        
-        # Codice Fiscale
-        cf = self.extract_pattern(text, r"(?:Codice Fiscale|C\.F\.)[:\s]*([A-Z0-9]{11,16})")
-        if cf:
-            self.data['Codice_Fiscale'] = cf
-        
-        # Numero REA
-        rea = self.extract_pattern(text, r"(?:REA|N\. REA)[:\s]*([A-Z]{2}[\s\-]?\d+)")
-        if rea:
-            self.data['Numero_REA'] = rea
-        
-        # Forma giuridica
-        forma = self.extract_pattern(text, r"(?:Forma giuridica|Natura giuridica)[:\s]*([^\n]+)")
-        if forma:
-            self.data['Forma_Giuridica'] = forma.strip()
-        
-        # Sede legale
-        sede = self.extract_pattern(text, r"(?:Sede legale|Indirizzo)[:\s]*([^\n]+?)(?:\d{5})")
-        if sede:
-            self.data['Sede_Legale'] = sede.strip()
-        
-        # CAP
-        cap = self.extract_pattern(text, r"(\d{5})")
-        if cap:
-            self.data['CAP'] = cap
-        
-        # Comune
-        comune = self.extract_pattern(text, r"\d{5}\s+([A-Z][A-Za-z\s]+?)(?:\(|Provincia)")
-        if comune:
-            self.data['Comune'] = comune.strip()
-        
-        # Provincia
-        provincia = self.extract_pattern(text, r"(?:Provincia|\()\s*([A-Z]{2})\s*(?:\)|$)")
-        if provincia:
-            self.data['Provincia'] = provincia
-        
-        # Data costituzione
-        data_cost = self.extract_pattern(text, r"(?:Data costituzione|Costituita il)[:\s]*(\d{2}/\d{2}/\d{4})")
-        if data_cost:
-            self.data['Data_Costituzione'] = data_cost
-        
-        # Capitale sociale
-        capitale = self.extract_pattern(text, r"(?:Capitale sociale|Capitale)[:\s]*(?:€|EUR)?\s*([\d.,]+)")
-        if capitale:
-            self.data['Capitale_Sociale'] = capitale
-        
-        # Stato attività
-        stato = self.extract_pattern(text, r"(?:Stato)[:\s]*(ATTIVA|CESSATA|SOSPESA)")
-        if stato:
-            self.data['Stato_Attivita'] = stato
-    
-    def parse_documento_identita(self, text):
-        """Analizza il testo del documento d'identità ed estrae i dati"""
-        
-        # Nome
-        nome = self.extract_pattern(text, r"(?:Nome|NOME)[:\s]*([A-Z][a-z]+)")
-        if nome:
-            self.data['Nome'] = nome
-        
-        # Cognome
-        cognome = self.extract_pattern(text, r"(?:Cognome|COGNOME)[:\s]*([A-Z]+)")
-        if cognome:
-            self.data['Cognome'] = cognome
-        
-        # Data di nascita
-        data_nascita = self.extract_pattern(text, r"(?:Nat[oa]|Data di nascita)[:\s]*(?:il\s*)?(\d{2}[/\.-]\d{2}[/\.-]\d{4})")
-        if data_nascita:
-            self.data['Data_Nascita'] = data_nascita
-        
-        # Luogo di nascita
-        luogo_nascita = self.extract_pattern(text, r"(?:Nat[oa]\s*a|Luogo di nascita)[:\s]*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)")
-        if luogo_nascita:
-            self.data['Luogo_Nascita'] = luogo_nascita
-        
-        # Codice Fiscale
-        cf = self.extract_pattern(text, r"([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])")
-        if cf:
-            self.data['CF_Persona'] = cf
-        
-        # Numero documento
-        numero_doc = self.extract_pattern(text, r"(?:N\.|Numero|NUMERO)[:\s]*([A-Z]{2}\d{7}|[A-Z0-9]{6,9})")
-        if numero_doc:
-            self.data['Numero_Documento'] = numero_doc
-        
-        # Data rilascio
-        data_rilascio = self.extract_pattern(text, r"(?:Rilasciato|Emesso|Data di rilascio)[:\s]*(?:il\s*)?(\d{2}[/\.-]\d{2}[/\.-]\d{4})")
-        if data_rilascio:
-            self.data['Data_Rilascio'] = data_rilascio
-        
-        # Data scadenza
-        data_scadenza = self.extract_pattern(text, r"(?:Scadenza|Valida fino al)[:\s]*(\d{2}[/\.-]\d{2}[/\.-]\d{4})")
-        if data_scadenza:
-            self.data['Data_Scadenza'] = data_scadenza
-        
-        # Tipo documento
-        tipo_doc = self.extract_pattern(text, r"(CARTA D'IDENTITA|PATENTE|PASSAPORTO)")
-        if tipo_doc:
-            self.data['Tipo_Documento'] = tipo_doc
-    
-    def extract_pattern(self, text, pattern):
-        """Estrae un pattern dal testo usando regex"""
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-        return match.group(1) if match else None
+    def engine(self):
+        """Motore di estrazione con le opzioni selezionate nell'interfaccia"""
+        return ExtractionEngine(self.ocr_backend_var.get(), id_layout=self.id_layout_var.get(),
+                                mrz=self.mrz_var.get(), escalation=self.escalation_var.get())
     
     def update_treeview(self):
         """Aggiorna la visualizzazione dei dati estratti"""
@@ -298,9 +189,8 @@ class DocumentExtractorApp:
         
         if filename:
             try:
-                # Crea DataFrame con una singola riga
-                df = pd.DataFrame([self.data])
-                df.to_excel(filename, index=False)
+                # Una singola riga, colonne nell'ordine dei campi
+                write_excel(filename, list(self.data), [self.data])
                 messagebox.showinfo("Successo", f"Dati esportati in {filename}")
             except Exception as e:
                 messagebox.showerror("Errore", f"Errore nell'esportazione: {str(e)}")
@@ -318,9 +208,8 @@ class DocumentExtractorApp:
         
         if filename:
             try:
-                # Crea DataFrame con una singola riga
-                df = pd.DataFrame([self.data])
-                df.to_csv(filename, index=False, sep=';', encoding='utf-8-sig')
+                # Una singola riga, colonne nell'ordine dei campi
+                write_csv(filename, list(self.data), [self.data])
                 messagebox.showinfo("Successo", f"Dati esportati in {filename}")
             except Exception as e:
                 messagebox.showerror("Errore", f"Errore nell'esportazione: {str(e)}")
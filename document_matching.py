@@ -0,0 +1,99 @@
+"""
+Abbinamento tra visure camerali e documenti d'identità nell'elaborazione batch
+Gli abbinamenti vengono risolti con indici hash costruiti una sola volta
+(codice fiscale della persona, codici contenuti nei nomi dei file), in tempo
+lineare nel numero di documenti. Per ogni coppia viene indicata la strategia
+che l'ha prodotta.
+"""
+
+from collections import namedtuple
+
+# Strategie di abbinamento, in ordine di priorità
+STRATEGY_CF = 'Codice fiscale'
+STRATEGY_FILENAME = 'Nome file'
+STRATEGY_ORDER = 'Ordine di caricamento'
+STRATEGY_NONE = 'Nessun abbinamento'
+
+# Lunghezze dei codici cercati nei nomi dei file (P.IVA / CF numerico, CF della persona)
+CODE_LENGTHS = (11, 16)
+
+# Coppia abbinata: visura e documento (dict vuoto se manca) e strategia usata
+MatchedPair = namedtuple('MatchedPair', ['visura', 'documento', 'strategy'])
+
+def _cf_index(documenti):
+    """CF della persona -> indice del primo documento con quel CF"""
+    index = {}
+    for j, doc in enumerate(documenti):
+        cf_persona = doc.get('CF_Persona', '')
+        if cf_persona:
+            index.setdefault(cf_persona, j)
+    return index
+
+def _filename_index(documenti):
+    """Sottostringa di un nome file (lunga quanto un codice) -> indici dei documenti"""
+    index = {}
+    for j, doc in enumerate(documenti):
+        name = doc.get('Nome_File', '').lower()
+        for length in CODE_LENGTHS:
+            for start in range(len(name) - length + 1):
+                found = index.setdefault(name[start:start + length], [])
+                if not found or found[-1] != j:
+                    found.append(j)
+    return index
+
+def match_documents(visure, documenti):
+    """Abbina visure e documenti e restituisce la lista di MatchedPair
+
+    1. codice fiscale dell'azienda uguale al CF della persona (impresa individuale)
+    2. codice fiscale o partita IVA dell'azienda contenuti nel nome file del documento
+    3. per ordine di caricamento, se restano tante visure quanti documenti
+    Le visure e i documenti rimasti senza coppia vengono restituiti da soli.
+    """
+    pairs = []
+    matched_visure = set()
+    matched_documenti = set()
+
+    # Strategia 1: match per codice fiscale
+    by_cf = _cf_index(documenti)
+    for i, visura in enumerate(visure):
+        cf_azienda = visura.get('Codice_Fiscale', '')
+        j = by_cf.get(cf_azienda) if cf_azienda else None
+        if j is not None:
+            pairs.append(MatchedPair(visura, documenti[j], STRATEGY_CF))
+            matched_visure.add(i)
+            matched_documenti.add(j)
+
+    # Strategia 2: codice dell'azienda nel nome file del documento
+    by_filename = _filename_index(documenti)
+    for i, visura in enumerate(visure):
+        if i in matched_visure:
+            continue
+        for code in (visura.get('Codice_Fiscale', ''), visura.get('Partita_IVA', '')):
+            if not code:
+                continue
+            j = next((j for j in by_filename.get(code.lower(), ()) if j not in matched_documenti), None)
+            if j is not None:
+                pairs.append(MatchedPair(visura, documenti[j], STRATEGY_FILENAME))
+                matched_visure.add(i)
+                matched_documenti.add(j)
+                break
+
+    # Strategia 3: abbinamento per ordine (se caricati in coppia)
+    remaining_visure = [visura for i, visura in enumerate(visure) if i not in matched_visure]
+    remaining_docs = [doc for j, doc in enumerate(documenti) if j not in matched_documenti]
+    if len(remaining_visure) == len(remaining_docs):
+        pairs.extend(MatchedPair(visura, doc, STRATEGY_ORDER)
+                     for visura, doc in zip(remaining_visure, remaining_docs))
+    else:
+        pairs.extend(MatchedPair(visura, {}, STRATEGY_NONE) for visura in remaining_visure)
+        pairs.extend(MatchedPair({}, doc, STRATEGY_NONE) for doc in remaining_docs)
+
+    return pairs
+
+def match_report(pairs):
+    """Righe di riepilogo: file della visura, file del documento e strategia"""
+    return [{
+        'File Visura': pair.visura.get('Nome_File', ''),
+        'File Documento': pair.documento.get('Nome_File', ''),
+        'Strategia': pair.strategy,
+    } for pair in pairs]
@@ -0,0 +1,378 @@
+"""
+Motore di estrazione senza interfaccia
+Tutta la logica di estrazione (lettura, testo del PDF o OCR dell'immagine con
+cache su disco, classificazione, regole di estrazione) in un modulo che non
+importa né Streamlit né tkinter: l'app desktop, l'app Streamlit e
+l'elaborazione batch sono interfacce sopra ExtractionEngine, che può essere
+usato anche da altre pipeline.
+
+    engine = ExtractionEngine(ocr_backend='tesserocr', id_layout=True)
+    result = engine.extract('visura.pdf')
+    for result in engine.extract_many(Path('documenti').glob('*.pdf'), workers=4):
+        print(result.name, result.doc_type, result.error or result.data)
+
+extract_many con più worker usa un pool di processi: ogni processo tiene il
+proprio motore OCR e le statistiche dei worker (regole, livelli di OCR, tempi
+per fase, profili) vengono sommate a quelle del processo chiamante.
+"""
+
+import io
+import signal
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import cached_property
+from pathlib import Path
+# PIL, numpy, PyPDF2 e le regole di estrazione vengono importati alla prima estrazione
+from text_cache import TextCache, get_default_cache, image_bytes, ocr_config_key, pdf_config_key
+from ocr_engine import get_engine, resolve_backend
+from metrics import (stage, stage_metrics, STAGE_READ, STAGE_TEXT, STAGE_OCR, STAGE_CLASSIFY,
+                     STAGE_PARSE)
+from profiling import document_profiler
+from document_discovery import sniff_bytes, SNIFF_BYTES, KIND_PDF
+from document_classifier import classify_document, DOC_VISURA, DOC_IDENTITA
+
+# Lingua e configurazione di tesseract comuni a batch, app desktop e Streamlit: fanno
+# parte della chiave della cache, così i testi estratti da un'app valgono per le altre
+OCR_LANG = 'ita'
+OCR_CONFIG = ''
+# Etichette dei tipi di documento nelle righe esportate
+DOC_LABELS = {DOC_VISURA: 'Visura Camerale', DOC_IDENTITA: 'Documento Identità'}
+LABEL_UNKNOWN = 'Non Riconosciuto'
+# Task in coda per worker in extract_many (non sottomette migliaia di file in anticipo)
+PENDING_PER_WORKER = 4
+
+# Risultato di un documento: doc_type None se non riconosciuto; text None se il PDF è
+# stato scartato al triage o in caso di errore; confidence None se il tipo è stato
+# indicato dal chiamante; error è il messaggio dell'eccezione (None se riuscito)
+ExtractionResult = namedtuple('ExtractionResult',
+                              ['name', 'path', 'doc_type', 'confidence', 'data', 'text', 'error'])
+
+def parse_fields(doc_type, text, stats=None):
+    """Campi estratti dal testo con le regole del tipo di documento indicato
+    stats: RuleStats in cui registrare le regole (None: quelle del processo)"""
+    from rule_engine import parse_visura_camerale, parse_documento_identita, rule_stats
+    stats = rule_stats if stats is None else stats
+    if doc_type == DOC_VISURA:
+        return parse_visura_camerale(text, stats)
+    return parse_documento_identita(text, stats)
+
+def doc_label(doc_type):
+    """Etichetta del tipo di documento (Tipo_File / Tipo_Documento)"""
+    return DOC_LABELS.get(doc_type, LABEL_UNKNOWN)
+
+def _describe(source, name=None):
+    """(nome, percorso) di una sorgente: percorso del file oppure contenuto in bytes"""
+    path = None if isinstance(source, (bytes, bytearray)) else Path(source)
+    if name is None:
+        name = path.name if path is not None else 'documento'
+    return name, path
+
+def _split_item(item):
+    """Elemento di extract_many -> (nome o None, sorgente)"""
+    return item if isinstance(item, tuple) else (None, item)
+
+def _error_result(item, error):
+    name, source = _split_item(item)
+    name, path = _describe(source, name)
+    return ExtractionResult(name, path, None, 0.0, {}, None, str(error))
+
+class ExtractionEngine:
+    """Estrae tipo e dati da visure camerali e documenti d'identità (PDF o immagini)"""
+
+    def __init__(self, ocr_backend=None, preprocess=None, id_layout=False, mrz=True,
+                 escalation=False, triage=False, early_stop=False, use_cache=True,
+                 lang=OCR_LANG, ocr_config=OCR_CONFIG):
+        # Motore OCR: tesserocr nel processo oppure pytesseract (uno per processo)
+        self.ocr_backend = resolve_backend(ocr_backend)
+        self.ocr_engine = get_engine(self.ocr_backend)
+        # Ritaglio, riduzione a 300 DPI, raddrizzamento e binarizzazione prima dell'OCR
+        # (None: DOC_EXTRACTOR_PREPROCESS, disattivato se non impostata)
+        self.preprocess = preprocess
+        # Immagini dei documenti d'identità lette a zone (CIE, carta cartacea, patente)
+        self.id_layout = id_layout
+        # Passaporti e CIE: se la MRZ è valida non serve l'OCR della pagina intera
+        self.mrz = mrz
+        # OCR a livelli: prima lettura rapida, riletture solo se CF, P.IVA o date non tornano
+        self.escalation = escalation
+        # Scarta i PDF non riconosciuti leggendo solo la prima pagina
+        self.triage = triage
+        # Legge le visure solo fino a quando i campi del template sono certi
+        self.early_stop = early_stop
+        self.use_cache = use_cache
+        self.text_cache = get_default_cache() if use_cache else TextCache(enabled=False)
+        self.lang = lang
+        self.ocr_config = ocr_config
+        # TierStats dei livelli di OCR (None: quelle del processo)
+        self.tier_stats = None
+
+    def options(self):
+        """Argomenti per ricreare lo stesso motore (es. in un processo worker)"""
+        return dict(ocr_backend=self.ocr_backend, preprocess=self.preprocess,
+                    id_layout=self.id_layout, mrz=self.mrz, escalation=self.escalation,
+                    triage=self.triage, early_stop=self.early_stop, use_cache=self.use_cache,
+                    lang=self.lang, ocr_config=self.ocr_config)
+
+    @cached_property
+    def preprocess_config(self):
+        """Configurazione del preprocessing (importa numpy solo quando serve)"""
+        from image_preprocessing import DEFAULT_PREPROCESS, FULL_PREPROCESS, NO_PREPROCESS
+        if self.preprocess is None:
+            return DEFAULT_PREPROCESS
+        return FULL_PREPROCESS if self.preprocess else NO_PREPROCESS
+
+    @cached_property
+    def ocr_tiers(self):
+        """Livelli dell'OCR a livelli per la configurazione di preprocessing in uso"""
+        from ocr_escalation import build_tiers
+        return build_tiers(self.preprocess_config)
+
+    def extract(self, source, name=None, doc_type=None):
+        """Estrae un documento (percorso o contenuto in bytes) e restituisce un
+        ExtractionResult; con doc_type il tipo non viene riconosciuto dal testo.
+        Le eccezioni vengono propagate (extract_many le riporta in result.error)"""
+        name, path = _describe(source, name)
+        with stage_metrics.document(name) as timer, document_profiler.document(name, timer, path):
+            content, kind = self.read(source)
+            text = self.document_text(content, kind)
+            if text is None:
+                # Scartato al triage: il resto del PDF non viene letto
+                return ExtractionResult(name, path, None, 0.0, {}, None, None)
+            found, confidence, data = self.parse(text, doc_type)
+            timer.note(tipo=found)
+            return ExtractionResult(name, path, found, confidence, data, text, None)
+
+    def extract_many(self, sources, workers=1, ordered=False):
+        """Estrae una sequenza di documenti restituendo i risultati man mano che sono
+        pronti (ordered=True: nell'ordine di input). sources contiene percorsi, bytes o
+        coppie (nome, percorso o bytes); viene consumata in modo lazy e un documento
+        con errori non interrompe gli altri (result.error)"""
+        if workers <= 1:
+            for item in sources:
+                yield self._extract_safely(item)
+            return
+
+        max_pending = workers * PENDING_PER_WORKER
+        with ExtractionPool(self, workers) as pool:
+            pending = deque()
+            for item in sources:
+                pending.append(pool.submit(item))
+                yield from pool.completed(pending, ordered, keep=max_pending - 1)
+            yield from pool.completed(pending, ordered, keep=0)
+
+    def _extract_safely(self, item):
+        """Estrae un elemento di extract_many intercettando gli errori"""
+        name, source = _split_item(item)
+        try:
+            return self.extract(source, name)
+        except Exception as e:
+            return _error_result(item, e)
+
+    def read(self, source):
+        """Contenuto e tipo (PDF o immagine, dai magic bytes) di un percorso o di bytes"""
+        with stage(STAGE_READ):
+            content = bytes(source) if isinstance(source, (bytes, bytearray)) else Path(source).read_bytes()
+            kind = sniff_bytes(content[:SNIFF_BYTES])
+        if kind is None:
+            raise ValueError("Formato non supportato: il documento non è né un PDF né un'immagine JPEG/PNG")
+        return content, kind
+
+    def document_text(self, content, kind):
+        """Testo del documento: del PDF (None se scartato al triage) o OCR dell'immagine"""
+        if kind == KIND_PDF:
+            return self.pdf_text(content)
+        return self.image_text(content)
+
+    def pdf_text(self, content, triage=None, early_stop=None):
+        """Testo di un PDF, con OCR solo sulle pagine scansionate (con cache su disco)
+        Con triage restituisce None se dalla prima pagina il tipo non è riconosciuto;
+        con early_stop le visure vengono lette solo fino ai campi del template"""
+        from pdf_text import extract_pdf_document_text
+        triage = self.triage if triage is None else triage
+        early_stop = self.early_stop if early_stop is None else early_stop
+        with stage(STAGE_TEXT):
+            return self.text_cache.get_or_compute(
+                content, pdf_config_key(self.ocr_config_key(), early_stop),
+                lambda: extract_pdf_document_text(content, self.ocr_image, triage, early_stop))
+
+    def image_text(self, image):
+        """Testo OCR di un'immagine (contenuto del file in bytes o immagine PIL già
+        aperta, convertita in scala di grigi) con cache su disco"""
+        from PIL import Image
+        if isinstance(image, (bytes, bytearray)):
+            content = bytes(image)
+            load = lambda: Image.open(io.BytesIO(content))
+        else:
+            if image.mode != 'L':
+                image = image.convert('L')
+            content = image_bytes(image)
+            load = lambda: image
+        with stage(STAGE_TEXT):
+            return self.text_cache.get_or_compute(content, self.image_config_key(),
+                                                  lambda: self.ocr_image_file(load()))
+
+    def ocr_image_file(self, image):
+        """OCR di un file immagine: dalla MRZ o a zone se è un documento d'identità
+        riconosciuto, altrimenti sull'intera pagina (a livelli se richiesto)
+
+        Carta e MRZ si cercano prima dell'OCR solo nelle immagini orizzontali; nelle
+        altre solo se il testo della pagina intera è di un documento d'identità."""
+        from id_card_layout import looks_like_card, read_document_image
+        from ocr_escalation import escalate, tier_stats
+        with stage(STAGE_OCR):
+            structured = self.mrz or self.id_layout
+            card_shaped = structured and looks_like_card(image)
+            if card_shaped:
+                text = read_document_image(image, self.ocr_engine, self.lang, self.mrz, self.id_layout)
+                if text is not None:
+                    return text
+            if self.escalation:
+                text = escalate(image, self.ocr_image, self.ocr_config, tiers=self.ocr_tiers,
+                                stats=self.tier_stats or tier_stats)
+            else:
+                text = self.ocr_image(image)
+            if structured and not card_shaped and classify_document(text).doc_type == DOC_IDENTITA:
+                return read_document_image(image, self.ocr_engine, self.lang, self.mrz,
+                                           self.id_layout) or text
+            return text
+
+    def ocr_image(self, image, preprocess=None, config=None):
+        """Esegue l'OCR di un'immagine PIL (dopo il preprocessing)"""
+        from image_preprocessing import preprocess_image
+        with stage(STAGE_OCR):
+            return self.ocr_engine.image_to_string(
+                preprocess_image(image, preprocess or self.preprocess_config), lang=self.lang,
+                config=self.ocr_config if config is None else config)
+
+    def ocr_config_key(self):
+        """Parte della chiave della cache relativa a motore OCR, lingua e preprocessing"""
+        from image_preprocessing import preprocess_key
+        return ocr_config_key(self.lang, self.ocr_config, preprocess_key(self.preprocess_config),
+                              self.ocr_engine.cache_label)
+
+    def image_config_key(self):
+        """Chiave della cache per le immagini: OCR più MRZ, zone e livelli se attivi"""
+        from id_card_layout import LAYOUT_CONFIG_KEY
+        from mrz import MRZ_CONFIG_KEY
+        from ocr_escalation import ESCALATION_CONFIG_KEY
+        config = self.ocr_config_key()
+        if self.mrz:
+            config = f"{config}|{MRZ_CONFIG_KEY}"
+        if self.id_layout:
+            config = f"{config}|{LAYOUT_CONFIG_KEY}"
+        if self.escalation:
+            config = f"{config}|{ESCALATION_CONFIG_KEY}"
+        return config
+
+    def classify(self, text):
+        """Tipo di documento riconosciuto dal testo (una sola passata)"""
+        with stage(STAGE_CLASSIFY):
+            return classify_document(text)
+
+    def parse(self, text, doc_type=None):
+        """(tipo, confidenza, campi) del testo; con doc_type il tipo non viene riconosciuto"""
+        confidence = None
+        if doc_type is None:
+            classification = self.classify(text)
+            doc_type, confidence = classification.doc_type, classification.confidence
+        if doc_type is None:
+            return None, confidence, {}
+        with stage(STAGE_PARSE):
+            return doc_type, confidence, parse_fields(doc_type, text)
+
+# Motore usato dai processi worker del pool (uno per processo)
+_worker_engine = None
+
+def _init_worker(options, metrics, profile):
+    """Inizializza il motore all'avvio di ogni processo worker (options: vedi
+    ExtractionEngine.options; metrics e profile: impostazioni del processo chiamante)"""
+    global _worker_engine
+    # L'interruzione (Ctrl+C / SIGTERM) è gestita dal processo principale
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Le righe delle metriche vanno al processo principale, non al log ereditato con fork
+    stage_metrics.close_log()
+    stage_metrics.reset()
+    stage_metrics.enabled = metrics
+    if profile is not None:
+        document_profiler.configure(*profile)
+    _worker_engine = ExtractionEngine(**options)
+
+def _extract_in_worker(item):
+    """Estrae un documento nel processo worker restituendo il risultato e le statistiche"""
+    from rule_engine import rule_stats
+    from ocr_escalation import tier_stats
+    result = _worker_engine._extract_safely(item)
+    # Le statistiche del worker vengono sommate a quelle del processo principale
+    stats = {'rules': rule_stats.snapshot(), 'ocr_tiers': tier_stats.snapshot(),
+             'metrics': stage_metrics.snapshot(), 'profile': document_profiler.snapshot()}
+    rule_stats.reset()
+    tier_stats.reset()
+    stage_metrics.reset()
+    document_profiler.reset()
+    return result, stats
+
+class ExtractionPool:
+    """Estrazioni concorrenti sottomesse una alla volta (extract_many, modalità continua):
+    processi worker se workers > 1, altrimenti un thread del processo corrente"""
+
+    def __init__(self, engine, workers=1):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        self.items = {}
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(engine.options(), stage_metrics.enabled, document_profiler.settings()))
+            self.task = _extract_in_worker
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            # Nello stesso processo le statistiche sono già condivise
+            self.task = lambda item: (engine._extract_safely(item), None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+        return False
+
+    def submit(self, item):
+        """Sottomette un elemento (percorso, bytes o (nome, sorgente)); restituisce il future"""
+        future = self.executor.submit(self.task, item)
+        self.items[future] = item
+        return future
+
+    def collect(self, future):
+        """Attende il risultato di un task; un worker terminato non blocca gli altri"""
+        item = self.items.pop(future)
+        try:
+            result, stats = future.result()
+        except Exception as e:
+            return _error_result(item, e)
+        if stats:
+            from rule_engine import rule_stats
+            from ocr_escalation import tier_stats
+            rule_stats.merge(stats['rules'])
+            tier_stats.merge(stats['ocr_tiers'])
+            stage_metrics.merge(stats['metrics'])
+            document_profiler.merge(stats['profile'])
+        return result
+
+    def completed(self, pending, ordered=False, keep=0):
+        """Restituisce i risultati già pronti e attende gli altri finché in pending
+        (deque di future) restano al massimo keep task"""
+        if ordered:
+            while pending and (len(pending) > keep or pending[0].done()):
+                yield self.collect(pending.popleft())
+            return
+        while pending:
+            done = [future for future in pending if future.done()]
+            if not done:
+                if len(pending) <= keep:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield self.collect(future)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
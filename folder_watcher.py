@@ -0,0 +1,134 @@
+"""
+Monitoraggio di una cartella per l'acquisizione continua di documenti
+Usa watchdog (inotify su Linux) se installato, altrimenti un polling periodico
+con os.scandir. Un file viene considerato pronto solo quando dimensione e data
+di modifica restano invariate per settle_time secondi (copia completata).
+Con recursive=True vengono osservate anche le sottocartelle.
+"""
+
+import os
+import queue
+import time
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class _EventHandler(FileSystemEventHandler):
+    """Inoltra in una coda i percorsi dei file creati, modificati o spostati"""
+
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.events.put(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.events.put(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.events.put(event.dest_path)
+
+class FolderWatcher:
+    """Rileva i documenti nuovi o modificati in una cartella"""
+
+    def __init__(self, folder, is_candidate, poll_interval=1.0, settle_time=1.0, use_events=True,
+                 recursive=False):
+        self.folder = str(folder)
+        self.is_candidate = is_candidate
+        self.recursive = recursive
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.use_events = use_events and Observer is not None
+        self.mode = 'eventi (watchdog)' if self.use_events else f'polling ogni {poll_interval}s'
+        self._events = queue.Queue()
+        self._observer = None
+
+    def _scan(self):
+        """Elenca i file candidati presenti nella cartella (e nelle sottocartelle)"""
+        stack = [self.folder]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        # I link a cartelle non vengono seguiti (niente cicli)
+                        if self.recursive and entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file() and self.is_candidate(entry.path):
+                            yield entry.path
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+    def _start_observer(self):
+        """Avvia l'osservatore di eventi del file system"""
+        self._observer = Observer()
+        self._observer.schedule(_EventHandler(self._events), self.folder, recursive=self.recursive)
+        self._observer.start()
+
+    def stop(self):
+        """Ferma l'osservatore di eventi, se attivo"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def _wait_for_changes(self):
+        """Attende il prossimo giro e restituisce i percorsi da ricontrollare"""
+        if not self.use_events:
+            time.sleep(self.poll_interval)
+            return list(self._scan())
+        changed = []
+        try:
+            # Risveglio rapido sugli eventi, timeout breve per i file in assestamento
+            changed.append(self._events.get(timeout=min(self.poll_interval, 0.25)))
+            while True:
+                changed.append(self._events.get_nowait())
+        except queue.Empty:
+            pass
+        return [path for path in changed if self.is_candidate(path)]
+
+    def iter_ready(self):
+        """Generatore infinito: ad ogni giro restituisce la lista dei file pronti (anche vuota)"""
+        pending = {}    # percorso -> (dimensione, mtime, istante dell'ultima variazione)
+        processed = {}  # percorso -> (dimensione, mtime) al momento della consegna
+
+        if self.use_events:
+            self._start_observer()
+        try:
+            changed = list(self._scan())
+            while True:
+                now = time.monotonic()
+                for path in changed:
+                    if path not in pending:
+                        pending[path] = (None, None, now)
+
+                ready = []
+                for path, (size, mtime, since) in list(pending.items()):
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        del pending[path]
+                        continue
+                    current = (stat.st_size, stat.st_mtime)
+                    if processed.get(path) == current:
+                        # Già consegnato e non modificato
+                        del pending[path]
+                    elif (size, mtime) != current:
+                        pending[path] = (*current, now)
+                    elif stat.st_size > 0 and now - since >= self.settle_time:
+                        del pending[path]
+                        processed[path] = current
+                        ready.append(path)
+
+                yield ready
+                changed = self._wait_for_changes()
+        finally:
+            self.stop()
@@ -0,0 +1,325 @@
+"""
+Lettura a zone dei documenti d'identità italiani
+Per i formati noti (CIE 3.0 fronte e retro, carta d'identità cartacea, patente)
+la carta viene individuata e raddrizzata, poi ogni campo viene letto con l'OCR
+solo nella sua zona, con il PSM adatto (riga singola) e una whitelist di
+caratteri (cifre per le date, [A-Z0-9] per codice fiscale e numero del
+documento). Le zone vengono lette in parallelo da un pool di thread del modulo,
+creato una volta sola: i thread restano vivi tra una carta e l'altra e con
+tesserocr riusano le API di tesseract già inizializzate (una per thread).
+Le zone sono frazioni della carta: i valori sono indicativi e vanno verificati
+su documenti reali. Se il formato non viene riconosciuto si torna all'OCR della
+pagina intera.
+"""
+
+import math
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import document_bbox, estimate_skew, otsu_threshold
+from mrz import read_mrz
+from rule_engine import format_layout_text
+
+LAYOUT_CIE_FRONTE = 'cie_fronte'
+LAYOUT_CIE_RETRO = 'cie_retro'
+LAYOUT_CARTACEA = 'carta_cartacea'
+LAYOUT_PATENTE = 'patente'
+
+# Parte della chiave della cache per i documenti letti a zone
+LAYOUT_CONFIG_KEY = 'zone-documenti'
+
+# Larghezza della carta normalizzata (85.6 mm a circa 300 DPI)
+CARD_WIDTH = 1012
+# Formato ID-1 (CIE, patente): 85.6 x 54 mm
+ID1_RATIO = 85.6 / 54
+RATIO_TOLERANCE = 0.15
+# Localizzazione: larghezza della foto ridotta su cui si cercano i bordi della
+# carta, soglia del gradiente e quota di riga/colonna coperta da un bordo (contano
+# solo il primo e l'ultimo bordo: le righe di testo dentro la carta non disturbano)
+SEARCH_WIDTH = 2 * CARD_WIDTH
+BORDER_EDGE_THRESHOLD = 30
+BORDER_DENSITY = 0.15
+# Pixel di deriva tollerati lungo un bordo (rotazione residua dopo il raddrizzamento)
+BORDER_TOLERANCE = 4
+# Margine della seconda ricerca, a piena risoluzione, se la carta è piccola nella foto
+REFINE_MARGIN = 0.05
+# Lato minimo della carta (quota della foto) e proporzioni ammesse per il riquadro
+MIN_CARD_SPAN = 0.15
+MIN_CARD_RATIO = 1.0
+MAX_CARD_RATIO = 2.0
+# Fascia superiore letta per riconoscere il formato
+HEADER_BAND = (0.0, 0.0, 1.0, 0.3)
+MAX_CARD_SKEW = 15.0
+MIN_SKEW = 0.2
+# Zone lette in parallelo
+REGION_WORKERS = 4
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+DIGITS = '0123456789'
+
+# Tipo di campo -> configurazione tesseract (PSM e whitelist)
+FIELD_CONFIGS = {
+    'testo': '--psm 7',
+    'righe': '--psm 6',
+    'data': f'--psm 7 -c tessedit_char_whitelist={DIGITS}./',
+    'codice': f'--psm 7 -c tessedit_char_whitelist={LETTERS}{DIGITS}',
+    'sesso': '--psm 10 -c tessedit_char_whitelist=MF',
+}
+
+# Zona di un campo: (left, top, right, bottom) in frazioni della carta
+Region = namedtuple('Region', ['field', 'box', 'kind'])
+Layout = namedtuple('Layout', ['name', 'tipo_documento', 'regions'])
+
+LAYOUTS = {
+    LAYOUT_CIE_FRONTE: Layout(LAYOUT_CIE_FRONTE, "CARTA D'IDENTITA", (
+        Region('Numero_Documento', (0.72, 0.04, 0.98, 0.14), 'codice'),
+        Region('Comune_Rilascio', (0.30, 0.17, 0.75, 0.25), 'testo'),
+        Region('Cognome', (0.30, 0.30, 0.80, 0.37), 'testo'),
+        Region('Nome', (0.30, 0.40, 0.80, 0.47), 'testo'),
+        Region('Nascita', (0.30, 0.50, 0.85, 0.57), 'testo'),
+        Region('Sesso', (0.30, 0.60, 0.40, 0.67), 'sesso'),
+        Region('Data_Rilascio', (0.30, 0.72, 0.55, 0.79), 'data'),
+        Region('Data_Scadenza', (0.58, 0.72, 0.85, 0.79), 'data'),
+    )),
+    LAYOUT_CIE_RETRO: Layout(LAYOUT_CIE_RETRO, "CARTA D'IDENTITA", (
+        Region('CF_Persona', (0.05, 0.10, 0.45, 0.18), 'codice'),
+        Region('Residenza', (0.05, 0.28, 0.70, 0.42), 'righe'),
+    )),
+    LAYOUT_CARTACEA: Layout(LAYOUT_CARTACEA, "CARTA D'IDENTITA", (
+        Region('Numero_Documento', (0.55, 0.03, 0.95, 0.12), 'codice'),
+        Region('Cognome', (0.30, 0.18, 0.95, 0.26), 'testo'),
+        Region('Nome', (0.30, 0.27, 0.95, 0.35), 'testo'),
+        Region('Data_Nascita', (0.30, 0.36, 0.70, 0.44), 'data'),
+        Region('Luogo_Nascita', (0.30, 0.50, 0.95, 0.58), 'testo'),
+        Region('Residenza', (0.30, 0.68, 0.95, 0.84), 'righe'),
+    )),
+    LAYOUT_PATENTE: Layout(LAYOUT_PATENTE, 'PATENTE', (
+        Region('Cognome', (0.33, 0.20, 0.95, 0.28), 'testo'),
+        Region('Nome', (0.33, 0.29, 0.95, 0.37), 'testo'),
+        Region('Nascita', (0.33, 0.38, 0.95, 0.46), 'testo'),
+        Region('Data_Rilascio', (0.33, 0.47, 0.60, 0.55), 'data'),
+        Region('Comune_Rilascio', (0.62, 0.47, 0.95, 0.55), 'testo'),
+        Region('Data_Scadenza', (0.33, 0.56, 0.60, 0.64), 'data'),
+        Region('Numero_Documento', (0.33, 0.74, 0.80, 0.82), 'codice'),
+    )),
+}
+
+_DATE = re.compile(r"(\d{1,2})[./\-\s](\d{1,2})[./\-\s](\d{2,4})")
+_PROVINCIA = re.compile(r"\(\s*([A-Z]{2})\s*\)")
+
+# Risultato: formato riconosciuto, campi letti e testo da mettere in cache
+IdCardReading = namedtuple('IdCardReading', ['layout', 'fields', 'text'])
+
+def _normalize_date(value):
+    """Data in formato gg/mm/aaaa (anno a 2 cifre come nelle regole del documento)"""
+    match = _DATE.search(value)
+    if not match:
+        return ''
+    day, month, year = match.groups()
+    if len(year) == 2:
+        year = f"19{year}" if int(year) > 30 else f"20{year}"
+    return f"{int(day):02d}/{int(month):02d}/{year}"
+
+def _split_nascita(value):
+    """Campo composto 'luogo (PR) data' o 'data luogo (PR)' -> campi separati"""
+    fields = {'Data_Nascita': _normalize_date(value)}
+    provincia = _PROVINCIA.search(value)
+    if provincia:
+        fields['Provincia_Nascita'] = provincia.group(1)
+    luogo = _PROVINCIA.sub(' ', _DATE.sub(' ', value))
+    fields['Luogo_Nascita'] = ' '.join(luogo.split())
+    return fields
+
+def _border_span(edges, axis, length):
+    """Primo e ultimo bordo lungo (riga o colonna coperta per almeno BORDER_DENSITY)"""
+    # Un bordo appena inclinato cade su righe vicine: si uniscono BORDER_TOLERANCE righe
+    spread = edges.copy()
+    along = 1 - axis
+    for shift in range(1, BORDER_TOLERANCE + 1):
+        if along == 0:
+            spread[shift:] |= edges[:-shift]
+        else:
+            spread[:, shift:] |= edges[:, :-shift]
+    lines = np.flatnonzero(spread.mean(axis=axis) > BORDER_DENSITY)
+    if len(lines) < 2 or lines[-1] - lines[0] < length * MIN_CARD_SPAN:
+        return None
+    return int(lines[0]), int(lines[-1]) + 1
+
+def card_bbox(gray, valid=None):
+    """Riquadro della carta raddrizzata dai suoi bordi (righe e colonne rettilinee),
+    None se i bordi non si distinguono dallo sfondo
+
+    valid: maschera dei pixel della foto (False negli angoli aggiunti dalla rotazione).
+    """
+    pixels = np.asarray(gray, dtype=np.int16)
+    horizontal = np.abs(np.diff(pixels, axis=0)) > BORDER_EDGE_THRESHOLD
+    vertical = np.abs(np.diff(pixels, axis=1)) > BORDER_EDGE_THRESHOLD
+    if valid is not None:
+        horizontal &= valid[1:] & valid[:-1]
+        vertical &= valid[:, 1:] & valid[:, :-1]
+    rows = _border_span(horizontal, 1, pixels.shape[0])
+    cols = _border_span(vertical, 0, pixels.shape[1])
+    if rows is None or cols is None:
+        return None
+    ratio = (cols[1] - cols[0]) / (rows[1] - rows[0])
+    if not MIN_CARD_RATIO <= ratio <= MAX_CARD_RATIO:
+        return None
+    return cols[0], rows[0], cols[1], rows[1]
+
+def _straighten(gray, max_skew):
+    """Immagine raddrizzata, angolo applicato e riquadro della carta (None se non trovato)"""
+    pixels = np.asarray(gray)
+    angle = estimate_skew(pixels, max_skew)
+    if abs(angle) < MIN_SKEW:
+        return gray, 0.0, card_bbox(gray)
+    # Il contorno degli angoli aggiunti dalla rotazione non è un bordo della carta:
+    # la maschera dei pixel della foto, ristretta di qualche pixel, lo esclude
+    mask = Image.new('L', gray.size, 0)
+    frame = BORDER_TOLERANCE
+    mask.paste(255, (frame, frame, gray.size[0] - frame, gray.size[1] - frame))
+    valid = np.asarray(mask.rotate(angle, expand=True, fillcolor=0)) == 255
+    gray = gray.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=int(np.median(pixels)))
+    return gray, angle, card_bbox(gray, valid)
+
+def _source_box(box, angle, size, rotated_size):
+    """Riquadro (allineato agli assi) che contiene nell'immagine originale il riquadro
+    box dell'immagine ruotata di angle gradi (rotate con expand=True)"""
+    radians = math.radians(angle)
+    cos, sin = math.cos(radians), math.sin(radians)
+    xs, ys = [], []
+    for x in (box[0], box[2]):
+        for y in (box[1], box[3]):
+            dx, dy = x - rotated_size[0] / 2, y - rotated_size[1] / 2
+            xs.append(size[0] / 2 + dx * cos - dy * sin)
+            ys.append(size[1] / 2 + dx * sin + dy * cos)
+    return min(xs), min(ys), max(xs), max(ys)
+
+def locate_card(image, max_skew=MAX_CARD_SKEW):
+    """Ritaglia la carta dalla foto, la raddrizza e la porta a larghezza CARD_WIDTH"""
+    gray = image if image.mode == 'L' else image.convert('L')
+    proxy = _resize_width(gray, SEARCH_WIDTH)
+    rotated, angle, bbox = _straighten(proxy, max_skew)
+    if bbox is not None and bbox[2] - bbox[0] < CARD_WIDTH and gray.size[0] > proxy.size[0]:
+        # Carta piccola nella foto: si cerca di nuovo nella sua zona a piena risoluzione
+        scale = gray.size[0] / proxy.size[0]
+        left, top, right, bottom = _source_box(bbox, angle, proxy.size, rotated.size)
+        margin = REFINE_MARGIN * max(right - left, bottom - top)
+        gray = gray.crop((max(0, int((left - margin) * scale)), max(0, int((top - margin) * scale)),
+                          min(gray.size[0], math.ceil((right + margin) * scale)),
+                          min(gray.size[1], math.ceil((bottom + margin) * scale))))
+        rotated, angle, bbox = _straighten(_resize_width(gray, SEARCH_WIDTH), max_skew)
+    # Se i bordi non si distinguono dallo sfondo si usa la zona del testo
+    bbox = bbox or document_bbox(rotated, margin=0)
+    if bbox is not None:
+        rotated = rotated.crop(bbox)
+    return _resize_width(rotated, CARD_WIDTH)
+
+def _resize_width(image, width):
+    """Ridimensiona alla larghezza indicata mantenendo le proporzioni"""
+    if image.size[0] <= width and width != CARD_WIDTH:
+        return image
+    height = max(1, round(image.size[1] * width / image.size[0]))
+    return image.resize((width, height), Image.BOX if image.size[0] > width else Image.BICUBIC)
+
+def _crop(card, box):
+    """Zona della carta binarizzata con la soglia di Otsu"""
+    width, height = card.size
+    left, top, right, bottom = box
+    gray = np.asarray(card.crop((int(left * width), int(top * height),
+                                 math.ceil(right * width), math.ceil(bottom * height))))
+    return Image.fromarray(np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8))
+
+def detect_layout(card, engine, lang='ita'):
+    """Riconosce il formato dalla fascia superiore della carta e dalle proporzioni"""
+    header = engine.image_to_string(_crop(card, HEADER_BAND), lang, '--psm 6').upper()
+    if 'PATENTE' in header or 'DRIVING' in header:
+        return LAYOUTS[LAYOUT_PATENTE]
+    if 'FISCAL' in header or 'RESIDENZA' in header or 'RESIDENCE' in header:
+        return LAYOUTS[LAYOUT_CIE_RETRO]
+    if 'IDENTIT' in header:
+        ratio = card.size[0] / card.size[1]
+        if abs(ratio - ID1_RATIO) <= RATIO_TOLERANCE:
+            return LAYOUTS[LAYOUT_CIE_FRONTE]
+        return LAYOUTS[LAYOUT_CARTACEA]
+    return None
+
+# Pool di thread per la lettura delle zone, uno per numero di thread (creati alla prima carta)
+_executors = {}
+_executors_lock = threading.Lock()
+
+def region_executor(workers=REGION_WORKERS):
+    """Pool di thread condiviso dal processo per la lettura delle zone"""
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='zone-documenti')
+        return executor
+
+def read_regions(card, layout, engine, lang='ita', workers=REGION_WORKERS):
+    """Legge in parallelo le zone del formato e restituisce i valori grezzi per campo"""
+    def read(region):
+        text = engine.image_to_string(_crop(card, region.box), lang, FIELD_CONFIGS[region.kind])
+        return region.field, ' '.join(text.split())
+
+    return dict(region_executor(workers).map(read, layout.regions))
+
+def read_id_card(image, engine, lang='ita', layout=None, workers=REGION_WORKERS):
+    """Lettura a zone di un documento d'identità; None se il formato non è riconosciuto
+
+    layout: nome del formato (LAYOUT_*) per saltare il riconoscimento automatico.
+    """
+    return read_card_regions(locate_card(image), engine, lang, layout, workers)
+
+def read_card_regions(card, engine, lang='ita', layout=None, workers=REGION_WORKERS):
+    """Lettura a zone di una carta già localizzata (vedi read_id_card)"""
+    layout = LAYOUTS[layout] if layout else detect_layout(card, engine, lang)
+    if layout is None:
+        return None
+
+    fields = {'Tipo_Documento': layout.tipo_documento}
+    for field, value in read_regions(card, layout, engine, lang, workers).items():
+        if not value:
+            continue
+        if field == 'Nascita':
+            fields.update({key: val for key, val in _split_nascita(value).items() if val})
+        elif field.startswith('Data_'):
+            date = _normalize_date(value)
+            if date:
+                fields[field] = date
+        else:
+            fields[field] = value
+    return IdCardReading(layout.name, fields, format_layout_text(layout.name, fields))
+
+def looks_like_card(image):
+    """True se l'immagine è orizzontale come una carta, la pagina dati di un passaporto
+    o la foto di un documento; le pagine scansionate in verticale no"""
+    width, height = image.size
+    return MIN_CARD_RATIO <= width / height <= MAX_CARD_RATIO
+
+def read_document_image(image, engine, lang='ita', mrz=True, layout=False):
+    """Testo strutturato di una foto di documento d'identità, None se va letta per intero
+
+    mrz: cerca la MRZ (passaporti, CIE); se le cifre di controllo tornano i suoi
+    campi bastano. layout: lettura a zone dei formati noti, che completa la MRZ
+    con i campi che non vi compaiono (codice fiscale e residenza sul retro della CIE).
+    """
+    card = locate_card(image)
+    reading = read_mrz(card, engine, lang) if mrz else None
+    zones = read_card_regions(card, engine, lang) if layout else None
+    if reading is None and zones is None:
+        return None
+    if reading is None:
+        return zones.text
+    name = f"mrz_{reading.format}"
+    fields = reading.fields
+    if zones is not None:
+        # I campi della MRZ sono verificati dalle cifre di controllo: prevalgono
+        name = f"{zones.layout}+{name}"
+        fields = {**zones.fields, **reading.fields}
+    return format_layout_text(name, fields)
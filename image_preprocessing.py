@@ -0,0 +1,202 @@
+"""
+Preprocessing delle immagini prima dell'OCR
+Le foto dei documenti d'identità fatte col telefono arrivano a 12-48 MP, ma a
+tesseract bastano circa 300 DPI: l'immagine viene ritagliata sul documento,
+ridotta alla risoluzione utile, raddrizzata e binarizzata (soglia di Otsu).
+Le operazioni sui pixel lavorano su array NumPy o su primitive C di Pillow.
+Il preprocessing è disattivato di default finché l'effetto sull'accuratezza
+dell'OCR non è misurato su documenti reali: si attiva con --preprocess o con
+DOC_EXTRACTOR_PREPROCESS=1.
+"""
+
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+# Configurazione del preprocessing; il default si può cambiare con le variabili d'ambiente
+PreprocessConfig = namedtuple('PreprocessConfig', [
+    'enabled',                # False: l'immagine viene solo convertita in scala di grigi
+    'target_dpi',             # risoluzione effettiva a cui ridurre (mai ingrandire)
+    'card_long_side_mm',      # lato lungo presunto se i DPI non sono noti: carta (ID-1)
+    'page_long_side_mm',      # ... e pagina (A4)
+    'crop',                   # ritaglio sul riquadro del documento
+    'deskew',                 # correzione della rotazione
+    'max_skew',               # rotazione massima cercata (gradi)
+    'binarize',               # binarizzazione con soglia di Otsu
+], defaults=(True, 300, 85.6, 297, True, True, 10.0, True))
+
+# Preprocessing completo, usato quando viene attivato
+FULL_PREPROCESS = PreprocessConfig(target_dpi=int(os.environ.get('DOC_EXTRACTOR_OCR_DPI', '300')))
+NO_PREPROCESS = PreprocessConfig(enabled=False)
+# Solo riduzione della risoluzione, senza ritaglio, raddrizzamento e binarizzazione
+DOWNSCALE_ONLY = PreprocessConfig(crop=False, deskew=False, binarize=False)
+PREPROCESS_ENABLED = os.environ.get('DOC_EXTRACTOR_PREPROCESS', '0').lower() in ('1', 'true', 'yes')
+DEFAULT_PREPROCESS = FULL_PREPROCESS if PREPROCESS_ENABLED else NO_PREPROCESS
+
+# DPI dei metadati considerati attendibili (le foto del telefono dichiarano 72 DPI)
+MIN_TRUSTED_DPI = 100
+MAX_DOCUMENT_INCHES = 17
+# Sotto questo rapporto non conviene ridimensionare
+MIN_DOWNSCALE = 0.95
+# Ritaglio: lato dell'immagine ridotta su cui si cercano i bordi, soglia del
+# gradiente, densità minima di bordi per riga/colonna e buchi tollerati
+CROP_PROXY_SIDE = 800
+CROP_EDGE_THRESHOLD = 40
+CROP_MIN_EDGE_DENSITY = 0.02
+CROP_MAX_GAP = 0.05
+CROP_MARGIN = 0.02
+# Se il riquadro copre quasi tutta l'immagine il ritaglio viene saltato
+CROP_MAX_AREA = 0.9
+# Raddrizzamento: lato dell'immagine campionata, soglia dei bordi dei caratteri,
+# punti usati e rotazione minima applicata
+SKEW_SAMPLE_SIDE = 1200
+SKEW_EDGE_THRESHOLD = 40
+SKEW_MAX_POINTS = 200000
+SKEW_MIN_POINTS = 500
+SKEW_MIN_ANGLE = 0.2
+
+def preprocess_key(config=DEFAULT_PREPROCESS):
+    """Parte di chiave della cache relativa al preprocessing ('' se disattivato)"""
+    if not config.enabled:
+        return ''
+    return (f"prep|dpi={config.target_dpi}|"
+            f"doc={config.card_long_side_mm}/{config.page_long_side_mm}mm|"
+            f"crop={int(config.crop)}|deskew={config.max_skew if config.deskew else 0}|"
+            f"otsu={int(config.binarize)}")
+
+def metadata_dpi(image):
+    """DPI dichiarati dall'immagine, se plausibili per un documento (altrimenti None)"""
+    dpi = image.info.get('dpi')
+    if not dpi:
+        return None
+    dpi = float(dpi[0] if isinstance(dpi, tuple) else dpi)
+    if dpi < MIN_TRUSTED_DPI or max(image.size) / dpi > MAX_DOCUMENT_INCHES:
+        return None
+    return dpi
+
+def _dense_span(density, threshold, max_gap):
+    """Intervallo più lungo di indici con densità sopra soglia, con buchi fino a max_gap"""
+    indices = np.flatnonzero(density > threshold)
+    if not len(indices):
+        return None
+    breaks = np.flatnonzero(np.diff(indices) > max_gap)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(indices) - 1]))
+    longest = np.argmax(indices[ends] - indices[starts])
+    return int(indices[starts[longest]]), int(indices[ends[longest]]) + 1
+
+def document_bbox(image, margin=CROP_MARGIN):
+    """Riquadro (left, top, right, bottom) del documento nell'immagine, None se non
+    si distingue dallo sfondo: è la zona con più bordi (testo, foto, contorni)"""
+    factor = max(1, math.ceil(max(image.size) / CROP_PROXY_SIDE))
+    proxy = image.reduce(factor) if factor > 1 else image
+    gray = np.asarray(proxy.convert('L'), dtype=np.int16)
+    edges = np.zeros(gray.shape, dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(gray, axis=1)) > CROP_EDGE_THRESHOLD
+    edges[1:, :] |= np.abs(np.diff(gray, axis=0)) > CROP_EDGE_THRESHOLD
+
+    height, width = gray.shape
+    rows = _dense_span(edges.mean(axis=1), CROP_MIN_EDGE_DENSITY, CROP_MAX_GAP * height)
+    cols = _dense_span(edges.mean(axis=0), CROP_MIN_EDGE_DENSITY, CROP_MAX_GAP * width)
+    if rows is None or cols is None:
+        return None
+    margin_y, margin_x = margin * height, margin * width
+    top, bottom = max(0, rows[0] - margin_y), min(height, rows[1] + margin_y)
+    left, right = max(0, cols[0] - margin_x), min(width, cols[1] + margin_x)
+    if (bottom - top) * (right - left) >= CROP_MAX_AREA * height * width:
+        return None
+    # Coordinate sull'immagine originale
+    scale_x, scale_y = image.size[0] / width, image.size[1] / height
+    return (int(left * scale_x), int(top * scale_y),
+            min(image.size[0], math.ceil(right * scale_x)), min(image.size[1], math.ceil(bottom * scale_y)))
+
+def downscale_to_dpi(image, dpi, target_dpi):
+    """Riduce l'immagine alla risoluzione effettiva target_dpi (mai ingrandita)"""
+    scale = target_dpi / dpi
+    if scale >= MIN_DOWNSCALE:
+        return image
+    size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+    # Media per area: antialiasing corretto in riduzione e molto più veloce di LANCZOS
+    return image.resize(size, Image.BOX)
+
+def otsu_threshold(gray):
+    """Soglia di Otsu di un array uint8 in scala di grigi"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+    return int(np.argmax(weight_bg * weight_fg * (mean_bg - mean_fg) ** 2))
+
+def estimate_skew(gray, max_angle):
+    """Angolo (gradi, antiorario) che allinea le righe di testo all'orizzontale
+
+    Profilo di proiezione: i bordi verticali dei caratteri vengono proiettati
+    sulle righe dopo un taglio (shear) di prova; l'angolo giusto rende
+    l'istogramma più "a picchi". Le zone uniformi (sfondo, foto) non contano.
+    """
+    step = max(1, math.ceil(max(gray.shape) / SKEW_SAMPLE_SIDE))
+    sample = gray[::step, ::step].astype(np.int16)
+    ys, xs = np.nonzero(np.abs(np.diff(sample, axis=1)) > SKEW_EDGE_THRESHOLD)
+    if len(ys) < SKEW_MIN_POINTS:
+        return 0.0
+    if len(ys) > SKEW_MAX_POINTS:
+        stride = math.ceil(len(ys) / SKEW_MAX_POINTS)
+        ys, xs = ys[::stride], xs[::stride]
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+
+    def peakedness(angle):
+        rows = ys - xs * math.tan(math.radians(angle))
+        hist = np.bincount((rows - rows.min()).astype(np.intp))
+        return float(np.dot(hist, hist))
+
+    coarse = np.arange(-max_angle, max_angle + 1e-9, 1.0)
+    best = max(coarse, key=peakedness)
+    fine = np.arange(best - 1.0, best + 1.0 + 1e-9, 0.1)
+    return round(float(max(fine, key=peakedness)), 1)
+
+def assumed_long_side_mm(image, config):
+    """Lato lungo presunto del documento ritagliato: carta se orizzontale (le foto dei
+    documenti d'identità), pagina A4 se verticale (le scansioni)"""
+    width, height = image.size
+    return config.card_long_side_mm if width >= height else config.page_long_side_mm
+
+def preprocess_image(image, config=DEFAULT_PREPROCESS):
+    """Prepara un'immagine PIL per l'OCR e restituisce un'immagine in scala di grigi
+    (binarizzata se richiesto)"""
+    if not config.enabled:
+        return image if image.mode == 'L' else image.convert('L')
+    if image.mode not in ('L', 'RGB'):
+        # Palette, CMYK, alfa, 16 bit: all'OCR serve comunque il grigio
+        image = image.convert('L')
+    dpi = metadata_dpi(image)
+    # Il riquadro si cerca su una copia ridotta; grigio solo sulla parte ritagliata
+    if config.crop:
+        bbox = document_bbox(image)
+        if bbox is not None:
+            image = image.crop(bbox)
+    if image.mode != 'L':
+        image = image.convert('L')
+    if config.target_dpi:
+        # Senza DPI attendibili la risoluzione si stima dal lato lungo del documento
+        dpi = dpi or max(image.size) / (assumed_long_side_mm(image, config) / 25.4)
+        image = downscale_to_dpi(image, dpi, config.target_dpi)
+
+    if not (config.deskew or config.binarize):
+        return image
+    gray = np.asarray(image)
+    threshold = otsu_threshold(gray)
+    if config.deskew:
+        angle = estimate_skew(gray, config.max_skew)
+        if abs(angle) >= SKEW_MIN_ANGLE:
+            image = image.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+            gray = np.asarray(image)
+    if config.binarize:
+        gray = np.where(gray > threshold, 255, 0).astype(np.uint8)
+    return Image.fromarray(gray)
@@ -0,0 +1,269 @@
+"""
+Tempi per fase dell'elaborazione dei documenti
+Ogni documento viene cronometrato fase per fase (lettura del file, estrazione
+del testo, OCR, classificazione, estrazione dei campi); l'esportazione viene
+misurata una volta per batch. Le fasi annidate (l'OCR delle pagine scansionate
+dentro l'estrazione del testo del PDF) contano solo nella fase più interna,
+quindi la somma delle fasi è il tempo del documento.
+
+Per ogni documento viene prodotta una riga JSON; al termine percentili
+p50/p95/p99 per fase in una tabella e in un file nel formato textfile di
+Prometheus. Con le metriche disattivate stage() e document() restituiscono un
+oggetto vuoto condiviso: il costo è una lettura di attributo.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+STAGE_READ = 'lettura'
+STAGE_TEXT = 'estrazione_testo'
+STAGE_OCR = 'ocr'
+STAGE_CLASSIFY = 'classificazione'
+STAGE_PARSE = 'parsing'
+STAGE_EXPORT = 'esportazione'
+# Tempo del documento fuori dalle fasi (cache, conversioni) e tempo complessivo
+STAGE_OTHER = 'altro'
+STAGE_TOTAL = 'totale'
+STAGES = (STAGE_READ, STAGE_TEXT, STAGE_OCR, STAGE_CLASSIFY, STAGE_PARSE, STAGE_OTHER,
+          STAGE_TOTAL, STAGE_EXPORT)
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Percentili calcolati sugli ultimi campioni di ogni fase (somma e conteggio sono totali)
+MAX_SAMPLES = 10000
+METRIC_NAME = 'doc_extractor_stage_seconds'
+
+# Documento cronometrato dal thread corrente
+_local = threading.local()
+
+class _NullTimer:
+    """Sostituto senza effetti di DocumentTimer e delle fasi quando le metriche sono spente"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def stage(self, name):
+        return self
+
+    def note(self, **info):
+        pass
+
+NULL_TIMER = _NullTimer()
+
+class _Stage:
+    """Fase in corso: alla chiusura aggiunge il proprio tempo meno quello delle fasi interne"""
+
+    __slots__ = ('timer', 'name', 'start', 'children')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0.0
+        self.timer._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        stack = self.timer._stack
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        stages = self.timer.stages
+        stages[self.name] = stages.get(self.name, 0.0) + elapsed - self.children
+        return False
+
+class DocumentTimer:
+    """Tempi per fase di un documento; registrati in StageMetrics all'uscita dal blocco with"""
+
+    def __init__(self, metrics, document):
+        self.metrics = metrics
+        self.document = document
+        self.stages = {}
+        self.info = {}
+        self._stack = []
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'timer', None)
+        _local.timer = self
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total = time.perf_counter() - self.start
+        _local.timer = self._previous
+        if exc_type is not None:
+            self.info.setdefault('errore', str(exc))
+        stages = {name: round(seconds, 6) for name, seconds in self.stages.items()}
+        stages[STAGE_OTHER] = round(max(0.0, total - sum(self.stages.values())), 6)
+        self.metrics.record({
+            'documento': self.document,
+            'inizio': self.started.isoformat(timespec='milliseconds'),
+            'pid': os.getpid(),
+            **self.info,
+            STAGE_TOTAL: round(total, 6),
+            'fasi': stages,
+        })
+        return False
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def note(self, **info):
+        """Aggiunge informazioni alla riga del documento (es. tipo riconosciuto, errore)"""
+        self.info.update(info)
+
+def stage(name):
+    """Cronometra una fase del documento in corso nel thread corrente (se presente)"""
+    timer = getattr(_local, 'timer', None)
+    return NULL_TIMER if timer is None else _Stage(timer, name)
+
+class _Samples:
+    """Ultimi campioni di una fase più somma e conteggio complessivi"""
+
+    __slots__ = ('recent', 'total', 'count')
+
+    def __init__(self):
+        self.recent = deque(maxlen=MAX_SAMPLES)
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, seconds):
+        self.recent.append(seconds)
+        self.total += seconds
+        self.count += 1
+
+    def quantiles(self):
+        values = sorted(self.recent)
+        # Percentile nearest-rank: il valore più piccolo con almeno la quota q di campioni sotto
+        return [values[max(0, math.ceil(q * len(values)) - 1)] for q in QUANTILES]
+
+class StageMetrics:
+    """Righe per documento e percentili per fase accumulati durante le estrazioni
+
+    max_records: righe tenute in memoria senza log (le più vecchie vengono scartate);
+    None per tenerle tutte fino alla scrittura.
+    """
+
+    def __init__(self, max_records=None):
+        self.enabled = False
+        self.max_records = max_records
+        # Righe non ancora scritte sul log (nei worker: da passare al processo principale)
+        self.records = []
+        self.samples = {}
+        self._log = None
+
+    def document(self, name):
+        """Blocco with che cronometra un documento; vuoto se le metriche sono spente"""
+        return DocumentTimer(self, name) if self.enabled else NULL_TIMER
+
+    def batch_stage(self, name):
+        """Blocco with per una fase dell'intero batch (es. esportazione)"""
+        if not self.enabled:
+            return NULL_TIMER
+        timer = DocumentTimer(self, None)
+        timer.note(fase=name)
+        return timer
+
+    def record(self, record):
+        """Registra la riga di un documento o di una fase del batch"""
+        fase = record.get('fase')
+        if fase is not None:
+            self._sample(fase, record[STAGE_TOTAL])
+            record = {key: value for key, value in record.items() if key != 'fasi'}
+        else:
+            for name, seconds in record['fasi'].items():
+                self._sample(name, seconds)
+            self._sample(STAGE_TOTAL, record[STAGE_TOTAL])
+        self.records.append(record)
+        if self._log is not None:
+            self.flush()
+        elif self.max_records is not None and len(self.records) > self.max_records:
+            del self.records[:-self.max_records]
+
+    def _sample(self, name, seconds):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = _Samples()
+        samples.add(seconds)
+
+    def open_log(self, path, append=False):
+        """Scrive da ora in poi una riga JSON per documento nel file indicato"""
+        self.close_log()
+        self._log = open(path, 'a' if append else 'w', encoding='utf-8')
+        self.flush()
+
+    def flush(self):
+        for record in self.records:
+            self._log.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._log.flush()
+        self.records = []
+
+    def close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def snapshot(self):
+        """Copia serializzabile delle righe non ancora scritte (es. da un processo worker)"""
+        return list(self.records)
+
+    def merge(self, snapshot):
+        """Registra le righe di uno snapshot come se fossero state misurate qui"""
+        for record in snapshot:
+            self.record(record)
+
+    def reset(self):
+        self.records = []
+        self.samples = {}
+
+    def json_lines(self):
+        """Righe non ancora scritte come testo JSON lines (es. per un download)"""
+        return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in self.records)
+
+    def _ordered(self):
+        names = [name for name in STAGES if name in self.samples]
+        return names + sorted(name for name in self.samples if name not in STAGES)
+
+    def format_table(self):
+        """Tabella testuale con campioni, percentili e tempo totale per fase"""
+        lines = [f"{'Fase':<18} {'Campioni':>8} {'p50':>10} {'p95':>10} {'p99':>10} {'Tempo tot.':>11}"]
+        for name in self._ordered():
+            samples = self.samples[name]
+            p50, p95, p99 = (value * 1000 for value in samples.quantiles())
+            lines.append(f"{name:<18} {samples.count:>8} {p50:>8.1f}ms {p95:>8.1f}ms "
+                         f"{p99:>8.1f}ms {samples.total:>10.2f}s")
+        return "\n".join(lines)
+
+    def prometheus_text(self):
+        """Percentili, somma e conteggio per fase nel formato di esposizione di Prometheus"""
+        lines = [f"# HELP {METRIC_NAME} Tempo per fase dell'elaborazione dei documenti",
+                 f"# TYPE {METRIC_NAME} summary"]
+        for name in self._ordered():
+            samples = self.samples[name]
+            for quantile, value in zip(QUANTILES, samples.quantiles()):
+                lines.append(f'{METRIC_NAME}{{stage="{name}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {samples.total:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {samples.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Scrive il file per il textfile collector di node_exporter (sostituzione atomica)"""
+        path = Path(path)
+        temp = path.with_name(f".{path.name}.tmp")
+        temp.write_text(self.prometheus_text(), encoding='utf-8')
+        os.replace(temp, path)
+
+# Metriche condivise dal processo corrente
+stage_metrics = StageMetrics()
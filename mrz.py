@@ -0,0 +1,229 @@
+"""
+Lettura della zona a lettura ottica (MRZ) di passaporti e carte d'identità elettroniche
+La MRZ (ICAO 9303) riporta cognome, nome, numero del documento, data di nascita,
+sesso e scadenza protetti da cifre di controllo. Si cerca la fascia in fondo al
+documento, se ne fa l'OCR con i soli caratteri della MRZ e la si accetta solo se
+tutte le cifre di controllo tornano: in quel caso i campi sono affidabili e
+l'OCR della pagina intera non serve.
+Formati gestiti: TD1 (3 righe da 30, CIE) e TD3 (2 righe da 44, passaporti).
+"""
+
+import os
+import re
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import otsu_threshold
+
+MRZ_TD1 = 'td1'
+MRZ_TD3 = 'td3'
+# Formato -> (righe, caratteri per riga)
+MRZ_FORMATS = {MRZ_TD1: (3, 30), MRZ_TD3: (2, 44)}
+
+# Parte della chiave della cache quando la MRZ viene cercata
+MRZ_CONFIG_KEY = 'mrz'
+MRZ_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<'
+# Solo i caratteri della MRZ, senza dizionario (i campi non sono parole)
+MRZ_CONFIG = (f'--psm 6 -c tessedit_char_whitelist={MRZ_CHARS} '
+              '-c load_system_dawg=0 -c load_freq_dawg=0')
+# Lingua di tesseract per la MRZ (es. 'ocrb' se installato il modello OCR-B)
+MRZ_LANG = os.environ.get('DOC_EXTRACTOR_MRZ_LANG', '')
+
+# Ricerca della fascia: quota inferiore del documento esaminata, quota di pixel
+# scuri di una riga di testo, altezza minima di una riga, larghezza minima di una
+# riga della MRZ (quota del documento) e altezza delle righe passate all'OCR
+MRZ_BAND = 0.4
+MRZ_ROW_DENSITY = 0.04
+MRZ_MIN_LINE_HEIGHT = 6
+MRZ_MIN_WIDTH = 0.6
+MRZ_LINE_HEIGHT = 32
+MRZ_PADDING = 8
+# Tolleranza sulla lunghezza delle righe lette (caratteri persi o aggiunti ai bordi)
+LENGTH_TOLERANCE = 2
+
+# Pesi delle cifre di controllo e valori dei caratteri ('<' vale 0, A=10 ... Z=35)
+CHECK_WEIGHTS = (7, 3, 1)
+_VALUES = {char: index for index, char in enumerate('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')}
+_VALUES['<'] = 0
+# Confusioni tipiche dell'OCR nelle posizioni che possono contenere solo cifre
+_DIGIT_FIXES = str.maketrans('OQDIULZSBG', '0001112586')
+_NOT_MRZ = re.compile(r'[^A-Z0-9<]')
+
+# Risultato: formato (td1/td3), campi del documento e righe lette
+MrzReading = namedtuple('MrzReading', ['format', 'fields', 'lines'])
+
+def check_digit(value):
+    """Cifra di controllo ICAO 9303 (pesi 7-3-1)"""
+    return str(sum(_VALUES.get(char, 0) * CHECK_WEIGHTS[index % 3]
+                   for index, char in enumerate(value)) % 10)
+
+def _checked(value, digit):
+    """True se la cifra di controllo corrisponde ('<' vale 0)"""
+    return check_digit(value) == ('0' if digit == '<' else digit)
+
+def _fix_digits(line, *spans):
+    """Corregge lettere lette al posto delle cifre nelle posizioni numeriche"""
+    chars = list(line)
+    for start, end in spans:
+        chars[start:end] = ''.join(chars[start:end]).translate(_DIGIT_FIXES)
+    return ''.join(chars)
+
+def _date(value, future=False):
+    """Data AAMMGG -> gg/mm/aaaa; None se non valida. Le date di nascita non
+    possono essere nel futuro, le scadenze sono dopo il 2000"""
+    if not value.isdigit():
+        return None
+    year, month, day = int(value[:2]), int(value[2:4]), int(value[4:])
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    if future:
+        year += 2000
+    else:
+        year += 2000 if year <= date.today().year % 100 else 1900
+    return f"{day:02d}/{month:02d}/{year}"
+
+def _names(value):
+    """COGNOME<<NOME<SECONDO -> (cognome, nome)"""
+    surname, _, given = value.strip('<').partition('<<')
+    return surname.replace('<', ' ').strip(), ' '.join(given.replace('<', ' ').split())
+
+def _document_type(code):
+    if code.startswith('P'):
+        return 'PASSAPORTO'
+    return "CARTA D'IDENTITA"
+
+def _nationality(code):
+    code = code.replace('<', '')
+    return 'ITALIANA' if code == 'ITA' else code
+
+def _fields(code, number, birth, sex, expiry, nationality, names):
+    """Campi del documento d'identità (stessi nomi delle regole di estrazione)"""
+    surname, given = _names(names)
+    fields = {
+        'Tipo_Documento': _document_type(code),
+        'Numero_Documento': number.replace('<', ''),
+        'Cognome': surname,
+        'Nome': given,
+        'Data_Nascita': birth,
+        'Sesso': sex if sex in 'MF' else '',
+        'Data_Scadenza': expiry,
+        'Cittadinanza': _nationality(nationality),
+    }
+    return {field: value for field, value in fields.items() if value}
+
+def parse_td1(lines):
+    """Campi di una MRZ TD1 (3 righe da 30), None se le cifre di controllo non tornano"""
+    line1 = _fix_digits(lines[0], (14, 15))
+    line2 = _fix_digits(lines[1], (0, 7), (8, 15), (29, 30))
+    number, birth, expiry = line1[5:14], line2[0:6], line2[8:14]
+    composite = line1[5:30] + line2[0:7] + line2[8:15] + line2[18:29]
+    if not (_checked(number, line1[14]) and _checked(birth, line2[6])
+            and _checked(expiry, line2[14]) and _checked(composite, line2[29])):
+        return None
+    birth_date, expiry_date = _date(birth), _date(expiry, future=True)
+    if birth_date is None or expiry_date is None:
+        return None
+    return _fields(line1[0:2], number, birth_date, line2[7], expiry_date, line2[15:18], lines[2])
+
+def parse_td3(lines):
+    """Campi di una MRZ TD3 (2 righe da 44), None se le cifre di controllo non tornano"""
+    line1 = lines[0]
+    line2 = _fix_digits(lines[1], (9, 10), (13, 20), (21, 28), (43, 44))
+    number, birth, expiry = line2[0:9], line2[13:19], line2[21:27]
+    composite = line2[0:10] + line2[13:20] + line2[21:43]
+    if not (_checked(number, line2[9]) and _checked(birth, line2[19])
+            and _checked(expiry, line2[27]) and _checked(composite, line2[43])):
+        return None
+    birth_date, expiry_date = _date(birth), _date(expiry, future=True)
+    if birth_date is None or expiry_date is None:
+        return None
+    return _fields(line1[0:2], number, birth_date, line2[20], expiry_date, line2[10:13], line1[5:44])
+
+_PARSERS = {MRZ_TD1: parse_td1, MRZ_TD3: parse_td3}
+
+def _fit(line, length):
+    """Riga portata alla lunghezza del formato (riempitivo '<' perso o in più in fondo)"""
+    if len(line) < length:
+        return line + '<' * (length - len(line))
+    return line[:length]
+
+def parse_mrz(text):
+    """Cerca nel testo OCR una MRZ valida e restituisce MrzReading, None se assente
+    o se le cifre di controllo non tornano"""
+    lines = [_NOT_MRZ.sub('', line.replace(' ', '').upper()) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    for mrz_format, (count, length) in MRZ_FORMATS.items():
+        for start in range(len(lines) - count + 1):
+            block = lines[start:start + count]
+            if all(abs(len(line) - length) <= LENGTH_TOLERANCE for line in block):
+                block = [_fit(line, length) for line in block]
+                fields = _PARSERS[mrz_format](block)
+                if fields:
+                    return MrzReading(mrz_format, fields, block)
+    return None
+
+def _text_lines(dark):
+    """Righe di testo (inizio, fine) dal profilo dei pixel scuri per riga"""
+    rows = np.concatenate(([False], dark.mean(axis=1) > MRZ_ROW_DENSITY, [False]))
+    changes = np.flatnonzero(np.diff(rows.astype(np.int8)))
+    return [(int(start), int(end)) for start, end in zip(changes[::2], changes[1::2])
+            if end - start >= MRZ_MIN_LINE_HEIGHT]
+
+def _text_extent(dark):
+    """Prima e ultima colonna del testo di una riga: il tratto più largo senza buchi
+    più ampi dell'altezza della riga (esclude bordi della carta e segni isolati)"""
+    cols = np.flatnonzero(dark.any(axis=0))
+    if not len(cols):
+        return None
+    breaks = np.flatnonzero(np.diff(cols) > dark.shape[0])
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(cols) - 1]))
+    widest = np.argmax(cols[ends] - cols[starts])
+    return int(cols[starts[widest]]), int(cols[ends[widest]])
+
+def find_mrz_band(card):
+    """Riquadro (left, top, right, bottom) delle righe della MRZ in fondo al documento
+    (immagine in scala di grigi già raddrizzata), None se non ci sono almeno due righe
+    di testo lunghe"""
+    gray = np.asarray(card)
+    height, width = gray.shape
+    top = int(height * (1 - MRZ_BAND))
+    dark = gray[top:] < otsu_threshold(gray)
+
+    # Righe lunghe consecutive in fondo alla fascia (al massimo tre)
+    band = []
+    for start, end in reversed(_text_lines(dark)):
+        extent = _text_extent(dark[start:end])
+        if extent is None or extent[1] - extent[0] < MRZ_MIN_WIDTH * width:
+            if band:
+                break
+            continue
+        band.insert(0, (start, end) + extent)
+        if len(band) == 3:
+            break
+    if len(band) < 2:
+        return None
+    return (max(0, min(line[2] for line in band) - MRZ_PADDING),
+            max(0, top + band[0][0] - MRZ_PADDING),
+            min(width, max(line[3] for line in band) + MRZ_PADDING),
+            min(height, top + band[-1][1] + MRZ_PADDING))
+
+def read_mrz(card, engine, lang='ita'):
+    """OCR della sola fascia della MRZ di un documento localizzato; MrzReading o None"""
+    bbox = find_mrz_band(card)
+    if bbox is None:
+        return None
+    strip = card.crop(bbox)
+    pixels = np.asarray(strip)
+    heights = [end - start for start, end in _text_lines(pixels < otsu_threshold(pixels))]
+    # Caratteri alti circa MRZ_LINE_HEIGHT pixel: la dimensione che tesseract legge meglio
+    scale = MRZ_LINE_HEIGHT / float(np.median(heights)) if heights else 1
+    if scale > 1:
+        strip = strip.resize((round(strip.size[0] * scale), round(strip.size[1] * scale)),
+                             Image.BICUBIC)
+    pixels = np.asarray(strip)
+    strip = Image.fromarray(np.where(pixels > otsu_threshold(pixels), 255, 0).astype(np.uint8))
+    return parse_mrz(engine.image_to_string(strip, MRZ_LANG or lang, MRZ_CONFIG))
@@ -0,0 +1,124 @@
+"""
+Motori OCR intercambiabili
+pytesseract avvia un processo tesseract per ogni immagine (file temporanei e
+ricaricamento di ita.traineddata ogni volta). Con il pacchetto opzionale
+tesserocr l'OCR avviene nel processo stesso: ogni thread tiene un'istanza
+dell'API di tesseract già inizializzata e la riusa per tutte le immagini.
+Il motore si sceglie con DOC_EXTRACTOR_OCR_BACKEND (auto, tesserocr,
+pytesseract); in automatico si usa tesserocr se installato.
+pytesseract e tesserocr vengono importati alla prima immagine: scegliere il
+motore non carica nessuno dei due.
+"""
+
+import os
+import shlex
+import threading
+from importlib.util import find_spec
+
+# tesserocr installato (senza importarlo: carica le librerie di tesseract)
+TESSEROCR_AVAILABLE = find_spec('tesserocr') is not None
+
+BACKEND_AUTO = 'auto'
+BACKEND_TESSEROCR = 'tesserocr'
+BACKEND_PYTESSERACT = 'pytesseract'
+BACKENDS = (BACKEND_AUTO, BACKEND_TESSEROCR, BACKEND_PYTESSERACT)
+DEFAULT_BACKEND = os.environ.get('DOC_EXTRACTOR_OCR_BACKEND', BACKEND_AUTO).lower()
+
+# Page segmentation mode predefinito di tesseract (pagina automatica)
+DEFAULT_PSM = 3
+
+def parse_tesseract_config(config):
+    """Divide una configurazione in stile riga di comando ('--oem 1 --psm 6 -c nome=valore')
+    in (oem, psm, variabili)"""
+    oem = psm = None
+    variables = {}
+    args = shlex.split(config or '')
+    for index, arg in enumerate(args):
+        value = args[index + 1] if index + 1 < len(args) else ''
+        if arg == '--oem':
+            oem = int(value)
+        elif arg == '--psm':
+            psm = int(value)
+        elif arg == '-c' and '=' in value:
+            name, _, variable = value.partition('=')
+            variables[name] = variable
+    return oem, psm, variables
+
+class PytesseractEngine:
+    """OCR con l'eseguibile tesseract (un processo per immagine)"""
+
+    name = BACKEND_PYTESSERACT
+    # Etichetta nella chiave della cache (invariata rispetto alle versioni precedenti)
+    cache_label = 'tesseract'
+
+    def image_to_string(self, image, lang='ita', config=''):
+        """Testo riconosciuto in un'immagine PIL"""
+        import pytesseract
+        return pytesseract.image_to_string(image, lang=lang, config=config)
+
+class TesserocrEngine:
+    """OCR nel processo con tesserocr: un'API già inizializzata per thread e lingua"""
+
+    name = BACKEND_TESSEROCR
+    cache_label = 'tesserocr'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _api(self, lang, oem):
+        """API di tesseract del thread corrente per lingua e motore (creata alla prima richiesta)"""
+        apis = getattr(self._local, 'apis', None)
+        if apis is None:
+            apis = self._local.apis = {}
+        key = (lang, oem)
+        if key not in apis:
+            import tesserocr
+            if oem is None:
+                apis[key] = tesserocr.PyTessBaseAPI(lang=lang)
+            else:
+                apis[key] = tesserocr.PyTessBaseAPI(lang=lang, oem=oem)
+        return apis[key]
+
+    def image_to_string(self, image, lang='ita', config=''):
+        """Testo riconosciuto in un'immagine PIL, con le stesse opzioni di pytesseract"""
+        oem, psm, variables = parse_tesseract_config(config)
+        api = self._api(lang, oem)
+        # Le variabili valgono solo per questa immagine: poi tornano ai valori precedenti
+        previous = {name: api.GetVariableAsString(name) for name in variables}
+        try:
+            api.SetPageSegMode(DEFAULT_PSM if psm is None else psm)
+            for name, value in variables.items():
+                api.SetVariable(name, value)
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            for name, value in previous.items():
+                api.SetVariable(name, value or '')
+            api.Clear()
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def available_backends():
+    """Motori selezionabili in questo ambiente"""
+    if not TESSEROCR_AVAILABLE:
+        return [BACKEND_AUTO, BACKEND_PYTESSERACT]
+    return list(BACKENDS)
+
+def resolve_backend(name=None):
+    """Nome del motore effettivamente usato: tesserocr se richiesto (o in automatico)
+    e installato, altrimenti pytesseract"""
+    name = (name or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Motore OCR sconosciuto: {name} (valori ammessi: {', '.join(BACKENDS)})")
+    if name in (BACKEND_AUTO, BACKEND_TESSEROCR) and TESSEROCR_AVAILABLE:
+        return BACKEND_TESSEROCR
+    return BACKEND_PYTESSERACT
+
+def get_engine(name=None):
+    """Motore OCR condiviso del processo (uno per tipo)"""
+    backend = resolve_backend(name)
+    with _engines_lock:
+        if backend not in _engines:
+            _engines[backend] = TesserocrEngine() if backend == BACKEND_TESSEROCR else PytesseractEngine()
+        return _engines[backend]
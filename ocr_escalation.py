@@ -0,0 +1,153 @@
+"""
+OCR a livelli con verifica dei campi
+La prima lettura è rapida (risoluzione ridotta); i campi critici vengono
+verificati (carattere di controllo del codice fiscale, cifra di controllo della
+partita IVA, date plausibili) e solo se la verifica fallisce l'immagine viene
+riletta al livello successivo: risoluzione piena, altro PSM, risoluzione alta.
+Le scansioni pulite si fermano al primo livello; per ogni livello si contano i
+documenti che vi sono stati accettati.
+"""
+
+import re
+from collections import namedtuple
+
+from image_preprocessing import DEFAULT_PREPROCESS, DOWNSCALE_ONLY, preprocess_key
+from document_classifier import classify_document, DOC_VISURA, DOC_IDENTITA
+from rule_engine import VISURA_RULES, DOCUMENTO_RULES
+from validators import (codice_fiscale_valid, codice_fiscale_azienda_valid, partita_iva_valid,
+                        plausible_date)
+
+# Parte della chiave della cache quando l'OCR è a livelli
+ESCALATION_CONFIG_KEY = 'livelli'
+
+# Livello: nome, preprocessing e PSM (None: quello della configurazione di base)
+OcrTier = namedtuple('OcrTier', ['name', 'preprocess', 'psm'])
+
+# Risoluzione del primo livello e dell'ultimo (mai oltre quella dell'immagine)
+FAST_DPI = 200
+HIGH_DPI = 400
+# Testo sparso: le carte d'identità hanno campi isolati più che paragrafi
+SPARSE_PSM = 11
+TIER_NAMES = ('rapido', 'standard', 'testo sparso', 'alta risoluzione')
+# Documenti per cui nessun livello ha superato la verifica (si tiene la lettura migliore)
+NOT_VALIDATED = 'non verificato'
+
+# Tipo di documento -> campo -> controllo
+FIELD_CHECKS = {
+    DOC_IDENTITA: {
+        'CF_Persona': codice_fiscale_valid,
+        'Data_Nascita': plausible_date,
+        'Data_Rilascio': plausible_date,
+        'Data_Scadenza': lambda value: plausible_date(value, future=True),
+    },
+    DOC_VISURA: {
+        'Partita_IVA': partita_iva_valid,
+        'Codice_Fiscale': codice_fiscale_azienda_valid,
+        'Data_Costituzione': plausible_date,
+    },
+}
+_RULES = {DOC_IDENTITA: DOCUMENTO_RULES, DOC_VISURA: VISURA_RULES}
+_PSM = re.compile(r'--psm\s+\d+')
+
+class TierStats:
+    """Documenti accettati per livello di OCR, accumulati durante le estrazioni"""
+
+    def __init__(self):
+        self.hits = {}
+
+    def record(self, tier):
+        self.hits[tier] = self.hits.get(tier, 0) + 1
+
+    def snapshot(self):
+        """Copia serializzabile (es. per passarla da un processo worker)"""
+        return dict(self.hits)
+
+    def merge(self, snapshot):
+        """Somma i conteggi di uno snapshot a quelli correnti"""
+        for tier, count in snapshot.items():
+            self.hits[tier] = self.hits.get(tier, 0) + count
+
+    def reset(self):
+        self.hits = {}
+
+    def format_table(self):
+        """Tabella testuale con documenti e percentuale per livello"""
+        total = sum(self.hits.values())
+        lines = [f"{'Livello':<20} {'Documenti':>9} {'Quota':>7}"]
+        for name in TIER_NAMES + (NOT_VALIDATED,):
+            if name in self.hits:
+                lines.append(f"{name:<20} {self.hits[name]:>9} {self.hits[name] / total:>7.0%}")
+        return "\n".join(lines)
+
+# Statistiche condivise dal processo corrente
+tier_stats = TierStats()
+
+def build_tiers(preprocess=DEFAULT_PREPROCESS):
+    """Livelli a partire dalla configurazione di preprocessing in uso, senza doppioni
+
+    Col preprocessing disattivato il livello rapido riduce comunque la risoluzione
+    (senza altre elaborazioni) e manca l'alta risoluzione: il livello standard legge
+    già l'immagine originale.
+    """
+    fast, standard, sparse, high = TIER_NAMES
+    if preprocess.enabled:
+        fast_preprocess = preprocess._replace(target_dpi=min(FAST_DPI, preprocess.target_dpi))
+    else:
+        fast_preprocess = DOWNSCALE_ONLY._replace(target_dpi=FAST_DPI)
+    candidates = (
+        OcrTier(fast, fast_preprocess, None),
+        OcrTier(standard, preprocess, None),
+        OcrTier(sparse, preprocess, SPARSE_PSM),
+    )
+    if preprocess.enabled:
+        candidates += (OcrTier(high, preprocess._replace(target_dpi=max(HIGH_DPI, preprocess.target_dpi)), None),)
+    tiers, seen = [], set()
+    for tier in candidates:
+        key = (preprocess_key(tier.preprocess), tier.psm)
+        if key not in seen:
+            seen.add(key)
+            tiers.append(tier)
+    return tuple(tiers)
+
+OCR_TIERS = build_tiers()
+
+def tier_config(base_config, tier):
+    """Configurazione di tesseract del livello: quella di base con il PSM del livello"""
+    if tier.psm is None:
+        return base_config
+    base_config = _PSM.sub('', base_config).strip()
+    return f"{base_config} --psm {tier.psm}".strip()
+
+def check_text(text):
+    """Verifica dei campi critici del testo: (accettato, punteggio)
+
+    Accettato se il tipo di documento è riconosciuto, almeno un campo critico è
+    presente e tutti quelli presenti passano il controllo. Il punteggio (campi
+    validi meno campi errati) sceglie la lettura migliore se nessun livello passa.
+    """
+    doc_type = classify_document(text).doc_type
+    if doc_type is None:
+        return False, -1
+    # Estrazione senza statistiche: quella che conta avviene dopo, sul testo scelto
+    data = _RULES[doc_type].extract(text, stats=None)
+    results = [check(data[field]) for field, check in FIELD_CHECKS[doc_type].items()
+               if data.get(field)]
+    score = 2 * sum(results) - len(results)
+    return bool(results) and all(results), score
+
+def escalate(image, ocr, base_config='', tiers=OCR_TIERS, stats=tier_stats):
+    """OCR a livelli: ocr(image, preprocess, config) viene chiamata per ogni livello
+    finché il testo non supera check_text; altrimenti restituisce il testo migliore"""
+    best = None
+    for tier in tiers:
+        text = ocr(image, tier.preprocess, tier_config(base_config, tier))
+        accepted, score = check_text(text)
+        if accepted:
+            if stats is not None:
+                stats.record(tier.name)
+            return text
+        if best is None or score > best[0]:
+            best = (score, text)
+    if stats is not None:
+        stats.record(NOT_VALIDATED)
+    return best[1]
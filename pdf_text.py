@@ -0,0 +1,138 @@
+"""
+Estrazione del testo dai PDF con OCR solo sulle pagine scansionate
+Le pagine con uno strato di testo vengono lette con PyPDF2; solo quelle senza
+testo (scansioni, annessi fotografati) passano all'OCR. L'immagine della pagina
+viene presa dalle immagini incorporate nel PDF oppure, se il pacchetto
+opzionale pdf2image è installato, dal rendering della pagina.
+"""
+
+import io
+from itertools import chain, islice
+
+import PyPDF2
+from PIL import Image
+
+from document_classifier import classify_document, DOC_VISURA
+from rule_engine import read_until_settled
+
+try:
+    from pdf2image import convert_from_bytes
+except ImportError:
+    convert_from_bytes = None
+
+# Sotto questa soglia di caratteri la pagina è considerata priva di testo
+MIN_PAGE_TEXT_CHARS = 20
+# Immagini incorporate più piccole (loghi, timbri) non vengono passate all'OCR
+MIN_OCR_IMAGE_SIDE = 300
+# Risoluzione del rendering con pdf2image
+RENDER_DPI = 300
+# Triage: pagine e caratteri letti al massimo per riconoscere il tipo di documento
+TRIAGE_MAX_PAGES = 2
+TRIAGE_CHARS = 8192
+
+def page_has_text(text):
+    """True se il testo estratto da una pagina è sufficiente"""
+    return len(text.strip()) >= MIN_PAGE_TEXT_CHARS
+
+def page_images(page):
+    """Restituisce le immagini incorporate nella pagina abbastanza grandi per l'OCR"""
+    images = []
+    try:
+        files = page.images
+        # Lato lungo della pagina in pollici, per la risoluzione effettiva delle immagini
+        page_inches = max(float(page.mediabox.width), float(page.mediabox.height)) / 72
+    except Exception:
+        # Pagina senza risorse o immagine in un formato non decodificabile
+        return images
+    for file in files:
+        try:
+            image = Image.open(io.BytesIO(file.data))
+            image.load()
+        except Exception:
+            continue
+        if min(image.size) >= MIN_OCR_IMAGE_SIDE:
+            # Stima prudente (immagine estesa a tutta la pagina) usata dal preprocessing
+            if page_inches:
+                dpi = max(image.size) / page_inches
+                image.info['dpi'] = (dpi, dpi)
+            images.append(image)
+    return images
+
+def render_page(content, page_number):
+    """Renderizza una pagina con pdf2image (None se non disponibile)"""
+    if convert_from_bytes is None:
+        return None
+    try:
+        rendered = convert_from_bytes(content, dpi=RENDER_DPI,
+                                      first_page=page_number + 1, last_page=page_number + 1)
+    except Exception:
+        return None
+    if not rendered:
+        return None
+    rendered[0].info['dpi'] = (RENDER_DPI, RENDER_DPI)
+    return rendered[0]
+
+def ocr_page(content, page, page_number, ocr_image):
+    """Esegue l'OCR di una pagina senza testo"""
+    images = page_images(page)
+    if not images:
+        rendered = render_page(content, page_number)
+        images = [rendered] if rendered is not None else []
+    return "\n".join(ocr_image(image) for image in images)
+
+def page_text(content, page, page_number, ocr_image=None):
+    """Testo di una pagina, con OCR se la pagina non ha testo"""
+    text = page.extract_text() or ""
+    if ocr_image is not None and not page_has_text(text):
+        text = ocr_page(content, page, page_number, ocr_image) or text
+    return text
+
+def iter_pdf_pages(content, ocr_image=None):
+    """Genera il testo delle pagine una alla volta: ogni pagina viene letta
+    (ed eventualmente passata all'OCR) solo quando viene richiesta"""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    for page_number, page in enumerate(pdf_reader.pages):
+        yield page_text(content, page, page_number, ocr_image)
+
+def extract_pdf_text(content, ocr_image=None):
+    """Estrae il testo di tutte le pagine, con OCR solo per quelle senza testo"""
+    return "".join(text + "\n" for text in iter_pdf_pages(content, ocr_image))
+
+def read_head_pages(pages, max_pages=TRIAGE_MAX_PAGES):
+    """Legge da un iteratore di pagine quelle iniziali per il triage: la prima, la
+    successiva solo se la prima è quasi vuota (copertina)"""
+    head = []
+    for text in islice(pages, max_pages):
+        head.append(text)
+        if page_has_text(text):
+            break
+    return head
+
+def head_text(head, max_chars=TRIAGE_CHARS):
+    """Testo delle pagine iniziali passato al classificatore, al massimo max_chars"""
+    return "".join(text + "\n" for text in head)[:max_chars]
+
+def extract_pdf_head(content, ocr_image=None, max_pages=TRIAGE_MAX_PAGES, max_chars=TRIAGE_CHARS):
+    """Estrae solo il testo iniziale del PDF per il triage"""
+    return head_text(read_head_pages(iter_pdf_pages(content, ocr_image), max_pages), max_chars)
+
+def extract_pdf_document_text(content, ocr_image=None, triage=False, early_stop=False):
+    """Testo del PDF da passare al parser
+
+    Con triage=True restituisce None se dalle prime pagine il documento non è
+    riconosciuto; con early_stop=True le visure vengono lette solo fino a
+    quando i campi principali sono certi (testo parziale). Le pagine lette per
+    il triage non vengono rilette: il PDF viene aperto e letto una volta sola.
+    """
+    if not (triage or early_stop):
+        return extract_pdf_text(content, ocr_image)
+    pages = iter_pdf_pages(content, ocr_image)
+    head = read_head_pages(pages)
+    doc_type = classify_document(head_text(head)).doc_type
+    if triage and doc_type is None:
+        return None
+    # Le pagine già lette davanti alle restanti dello stesso iteratore
+    pages = chain(head, pages)
+    if early_stop and doc_type == DOC_VISURA:
+        return read_until_settled(pages)
+    return "".join(text + "\n" for text in pages)
@@ -0,0 +1,165 @@
+"""
+Profilazione dei documenti lenti dell'elaborazione batch
+Ogni documento viene eseguito sotto cProfile; se supera la soglia di tempo la
+traccia viene salvata accanto all'output (<output>.profiles/<file>-<hash>.prof, da
+aprire con `python -m pstats` o snakeviz) insieme a un riepilogo testuale con
+i tempi per fase e le funzioni più costose; l'hash breve del percorso distingue
+i file con lo stesso nome in cartelle diverse. Le funzioni di tutti i documenti
+vengono sommate per la tabella finale delle più costose.
+cProfile segue solo il thread che elabora il documento: l'OCR delle zone delle
+carte d'identità, fatto in thread paralleli, compare come attesa.
+"""
+
+import cProfile
+import hashlib
+import io
+import re
+import time
+from pathlib import Path
+
+from metrics import NULL_TIMER
+
+# Soglia di default (secondi) oltre cui la traccia del documento viene salvata
+DEFAULT_THRESHOLD = 2.0
+# Funzioni nella tabella finale e nel riepilogo di ogni traccia
+DEFAULT_TOP = 20
+_UNSAFE_CHARS = re.compile(r'[^\w.\-]+')
+# Caratteri esadecimali dell'hash del percorso nel nome della traccia
+PATH_HASH_CHARS = 8
+
+def function_label(key):
+    """(file, riga, funzione) di cProfile -> 'file:riga(funzione)' con il solo nome del file"""
+    filename, line, name = key
+    if filename == '~':
+        # Funzioni built-in, es. <built-in method time.sleep>
+        return name
+    return f"{Path(filename).name}:{line}({name})"
+
+class _DocumentProfile:
+    """Blocco with che profila un documento e ne salva la traccia se lento"""
+
+    def __init__(self, profiler, document, timer, path):
+        self.profiler = profiler
+        self.document = document
+        self.timer = timer
+        self.path = path
+
+    def __enter__(self):
+        self.profile = cProfile.Profile()
+        self.start = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.start
+        self.profile.create_stats()
+        self.profiler.add(self.profile.stats)
+        if elapsed >= self.profiler.threshold:
+            self.profiler.save(self.document, self.profile, elapsed,
+                               getattr(self.timer, 'stages', {}), self.path)
+        return False
+
+class DocumentProfiler:
+    """Funzioni più costose sommate su tutti i documenti profilati"""
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold = DEFAULT_THRESHOLD
+        self.folder = None
+        self.top = DEFAULT_TOP
+        # 'file:riga(funzione)' -> [chiamate, tempo proprio, tempo cumulativo]
+        self.functions = {}
+        self.documents = 0
+        self.saved = 0
+
+    def configure(self, folder, threshold=DEFAULT_THRESHOLD, top=DEFAULT_TOP):
+        """Attiva la profilazione; le tracce dei documenti lenti vanno nella cartella indicata"""
+        self.enabled = True
+        self.threshold = threshold
+        self.top = top
+        self.folder = Path(folder)
+
+    def settings(self):
+        """Argomenti di configure() per ripetere la configurazione in un processo worker
+        (None se la profilazione è spenta)"""
+        return (str(self.folder), self.threshold, self.top) if self.enabled else None
+
+    def document(self, name, timer=NULL_TIMER, path=None):
+        """Blocco with che profila un documento (timer: DocumentTimer per i tempi per fase,
+        path: percorso del file, None per i contenuti in memoria)"""
+        return _DocumentProfile(self, name, timer, path) if self.enabled else NULL_TIMER
+
+    def add(self, stats):
+        """Somma le statistiche di un profilo (dizionario di cProfile) a quelle correnti"""
+        self.documents += 1
+        for key, (_, calls, own, cumulative, _) in stats.items():
+            label = function_label(key)
+            totals = self.functions.get(label)
+            if totals is None:
+                self.functions[label] = [calls, own, cumulative]
+            else:
+                totals[0] += calls
+                totals[1] += own
+                totals[2] += cumulative
+
+    def trace_base(self, document, path=None):
+        """Percorso senza estensione della traccia: nome del documento e hash breve del
+        percorso (o un contatore per i contenuti in memoria, che non hanno percorso)"""
+        source = str(Path(path).resolve()) if path is not None else f"{document}#{self.saved}"
+        digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:PATH_HASH_CHARS]
+        return self.folder / f"{_UNSAFE_CHARS.sub('_', str(document))}-{digest}"
+
+    def save(self, document, profile, elapsed, stages, path=None):
+        """Scrive la traccia (.prof) e il riepilogo (.txt) di un documento lento"""
+        import pstats
+        self.folder.mkdir(parents=True, exist_ok=True)
+        base = self.trace_base(document, path)
+        profile.dump_stats(f"{base}.prof")
+
+        lines = [f"Documento: {document}"]
+        if path is not None:
+            lines.append(f"Percorso: {path}")
+        lines.extend([f"Tempo totale: {elapsed:.3f}s", "", "Tempi per fase:"])
+        lines.extend(f"  {name:<18} {seconds:>9.3f}s" for name, seconds in
+                     sorted(stages.items(), key=lambda item: -item[1]))
+        if not stages:
+            lines.append("  (non disponibili)")
+        lines.extend(["", f"Funzioni più costose (tempo cumulativo, prime {self.top}):"])
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(self.top)
+        lines.append(output.getvalue())
+        Path(f"{base}.txt").write_text("\n".join(lines), encoding='utf-8')
+        self.saved += 1
+
+    def snapshot(self):
+        """Copia serializzabile (es. per passarla da un processo worker)"""
+        return {'functions': self.functions, 'documents': self.documents, 'saved': self.saved}
+
+    def merge(self, snapshot):
+        """Somma i conteggi di uno snapshot a quelli correnti"""
+        self.documents += snapshot['documents']
+        self.saved += snapshot['saved']
+        for label, (calls, own, cumulative) in snapshot['functions'].items():
+            totals = self.functions.setdefault(label, [0, 0.0, 0.0])
+            totals[0] += calls
+            totals[1] += own
+            totals[2] += cumulative
+
+    def reset(self):
+        self.functions = {}
+        self.documents = 0
+        self.saved = 0
+
+    def format_table(self):
+        """Tabella testuale delle funzioni con più tempo proprio su tutti i documenti"""
+        lines = [f"{'Funzione':<60} {'Chiamate':>10} {'Tempo proprio':>14} {'Cumulativo':>11}"]
+        hottest = sorted(self.functions.items(), key=lambda item: -item[1][1])[:self.top]
+        for label, (calls, own, cumulative) in hottest:
+            if len(label) > 60:
+                label = '...' + label[-57:]
+            lines.append(f"{label:<60} {calls:>10} {own:>13.2f}s {cumulative:>10.2f}s")
+        return "\n".join(lines)
+
+# Profilatore condiviso dal processo corrente
+document_profiler = DocumentProfiler()
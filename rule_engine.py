@@ -0,0 +1,597 @@
+"""
+Motore di regole per l'estrazione dei campi da visure camerali e documenti d'identità
+I pattern di ogni campo sono dichiarati come dati e compilati una sola volta
+all'import; app desktop, elaborazione batch e app Streamlit usano le stesse
+regole. Per ogni campo vengono registrati tentativi, successi e tempo impiegato.
+I pattern che iniziano con un'etichetta ("Partita IVA", "Sede legale", ...)
+dichiarano le proprie parole chiave e vengono provati solo dove queste compaiono.
+"""
+
+import re
+import time
+from bisect import bisect_right
+from itertools import accumulate
+
+# Distanza massima tra l'inizio del match e la parola chiave per i pattern con lookbehind
+ANCHOR_LOOKBEHIND = 64
+
+class FieldStats:
+    """Statistiche di un campo: tentativi, estrazioni riuscite e tempo totale"""
+
+    __slots__ = ('calls', 'hits', 'seconds')
+
+    def __init__(self, calls=0, hits=0, seconds=0.0):
+        self.calls = calls
+        self.hits = hits
+        self.seconds = seconds
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.calls if self.calls else 0.0
+
+class RuleStats:
+    """Statistiche per campo accumulate durante le estrazioni"""
+
+    def __init__(self):
+        self.fields = {}
+
+    def record(self, key, hit, seconds):
+        stats = self.fields.get(key)
+        if stats is None:
+            stats = self.fields[key] = FieldStats()
+        stats.calls += 1
+        stats.hits += hit
+        stats.seconds += seconds
+
+    def snapshot(self):
+        """Copia serializzabile (es. per passarla da un processo worker)"""
+        return {key: (s.calls, s.hits, s.seconds) for key, s in self.fields.items()}
+
+    def merge(self, snapshot):
+        """Somma le statistiche di uno snapshot a quelle correnti"""
+        for key, (calls, hits, seconds) in snapshot.items():
+            stats = self.fields.setdefault(key, FieldStats())
+            stats.calls += calls
+            stats.hits += hits
+            stats.seconds += seconds
+
+    def reset(self):
+        self.fields = {}
+
+    def format_table(self):
+        """Tabella testuale con percentuale di successo e tempi per campo"""
+        lines = [f"{'Campo':<45} {'Tentativi':>9} {'Successo':>9} {'Tempo tot.':>11} {'Medio':>9}"]
+        for key, s in sorted(self.fields.items(), key=lambda item: -item[1].seconds):
+            avg_ms = s.seconds / s.calls * 1000 if s.calls else 0.0
+            lines.append(f"{key:<45} {s.calls:>9} {s.hit_rate:>8.0%} "
+                         f"{s.seconds * 1000:>9.1f}ms {avg_ms:>7.2f}ms")
+        return "\n".join(lines)
+
+# Statistiche condivise dal processo corrente
+rule_stats = RuleStats()
+
+class Anchored:
+    """Pattern le cui occorrenze iniziano con una delle parole chiave indicate
+    (o la contengono entro lookbehind caratteri dall'inizio)"""
+
+    def __init__(self, keywords, pattern, lookbehind=0):
+        self.keywords = tuple(keyword.lower() for keyword in keywords)
+        self.pattern = pattern
+        self.lookbehind = lookbehind
+
+def anchored(keywords, pattern, lookbehind=0):
+    """Dichiara le parole chiave (ancore) di un pattern"""
+    if isinstance(keywords, str):
+        keywords = (keywords,)
+    return Anchored(keywords, pattern, lookbehind)
+
+class AnchorIndex:
+    """Posizioni delle parole chiave nel testo, condivise da tutte le regole
+
+    Il testo viene portato in minuscolo una sola volta e ogni parola chiave
+    viene cercata con str.find in modo lazy, solo fin dove serve alle regole:
+    se i campi si trovano nelle prime righe il resto del testo non viene letto,
+    e ogni occorrenza viene cercata una sola volta anche se più pattern la usano.
+    """
+
+    def __init__(self, lowered):
+        self.lowered = lowered
+        self.positions = {}
+        self.exhausted = set()
+
+    def position(self, keyword, index):
+        """index-esima occorrenza della parola chiave (None se non ce ne sono altre)"""
+        found = self.positions.setdefault(keyword, [])
+        while len(found) <= index:
+            if keyword in self.exhausted:
+                return None
+            position = self.lowered.find(keyword, found[-1] + 1 if found else 0)
+            if position < 0:
+                self.exhausted.add(keyword)
+                return None
+            found.append(position)
+        return found[index]
+
+    def iter_positions(self, keywords):
+        """Posizioni crescenti in cui inizia una delle parole chiave"""
+        cursors = dict.fromkeys(keywords, 0)
+        while cursors:
+            candidates = {}
+            for keyword, cursor in list(cursors.items()):
+                position = self.position(keyword, cursor)
+                if position is None:
+                    del cursors[keyword]
+                else:
+                    candidates[keyword] = position
+            if not candidates:
+                return
+            best = min(candidates.values())
+            for keyword, position in candidates.items():
+                if position == best:
+                    cursors[keyword] += 1
+            yield best
+
+def match_at_anchors(regex, text, positions, lookbehind=0):
+    """Primo match del pattern che inizia su un'ancora (o entro lookbehind caratteri prima)"""
+    tried = -1
+    for position in positions:
+        for start in range(max(tried + 1, position - lookbehind), position + 1):
+            match = regex.match(text, start)
+            if match:
+                return match
+        tried = position
+    return None
+
+class FieldRule:
+    """Regola per un campo: pattern alternativi provati in ordine di priorità"""
+
+    def __init__(self, field, patterns, flags=re.IGNORECASE, group=1, clean=None,
+                 accept=None, try_next=True, expand=None):
+        self.field = field
+        # Terne (regex compilata, parole chiave o None se il pattern non ha ancore, lookbehind)
+        self.patterns = []
+        for pattern in patterns:
+            if isinstance(pattern, Anchored):
+                self.patterns.append((re.compile(pattern.pattern, flags), pattern.keywords,
+                                      pattern.lookbehind))
+            else:
+                self.patterns.append((re.compile(pattern, flags), None, 0))
+        # Gruppo da estrarre (numero) o funzione match -> valore
+        self.group = group
+        # Normalizzazione e validazione del valore estratto
+        self.clean = clean
+        self.accept = accept
+        # Se il valore viene scartato, prova il pattern successivo
+        self.try_next = try_next
+        # Funzione valore -> dict di campi (per regole che producono più campi)
+        self.expand = expand
+
+    def value_of(self, match):
+        if callable(self.group):
+            return self.group(match)
+        return match.group(self.group)
+
+    @property
+    def keywords(self):
+        return {keyword for _, keywords, _ in self.patterns if keywords for keyword in keywords}
+
+    def find(self, text, anchors=None):
+        """Restituisce (match, valore) del primo pattern con un valore valido, o None"""
+        for regex, keywords, lookbehind in self.patterns:
+            if keywords and anchors is not None:
+                match = match_at_anchors(regex, text, anchors.iter_positions(keywords), lookbehind)
+            else:
+                match = regex.search(text)
+            if not match:
+                continue
+            value = self.value_of(match)
+            if self.clean is not None:
+                value = self.clean(value)
+            if self.accept is None or self.accept(value):
+                return match, value
+            if not self.try_next:
+                break
+        return None
+
+    def apply(self, text, anchors=None):
+        """Restituisce il dict dei campi estratti (vuoto se nessun pattern è valido)"""
+        found = self.find(text, anchors)
+        if found is None:
+            return {}
+        value = found[1]
+        return self.expand(value) if self.expand else {self.field: value}
+
+class ComputedRule:
+    """Regola calcolata da una funzione testo -> dict di campi"""
+
+    def __init__(self, field, compute):
+        self.field = field
+        self.compute = compute
+
+    keywords = frozenset()
+
+    def apply(self, text, anchors=None):
+        return self.compute(text)
+
+class RuleSet:
+    """Insieme ordinato di regole per un tipo di documento
+
+    Se le regole dichiarano delle ancore, le parole chiave vengono localizzate
+    una sola volta in un indice condiviso (AnchorIndex) e i pattern ancorati
+    vengono provati solo nelle posizioni delle ancore, invece di scorrere
+    l'intero testo una volta per pattern.
+    """
+
+    def __init__(self, name, rules):
+        self.name = name
+        self.rules = rules
+        self.anchored = any(rule.keywords for rule in rules)
+
+    def anchor_index(self, text):
+        """Indice lazy delle parole chiave del testo (None se non applicabile)"""
+        if not self.anchored:
+            return None
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Alcuni caratteri cambiano lunghezza in minuscolo: posizioni non allineate
+            return None
+        return AnchorIndex(lowered)
+
+    def extract(self, text, stats=rule_stats, single_scan=True):
+        """Applica tutte le regole al testo e restituisce i campi estratti"""
+        data = {}
+        anchors = self.anchor_index(text) if single_scan else None
+        for rule in self.rules:
+            start = time.perf_counter()
+            found = rule.apply(text, anchors)
+            if stats is not None:
+                stats.record(f"{self.name}.{rule.field}", bool(found), time.perf_counter() - start)
+            data.update(found)
+        return data
+
+# ---------------------------------------------------------------------------
+# Funzioni di normalizzazione
+# ---------------------------------------------------------------------------
+
+_SPACES = re.compile(r'\s+')
+_TRAILING_PUNCT = re.compile(r'[,\.\-]+$')
+_CAP_SUFFIX = re.compile(r'CAP.*$')
+_DATE_SEPARATORS = re.compile(r'[/\.\-\s]+')
+_DATE_IN_TEXT = re.compile(r'\d+[/\-\.]\d+[/\-\.]\d+')
+_ATECO_FORMAT = re.compile(r'\d{2}\.\d{2}\.\d{1,2}')
+_SOCI_SECTION = re.compile(r"(?:Soci\s+e\s+titolari|SOCI|Elenco\s+soci)(.*?)(?:\n\n|\Z)",
+                           re.IGNORECASE | re.DOTALL)
+_SOCI_NAMES = re.compile(r"([A-Z][A-Z]+)\s+([A-Z][a-z]+)")
+
+def _collapse_spaces(value):
+    return _SPACES.sub(' ', value.strip())
+
+def _clean_denominazione(value):
+    # Pulisci eventuali artefatti e caratteri speciali finali
+    return _TRAILING_PUNCT.sub('', _collapse_spaces(value))
+
+def _clean_sede(value):
+    return _CAP_SUFFIX.sub('', _collapse_spaces(value))
+
+def _normalize_date_separators(value):
+    return _DATE_SEPARATORS.sub('/', value)
+
+def _normalize_birth_date(value):
+    """Normalizza la data e converte l'anno a 2 cifre in 4 cifre"""
+    parts = _normalize_date_separators(value.strip()).split('/')
+    if len(parts) == 3 and len(parts[2]) == 2:
+        year = int(parts[2])
+        parts[2] = f"19{year}" if year > 30 else f"20{year}"
+    return '/'.join(parts)
+
+def _min_length(length):
+    return lambda value: len(value) > length
+
+def _split_amministratore(value):
+    """Separa cognome e nome dell'amministratore quando possibile"""
+    parts = value.split()
+    if len(parts) >= 2:
+        return {
+            'Amministratore': value,
+            'Amministratore_Cognome': parts[0],
+            'Amministratore_Nome': ' '.join(parts[1:]),
+        }
+    return {'Amministratore': value}
+
+def _valid_comune(value):
+    invalid = ['NUMERO', 'REPERTORIO', 'REA', 'AMMINISTRATIVO', 'ATTIVITA', 'REGISTRO']
+    return not any(word in value.upper() for word in invalid) and len(value) > 2
+
+def _extract_soci(text):
+    """Cerca i nomi dei soci nella sezione dedicata (max 5)"""
+    match = _SOCI_SECTION.search(text)
+    if match:
+        soci_names = _SOCI_NAMES.findall(match.group(1))
+        if soci_names:
+            return {'Soci': '; '.join(f"{cognome} {nome}" for cognome, nome in soci_names[:5])}
+    return {}
+
+def _extract_cittadinanza(text):
+    upper = text.upper()
+    if 'ITALIANA' in upper or 'ITALY' in upper:
+        return {'Cittadinanza': 'ITALIANA'}
+    return {}
+
+def _extract_tipo_documento(text):
+    upper = text.upper()
+    if any(keyword in upper for keyword in ['CARTA', 'IDENTITA', 'IDENTITY']):
+        return {'Tipo_Documento': "CARTA D'IDENTITA"}
+    if 'PATENTE' in upper:
+        return {'Tipo_Documento': 'PATENTE'}
+    if 'PASSAPORTO' in upper or 'PASSPORT' in upper:
+        return {'Tipo_Documento': 'PASSAPORTO'}
+    return {}
+
+# ---------------------------------------------------------------------------
+# Regole della visura camerale
+# ---------------------------------------------------------------------------
+
+VISURA_RULES = RuleSet('visura_camerale', [
+    FieldRule('Denominazione', [
+        anchored('denominazione', r"(?:Denominazione|DENOMINAZIONE)[:\s]*\n?\s*([A-Z][A-Z\s'\.]+(?:S\.R\.L\.|SRL|S\.P\.A\.|SPA|S\.A\.S\.|SAS|SRLS|S\.R\.L\.S\.|SOCIETA'[^\n]+)?)"),
+        anchored('ragione', r"(?:Ragione\s+sociale|RAGIONE\s+SOCIALE)[:\s]*\n?\s*([A-Z][^\n]+)"),
+        r"^([A-Z][A-Z\s'\.]+(?:S\.R\.L\.|SRL|S\.P\.A\.|SOCIETA')[^\n]{0,100})",  # All'inizio del testo
+        anchored('visura', r"VISURA.*?\n+([A-Z][A-Z\s'\.]+(?:SOCIETA|S\.R\.L\.|SRL)[^\n]+)"),
+    ], flags=re.MULTILINE | re.IGNORECASE, clean=_clean_denominazione, accept=_min_length(3)),
+
+    FieldRule('Partita_IVA', [
+        # Con 'P. IVA' la parola chiave non è all'inizio del match
+        anchored('iva', r"(?:Partita\s+IVA|P\.?\s*IVA|PARTITA\s+IVA)[:\s]*\n?\s*(\d{11})", lookbehind=ANCHOR_LOOKBEHIND),
+        anchored(('p.iva', 'piva'), r"(?:P\.IVA|PIVA)[:\s]+(\d{11})"),
+        anchored('iva', r"IVA[:\s]*(\d{11})"),
+    ]),
+
+    FieldRule('Codice_Fiscale', [
+        r"(?:Codice\s+[Ff]iscale|C\.?\s*F\.?|CF)[:\s]*\n?\s*([A-Z0-9]{11,16})",
+        anchored('codice', r"(?:Codice\s+fiscale\s+e\s+n\.?\s*iscr)[^\n]*[:\s]*(\d{11})"),
+        r"(\d{11})(?:\s|$)",  # 11 cifre da sole
+    ], accept=lambda cf: len(cf) in (11, 16)),
+
+    FieldRule('Numero_REA', [
+        # Con 'N. REA' la parola chiave non è all'inizio del match
+        anchored('rea', r"(?:Numero\s+REA|N\.?\s*REA|REA)[:\s]*\n?\s*([A-Z]{2})[\s\-]*(\d+)", lookbehind=ANCHOR_LOOKBEHIND),
+        anchored('rea', r"REA[:\s]*([A-Z]{2})\s*-\s*(\d+)"),
+        anchored('repertorio', r"(?:Repertorio\s+[Ee]conomico)[^\n]*[:\s]*([A-Z]{2})\s*[\-\s]*(\d+)"),
+    ], group=lambda m: f"{m.group(1)} - {m.group(2)}"),
+
+    FieldRule('Forma_Giuridica', [
+        anchored(('forma', 'natura'), r"(?:Forma\s+giuridica|Natura\s+giuridica)[:\s]*\n?\s*([a-z\s']+(?:limitata|semplificata|per azioni|società|s\.r\.l\.|s\.p\.a\.)[^\n]*)"),
+        anchored('forma', r"(?:FORMA\s+GIURIDICA)[:\s]*\n?\s*([^\n]+)"),
+        anchored('societ', r"(società\s+a\s+responsabilità\s+limitata[^\n]*)"),
+        anchored('societ', r"(SOCIETA'?\s+A\s+RESPONSABILITA'?\s+LIMITATA[^\n]*)"),
+    ], clean=_collapse_spaces, accept=_min_length(3)),
+
+    FieldRule('Sede_Legale', [
+        anchored(('sede', 'indirizzo'), r"(?:Sede\s+legale|Indirizzo\s+[Ss]ede)[:\s]*\n?\s*([A-Z][^\n]+?)(?:CAP\s*\d{5}|\n|$)"),
+        anchored('indirizzo', r"(?:Indirizzo)[:\s]*([^\n]+?)(?:\d{5})"),
+        anchored(('via', 'piazza', 'corso'), r"(?:VIA|VIALE|PIAZZA|CORSO)\s+([A-Z][^\n]+?)(?:\s+\d{5})"),
+    ], clean=_clean_sede, accept=_min_length(5)),
+
+    FieldRule('CAP', [
+        anchored('cap', r"(?:CAP|Cap)[:\s]*(\d{5})"),
+        r"(?:^|\s)(\d{5})(?:\s+[A-Z][A-Za-z]+\s*\([A-Z]{2}\))",
+    ], flags=re.IGNORECASE | re.MULTILINE),
+
+    FieldRule('Comune', [
+        r"\d{5}\s*[-,]?\s*([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+){0,2})(?:\s*\(|\s*[-,]?\s*\(?[A-Z]{2}\)?)",
+        anchored('comune', r"(?:Comune)[:\s]+([A-Z][A-Za-z\s]+?)(?:\s*\([A-Z]{2}\)|\n|$)"),
+        r"([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+){0,2})\s*\([A-Z]{2}\)",
+    ], flags=re.MULTILINE, clean=str.strip, accept=_valid_comune),
+
+    FieldRule('Provincia', [
+        r"\(([A-Z]{2})\)",
+        anchored('prov', r"(?:Provincia|Prov\.?)[:\s]*\(?\s*([A-Z]{2})\s*\)?"),
+        anchored('sigla', r"(?:Sigla)[:\s]*([A-Z]{2})"),
+    ], flags=0),
+
+    FieldRule('Data_Costituzione', [
+        anchored('data', r"(?:Data\s+atto\s+di\s+costituzione|Data\s+costituzione)[:\s]*\n?\s*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{4})"),
+        anchored('data', r"(?:Data\s+iscrizione|Data\s+di\s+iscrizione)[:\s]*\n?\s*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{4})"),
+        anchored('costituita', r"(?:Costituita\s+il)[:\s]*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{4})"),
+    ]),
+
+    FieldRule('Data_Inizio_Attivita', [
+        anchored('data', r"(?:Data\s+inizio\s+attività|Data\s+inizio\s+attivit[aà])[:\s]*\n?\s*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{4})"),
+        anchored('inizio', r"(?:Inizio\s+attività)[:\s]*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{4})"),
+    ]),
+
+    FieldRule('Capitale_Sociale', [
+        anchored('capitale', r"(?:Capitale\s+sociale)[:\s]*\n?\s*(?:€|EUR|Euro)?\s*([\d\.,]+)"),
+        anchored('capitale', r"(?:Capitale)[:\s]+(?:€|EUR)?\s*([\d\.,]+)"),
+        anchored(('sottoscritto', 'versato'), r"(?:sottoscritto|versato)[:\s]*(?:€)?\s*([\d\.,]+)"),
+    ]),
+
+    FieldRule('Stato_Attivita', [
+        anchored('stato', r"(?:Stato\s+attività|Stato)[:\s]*\n?\s*(ATTIVA|ATTIVO|CESSATA|CESSATO|SOSPESA|SOSPESO)"),
+        anchored('stato', r"(?:stato)[:\s]+(attiva|cessata|sospesa)"),
+    ], clean=str.upper),
+
+    FieldRule('Codice_ATECO', [
+        anchored(('cod', 'ateco'), r"(?:Codice\s+ATECO|ATECO|Cod\.\s*ATECO)[:\s]*\n?\s*(\d{2}\.\d{2}\.\d{1,2})"),
+        anchored('attivit', r"(?:Attività\s+prevalente).*?(\d{2}\.\d{2}\.\d{1,2})"),
+        anchored('ateco', r"ATECO[:\s]+(\d{2}\.\d{2}\.\d{1,2})"),
+        r"(\d{2}\.\d{2}\.\d{1,2})",  # Pattern generico per codici
+    ], flags=re.IGNORECASE | re.DOTALL, accept=lambda ateco: bool(_ATECO_FORMAT.match(ateco))),
+
+    FieldRule('Attivita_Prevalente', [
+        anchored('attivit', r"(?:Attività\s+prevalente)[:\s]*\n?\s*([a-z][a-z\s,]+(?:prodotti|servizi|commercio|produzione|vendita|gestione)[^\n]{0,150})"),
+        anchored('attivit', r"(?:ATTIVITA'?\s+PREVALENTE)[:\s]*([^\n]+)"),
+        anchored('oggetto', r"(?:Oggetto\s+sociale)[:\s]*([A-Z][^\n]{20,200})"),
+    ], clean=lambda value: _collapse_spaces(value)[:200], accept=_min_length(10)),
+
+    FieldRule('Amministratore', [
+        anchored('amministratore', r"(?:Amministratore\s+[Uu]nico|AMMINISTRATORE\s+UNICO)[:\s]*\n?\s*([A-Z][A-Z\s]+)"),
+        anchored('legale', r"(?:Legale\s+[Rr]appresentante|LEGALE\s+RAPPRESENTANTE)[:\s]*\n?\s*([A-Z][A-Z\s]+)"),
+        anchored('rappresentante', r"(?:Rappresentante\s+dell'?impresa)[:\s]*\n?\s*([A-Z][A-Z\s]+)"),
+        anchored('presidente', r"(?:Presidente)[:\s]*\n?\s*([A-Z][A-Z\s]+)"),
+    ], flags=re.IGNORECASE | re.MULTILINE, clean=_collapse_spaces, expand=_split_amministratore),
+
+    FieldRule('Numero_Soci', [
+        anchored('soci', r"(?:Soci\s+e\s+titolari)[^\n]*[:\s]+(\d+)"),
+        anchored('numero', r"(?:Numero\s+soci)[:\s]+(\d+)"),
+    ]),
+
+    ComputedRule('Soci', _extract_soci),
+])
+
+# ---------------------------------------------------------------------------
+# Regole del documento d'identità
+# ---------------------------------------------------------------------------
+
+DOCUMENTO_RULES = RuleSet('documento_identita', [
+    # Codice fiscale per primo: è il campo più affidabile
+    FieldRule('CF_Persona', [
+        r"([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])",  # Standard
+        r"(?:CF|C\.F\.|Codice\s*Fiscale)[:\s]*([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])",
+    ]),
+
+    FieldRule('Cognome', [
+        r"(?:Cognome|COGNOME|Surname)[:\s]+([A-Z][A-Z\s]+?)(?:\s+Nome|\s+NOME|\s+Name|\n)",
+        r"(?:Cognome|COGNOME)[:\s]*\n+([A-Z][A-Z\s]+)",
+        r"^([A-Z]{2,}(?:\s+[A-Z]{2,})*)\s+(?:[A-Z][a-z]+|NOME)",  # ROSSI Mario
+    ], flags=re.MULTILINE, clean=str.strip),
+
+    FieldRule('Nome', [
+        r"(?:Nome|NOME|Name)[:\s]+([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)?)",
+        r"(?:Cognome|COGNOME)[^\n]+\n+(?:Nome|NOME)[:\s]*\n*([A-Z][A-Za-z]+)",
+        r"[A-Z]{2,}\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\s+(?:nato|Nat)",  # ROSSI Mario nato
+    ], flags=re.MULTILINE | re.IGNORECASE, clean=str.strip),
+
+    FieldRule('Data_Nascita', [
+        r"(?:nat[oa]\s+il|Data\s+di\s+nascita|Date\s+of\s+birth)[:\s]*(\d{1,2}[/\.\-\s]\d{1,2}[/\.\-\s]\d{2,4})",
+        r"(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{4})",  # Qualsiasi data
+        r"(?:il|del)\s+(\d{1,2}[/\.\-\s]\d{1,2}[/\.\-\s]\d{2,4})",
+    ], clean=_normalize_birth_date),
+
+    FieldRule('Luogo_Nascita', [
+        r"(?:nat[oa]\s+a|nato\s+il\s+\d+[/\-\.]\d+[/\-\.]\d+\s+a)\s+([A-Z][A-Za-z\s']+?)(?:\s*\([A-Z]{2}\)|$|\s+il|\s+\d)",
+        r"(?:Luogo\s+di\s+nascita|Place\s+of\s+birth)[:\s]*([A-Z][A-Za-z\s']+?)(?:\s*\(|$|\n)",
+        r"(?:Comune\s+di\s+nascita)[:\s]*([A-Z][A-Za-z\s']+)",
+    ], clean=lambda value: _DATE_IN_TEXT.sub('', value.strip()).strip(),  # Rimuovi date catturate per errore
+       accept=_min_length(2), try_next=False),
+
+    FieldRule('Provincia_Nascita', [
+        r"(?:nat[oa]\s+a)[^\n]*\(([A-Z]{2})\)",
+        r"([A-Z]{2})\s*\)\s*il\s+\d",
+        r"\(\s*([A-Z]{2})\s*\)",
+    ], flags=0),
+
+    FieldRule('Sesso', [
+        r"(?:Sesso|Sex)[:\s]*([MF])",
+        r"\b([MF])\b(?:\s+\d{3}\s+cm|\s+nat)",  # M 180 cm o M nato
+    ], clean=str.upper),
+
+    FieldRule('Statura', [
+        r"(?:Statura|Height)[:\s]*(\d{2,3})\s*(?:cm)?",
+        r"([MF])\s+(\d{3})\s*cm",  # M 180 cm
+        r"(\d{3})\s*cm",
+    ], group=lambda m: m.group(m.lastindex)),
+
+    ComputedRule('Cittadinanza', _extract_cittadinanza),
+
+    FieldRule('Residenza', [
+        r"(?:Residenza|Residence)[:\s]*([A-Z][A-Za-z0-9\s,\.'-]+?)(?:\n\n|Rilasciat)",
+        r"(?:Via|Viale|Piazza|Corso)\s+([A-Za-z0-9\s,\.'-]+?)(?:\d{5}|\n)",
+    ], clean=str.strip),
+
+    FieldRule('Comune_Residenza', [
+        r"(?:Comune)[:\s]*([A-Z][A-Za-z\s]+?)(?:\s*\(|$|\n)",
+        r"\d{5}\s+([A-Z][A-Za-z\s]+?)(?:\s*\([A-Z]{2}\)|$)",
+    ], flags=0, clean=str.strip),
+
+    # Carta d'identità elettronica: CA12345AA o simili
+    FieldRule('Numero_Documento', [
+        r"(?:N\.|Numero|Nr)[:\s]*([A-Z]{2}\s*\d{5,7}\s*[A-Z]{0,2})",
+        r"([A-Z]{2}\d{5,7}[A-Z]{0,2})",  # CA12345AA
+        r"Carta\s+d[''i]?\s*identit[aà]\s+(?:N\.?|n\.?)\s*([A-Z0-9]{6,10})",
+    ], clean=lambda value: value.replace(' ', '')),
+
+    FieldRule('Data_Rilascio', [
+        r"(?:Rilasciat[oa]\s+il|Emess[oa]\s+il|Data\s+di\s+rilascio)[:\s]*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{2,4})",
+        r"(?:del|il)\s+(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{4})",
+    ], clean=_normalize_date_separators),
+
+    FieldRule('Data_Scadenza', [
+        r"(?:Scadenza|valida\s+fino\s+al)[:\s]*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{2,4})",
+        r"(?:Valid until|Date of expiry)[:\s]*(\d{1,2}[/\.\-]\d{1,2}[/\.\-]\d{2,4})",
+    ], clean=_normalize_date_separators),
+
+    FieldRule('Comune_Rilascio', [
+        r"(?:Comune\s+di|Rilasciat[oa]\s+da)[:\s]*([A-Z][A-Za-z\s]+?)(?:\s*\n|$|il)",
+        r"(?:Sindaco\s+del\s+Comune\s+di)[:\s]*([A-Z][A-Za-z\s]+)",
+    ], clean=str.strip),
+
+    ComputedRule('Tipo_Documento', _extract_tipo_documento),
+])
+
+# Campi della visura usati dal template di import: si trovano nelle prime pagine
+VISURA_KEY_FIELDS = (
+    'Denominazione', 'Forma_Giuridica', 'Codice_Fiscale', 'Partita_IVA', 'Numero_REA',
+    'Codice_ATECO', 'Attivita_Prevalente', 'Sede_Legale', 'Comune', 'CAP', 'Provincia',
+    'Data_Costituzione', 'Amministratore',
+)
+
+def read_until_settled(pages, fields=VISURA_KEY_FIELDS, rule_set=VISURA_RULES):
+    """Consuma uno stream di pagine finché ogni campo indicato è trovato e restituisce il testo letto
+
+    Un campo è trovato quando una sua regola dà un valore valido con un match
+    che termina prima dell'ultima pagina letta (l'ultima pagina fa da margine
+    per i match a cavallo di due pagine). Le pagine successive non vengono
+    lette: un pattern a priorità più alta che comparisse solo lì viene ignorato.
+    """
+    # Campo -> (regola, indice della pagina da cui riprendere la ricerca)
+    pending = {rule.field: (rule, 0) for rule in rule_set.rules if rule.field in fields}
+    parts = []
+    for page in pages:
+        parts.append(page + "\n")
+        last = len(parts) - 1
+        for field, (rule, first) in list(pending.items()):
+            # Ricerca solo nelle pagine non ancora escluse (sempre dall'inizio di una pagina)
+            offsets = list(accumulate(len(part) for part in parts[first:]))
+            last_start = offsets[-2] if len(offsets) > 1 else 0
+            found = rule.find("".join(parts[first:]))
+            if found is None:
+                pending[field] = (rule, last)
+            elif found[0].end() <= last_start:
+                del pending[field]
+            else:
+                # Il match arriva nell'ultima pagina: potrebbe continuare nella prossima
+                pending[field] = (rule, first + bisect_right(offsets, found[0].start()))
+        if not pending:
+            break
+    return "".join(parts)
+
+def parse_visura_camerale(text, stats=rule_stats):
+    """Estrae i dati della visura camerale dal testo"""
+    return VISURA_RULES.extract(text, stats)
+
+# Testo dei documenti letti a zone (id_card_layout): intestazione e una riga
+# "Campo: valore" per campo, riletta senza regole. L'intestazione contiene le
+# parole chiave che fanno riconoscere il documento d'identità al classificatore.
+LAYOUT_TEXT_HEADER = 'DOCUMENTO LETTO A ZONE | identity card'
+
+def format_layout_text(layout, fields):
+    """Testo strutturato per i campi letti a zone"""
+    lines = [f"{LAYOUT_TEXT_HEADER} | {layout}"]
+    lines.extend(f"{field}: {value}" for field, value in fields.items())
+    return "\n".join(lines) + "\n"
+
+def parse_layout_text(text):
+    """Campi di un testo prodotto da format_layout_text"""
+    fields = {}
+    for line in text.splitlines()[1:]:
+        field, separator, value = line.partition(': ')
+        if separator:
+            fields[field] = value
+    return fields
+
+def parse_documento_identita(text, stats=rule_stats):
+    """Estrae i dati del documento d'identità dal testo"""
+    if text.startswith(LAYOUT_TEXT_HEADER):
+        return parse_layout_text(text)
+    return DOCUMENTO_RULES.extract(text, stats)
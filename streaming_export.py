@@ -0,0 +1,133 @@
+"""
+Esportazione incrementale dei risultati dell'elaborazione batch
+Ogni riga viene aggiunta a un file JSONL appena il documento è elaborato, con
+flush periodici su disco: un'interruzione non fa perdere le righe già scritte.
+Alla chiusura CSV ed Excel vengono costruiti leggendo il JSONL riga per riga,
+con l'unione delle colonne di tutte le righe come intestazione.
+"""
+
+import csv
+import json
+import os
+import time
+from pathlib import Path
+
+# Campo del JSONL con la chiave del documento (es. percorso), non esportato: se un
+# documento è stato rielaborato (ripresa dopo un'interruzione) vale la sua ultima riga
+KEY_FIELD = '_documento'
+
+def write_csv(path, columns, rows):
+    """Scrive le righe (dict) in CSV con separatore ';' e BOM UTF-8, lo stesso formato
+    di DataFrame.to_csv usato dalle app; restituisce il numero di righe"""
+    total = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.DictWriter(file, fieldnames=columns, delimiter=';', restval='')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            total += 1
+    return total
+
+def write_excel(path, columns, rows):
+    """Scrive le righe (dict) in Excel con openpyxl in modalità write-only (una riga alla
+    volta, senza pandas)"""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([row.get(col) for col in columns])
+    workbook.save(path)
+
+class StreamingExporter:
+    """Scrive le righe su JSONL man mano e genera CSV/Excel alla fine"""
+
+    def __init__(self, output_file, flush_every=25, flush_interval=5.0, append=False, on_flush=None):
+        self.jsonl_path = Path(f"{output_file}.jsonl")
+        self.csv_path = Path(f"{output_file}.csv")
+        self.excel_path = Path(f"{output_file}.xlsx")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        # Richiamata dopo ogni flush (es. per scrivere il manifest di checkpoint)
+        self.on_flush = on_flush
+        self.rows_written = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._file = open(self.jsonl_path, 'a' if append else 'w', encoding='utf-8')
+
+    def write_row(self, row, key=None):
+        """Aggiunge una riga al JSONL e fa flush ogni N righe o T secondi (key: chiave
+        del documento, le righe precedenti con la stessa chiave non vengono esportate)"""
+        if key is not None:
+            row = {KEY_FIELD: key, **row}
+        self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        self.rows_written += 1
+        self._pending += 1
+        if (self._pending >= self.flush_every or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Forza la scrittura su disco delle righe in sospeso"""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def close(self, build_outputs=True):
+        """Chiude il JSONL e, se richiesto, genera CSV ed Excel"""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+        if build_outputs:
+            return self.build_outputs()
+        return 0
+
+    def iter_rows(self):
+        """Legge le righe dal JSONL ignorando un'eventuale ultima riga troncata"""
+        if not self.jsonl_path.exists():
+            return
+        with open(self.jsonl_path, encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def collect_columns(self):
+        """Unione delle colonne di tutte le righe, in ordine di prima apparizione, e
+        posizione dell'ultima riga di ogni documento"""
+        columns = {}
+        last = {}
+        for index, row in enumerate(self.iter_rows()):
+            key = row.pop(KEY_FIELD, None)
+            if key is not None:
+                last[key] = index
+            for column in row:
+                columns.setdefault(column, None)
+        return list(columns), last
+
+    def iter_export_rows(self, last):
+        """Righe da esportare: per ogni documento solo l'ultima"""
+        for index, row in enumerate(self.iter_rows()):
+            key = row.pop(KEY_FIELD, None)
+            if key is None or last[key] == index:
+                yield row
+
+    def build_outputs(self):
+        """Genera CSV ed Excel dal JSONL senza caricare tutte le righe in memoria"""
+        columns, last = self.collect_columns()
+        if not columns:
+            return 0
+
+        # CSV nello stesso formato di export_data, poi Excel riga per riga
+        total = write_csv(self.csv_path, columns, self.iter_export_rows(last))
+        write_excel(self.excel_path, columns, self.iter_export_rows(last))
+        return total
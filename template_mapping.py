@@ -0,0 +1,138 @@
+"""
+Mappatura dei dati estratti sulle colonne del template di import
+Le colonne del template vengono lette una sola volta (e rilette solo se il file
+cambia); la mappatura di più coppie visura/documento riempie direttamente gli
+array delle colonne e costruisce un unico DataFrame, senza concatenare
+DataFrame di una riga.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+TEMPLATE_PATH = Path(__file__).parent / "format_import_template.xlsx"
+
+# Colonne del template -> campi della visura
+VISURA_FIELDS = (
+    ('Ragionesociale', 'Denominazione'),
+    ('Intestazione', 'Denominazione'),
+    ('Natura Giuridica', 'Forma_Giuridica'),
+    ('Codfisc Azienda', 'Codice_Fiscale'),
+    ('Partita Iva Azienda', 'Partita_IVA'),
+    ('Cciaa', 'Numero_REA'),
+    ('Cod Ateco', 'Codice_ATECO'),
+    ('Attivita', 'Attivita_Prevalente'),
+    ('Indirizzo Sede', 'Sede_Legale'),
+    ('Comune Sede', 'Comune'),
+    ('Cap Sede', 'CAP'),
+    ('Prov Sede', 'Provincia'),
+    ('Data Ini Rapporto', 'Data_Costituzione'),
+)
+VISURA_CONSTANTS = (
+    ('Stato Sede', 'ITALIA'),
+    ('Prest Prof', 'Tenuta della Contabilità'),
+    ('Tipo Ident', 'Diretta'),
+    ('Pep', 'NO'),
+)
+
+# Colonne del template -> campi del documento d'identità (anche come Titolare 1)
+DOCUMENTO_FIELDS = (
+    ('Nome 1', 'Nome'),
+    ('Cognome 1', 'Cognome'),
+    ('Sesso 1', 'Sesso'),
+    ('Data Nas 1', 'Data_Nascita'),
+    ('Comune Nas 1', 'Luogo_Nascita'),
+    ('Provincia Nas 1', 'Provincia_Nascita'),
+    ('Codfisc 1', 'CF_Persona'),
+    ('Indirizzo Res 1', 'Residenza'),
+    ('Comune Res 1', 'Comune_Residenza'),
+    ('Prov Res 1', 'Provincia_Nascita'),
+    ('Tipo Doc', 'Tipo_Documento'),
+    ('Num Doc', 'Numero_Documento'),
+    ('Data Doc', 'Data_Rilascio'),
+    ('Scadenza Doc', 'Data_Scadenza'),
+    ('Autorita Doc', 'Comune_Rilascio'),
+    ('Tit 1 Nome', 'Nome'),
+    ('Tit 1 Cognome', 'Cognome'),
+    ('Tit 1 Codfisc', 'CF_Persona'),
+    ('Tit 1 Sesso', 'Sesso'),
+    ('Tit 1 Datanas', 'Data_Nascita'),
+    ('Tit 1 Comunenas', 'Luogo_Nascita'),
+    ('Tit 1 Provincia Nas', 'Provincia_Nascita'),
+    ('Tit 1 Tipodoc', 'Tipo_Documento'),
+    ('Tit 1 Numdoc', 'Numero_Documento'),
+    ('Tit 1 Rilasc Da', 'Comune_Rilascio'),
+    ('Tit 1 Scad Doc', 'Data_Scadenza'),
+)
+DOCUMENTO_CONSTANTS = (
+    ('Stato Nas 1', 'ITALIA'),
+    ('Stato Res 1', 'ITALIA'),
+    ('Tit 1 Stato Nas', 'ITALIA'),
+)
+
+# Senza documento: l'amministratore della visura come persona 1
+AMMINISTRATORE_FIELDS = (
+    ('Nome 1', 'Amministratore_Nome'),
+    ('Cognome 1', 'Amministratore_Cognome'),
+    ('Tit 1 Nome', 'Amministratore_Nome'),
+    ('Tit 1 Cognome', 'Amministratore_Cognome'),
+)
+
+@lru_cache(maxsize=8)
+def _read_template_columns(path, mtime):
+    # Legge solo l'intestazione; mtime fa parte della chiave della cache
+    return tuple(pd.read_excel(path, nrows=0).columns)
+
+def load_template_columns(path=TEMPLATE_PATH):
+    """Colonne del template (lette una sola volta finché il file non cambia), None se manca"""
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    return list(_read_template_columns(str(path), mtime))
+
+def map_records_to_template(pairs, template_columns=None):
+    """Mappa una lista di coppie (visura, documento) sul template in un unico DataFrame
+
+    Visura o documento possono essere dict vuoti. Senza template i dati
+    vengono combinati nel formato standard (una colonna per campo). I campi
+    senza colonna nel template (es. template personalizzati) vengono ignorati.
+    """
+    pairs = list(pairs)
+    if template_columns is None:
+        template_columns = load_template_columns()
+    if not template_columns:
+        return pd.DataFrame([{**visura, **documento} for visura, documento in pairs])
+
+    columns = {column: [None] * len(pairs) for column in template_columns}
+    data_ident = datetime.now().strftime('%Y-%m-%d')
+
+    def put(column, index, value):
+        if column in columns:
+            columns[column][index] = value
+
+    for index, (visura, documento) in enumerate(pairs):
+        if visura:
+            put('Pers Soc', index, 'S' if visura.get('Denominazione') else 'P')
+            for column, field in VISURA_FIELDS:
+                put(column, index, visura.get(field, ''))
+            for column, value in VISURA_CONSTANTS:
+                put(column, index, value)
+            put('Data Ident', index, data_ident)
+
+        if documento:
+            put('Carica 1', index, 'TITOLARE' if visura else 'RAPPRESENTANTE LEGALE')
+            for column, field in DOCUMENTO_FIELDS:
+                put(column, index, documento.get(field, ''))
+            for column, value in DOCUMENTO_CONSTANTS:
+                put(column, index, value)
+        elif visura and (visura.get('Amministratore_Nome') or visura.get('Amministratore_Cognome')):
+            put('Carica 1', index, 'AMMINISTRATORE UNICO')
+            for column, field in AMMINISTRATORE_FIELDS:
+                put(column, index, visura.get(field, ''))
+
+    # object come per le righe singole: i valori mancanti restano None
+    return pd.DataFrame(columns, columns=template_columns, dtype=object)
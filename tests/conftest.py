@@ -0,0 +1,46 @@
+"""Configurazione comune dei test: i moduli del progetto sono nella cartella principale"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+VISURA_LINES = ("CAMERA DI COMMERCIO INDUSTRIA ARTIGIANATO", "VISURA ORDINARIA SOCIETA'",
+                "Denominazione: ALFA SRL", "Partita IVA: 01234567890", "Numero REA: MI-123456")
+
+def _escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def build_text_pdf(pages):
+    """PDF minimale con uno strato di testo (Helvetica) per ogni pagina (lista di righe)"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 10 Tf 50 800 Td 12 TL"]
+        ops.extend(f"({_escape(line)}) Tj T*" for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode('cp1252', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(content)
+    content += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    content += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    content += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return content
+
+@pytest.fixture
+def text_pdf():
+    """Costruttore di PDF con strato di testo: text_pdf(pagine), default una visura"""
+    return lambda pages=(VISURA_LINES,): build_text_pdf(pages)
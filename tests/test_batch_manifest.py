@@ -0,0 +1,138 @@
+"""Test del manifest di checkpoint e della ripresa (--resume)"""
+
+import json
+import os
+
+import batch_manifest
+from batch_manifest import BatchManifest, STATUS_OK, STATUS_ERROR
+from streaming_export import StreamingExporter
+
+def make_file(tmp_path, name='doc.pdf', content=b'%PDF-1.4 contenuto'):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return path
+
+def reopen(output):
+    """Manifest riaperto come in una ripresa"""
+    return BatchManifest(output, append=True)
+
+def test_done_after_reload(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(doc, STATUS_OK)
+    manifest.close()
+    assert reopen(output).is_done(doc)
+
+def test_error_and_unknown_files_are_not_done(tmp_path):
+    failed, other = make_file(tmp_path, 'a.pdf'), make_file(tmp_path, 'b.pdf')
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(failed, STATUS_ERROR, 'errore')
+    manifest.close()
+    resumed = reopen(output)
+    assert not resumed.is_done(failed)
+    assert not resumed.is_done(other)
+
+def test_last_entry_wins(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(doc, STATUS_ERROR, 'errore')
+    manifest.record(doc, STATUS_OK)
+    manifest.close()
+    assert reopen(output).is_done(doc)
+
+def test_modified_file_is_processed_again(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(doc, STATUS_OK)
+    manifest.close()
+    doc.write_bytes(b'%PDF-1.4 contenuto diverso')
+    assert not reopen(output).is_done(doc)
+
+def test_touched_file_with_same_content_is_done(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(doc, STATUS_OK)
+    manifest.close()
+    stat = os.stat(doc)
+    os.utime(doc, (stat.st_atime, stat.st_mtime + 10))
+    assert reopen(output).is_done(doc)
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(doc, STATUS_OK)
+    manifest.close()
+    with open(manifest.path, 'a', encoding='utf-8') as file:
+        file.write('{"path": "tronc')
+    assert reopen(output).is_done(doc)
+
+def test_file_hashed_once_per_document(tmp_path, monkeypatch):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(doc, STATUS_ERROR, 'errore')
+    manifest.close()
+    stat = os.stat(doc)
+    os.utime(doc, (stat.st_atime, stat.st_mtime + 10))
+
+    calls = []
+    original = batch_manifest.file_sha256
+    monkeypatch.setattr(batch_manifest, 'file_sha256', lambda path: calls.append(path) or original(path))
+    resumed = reopen(output)
+    # Stato di errore: is_done non arriva all'hash; record lo calcola una volta
+    assert not resumed.is_done(doc)
+    resumed.record(doc, STATUS_OK)
+    assert len(calls) == 1
+
+def test_entry_written_with_row_flush(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    exporter = StreamingExporter(output, flush_every=1, on_flush=manifest.flush)
+    # Stesso ordine di BatchDocumentProcessor.handle_result: stato, poi riga
+    manifest.record(doc, STATUS_OK)
+    exporter.write_row({'Nome_File': doc.name}, key=BatchManifest.key(doc))
+    lines = manifest.path.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['status'] for line in lines] == [STATUS_OK]
+    exporter.close(build_outputs=False)
+    manifest.close()
+
+def test_export_keeps_last_row_per_document(tmp_path):
+    output = tmp_path / 'out'
+    exporter = StreamingExporter(output)
+    exporter.write_row({'Nome_File': 'a.pdf', 'Valore': 'vecchio'}, key='/x/a.pdf')
+    exporter.write_row({'Nome_File': 'b.pdf', 'Valore': 'b'}, key='/x/b.pdf')
+    exporter.close(build_outputs=False)
+    # Ripresa dopo un'interruzione: a.pdf rielaborato e aggiunto allo stesso JSONL
+    exporter = StreamingExporter(output, append=True)
+    exporter.write_row({'Nome_File': 'a.pdf', 'Valore': 'nuovo'}, key='/x/a.pdf')
+    assert exporter.close() == 2
+    lines = exporter.csv_path.read_text(encoding='utf-8-sig').splitlines()
+    assert lines == ['Nome_File;Valore', 'b.pdf;b', 'a.pdf;nuovo']
+
+def test_record_of_vanished_file_is_an_error(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    doc.unlink()
+    entry = manifest.record(doc, STATUS_OK)
+    manifest.close()
+    assert entry['status'] == STATUS_ERROR
+    assert entry['error'].startswith('File non più disponibile')
+    assert not reopen(output).is_done(doc)
+
+def test_removed_file_is_not_done(tmp_path):
+    doc = make_file(tmp_path)
+    output = tmp_path / 'out'
+    manifest = BatchManifest(output)
+    manifest.record(doc, STATUS_OK)
+    manifest.close()
+    resumed = reopen(output)
+    doc.unlink()
+    assert not resumed.is_done(doc)
@@ -0,0 +1,119 @@
+"""Test dell'elaborazione batch: file spariti durante l'elaborazione"""
+
+import json
+from pathlib import Path
+
+from batch_manifest import STATUS_ERROR, STATUS_OK
+from batch_processor import BatchDocumentProcessor
+
+def make_folder(tmp_path, text_pdf, names=('a.pdf', 'b.pdf', 'c.pdf')):
+    folder = tmp_path / 'documenti'
+    folder.mkdir()
+    for name in names:
+        (folder / name).write_bytes(text_pdf())
+    return folder
+
+def make_processor(folder, tmp_path, **options):
+    return BatchDocumentProcessor(folder, str(tmp_path / 'risultati'), workers=1,
+                                  use_cache=False, stream=True, **options)
+
+def manifest_status(tmp_path):
+    lines = (tmp_path / 'risultati.manifest.jsonl').read_text(encoding='utf-8').splitlines()
+    entries = [json.loads(line) for line in lines]
+    return {Path(entry['path']).name: entry['status'] for entry in entries}
+
+def test_file_removed_after_extraction_is_logged_as_error(tmp_path, text_pdf):
+    folder = make_folder(tmp_path, text_pdf)
+    processor = make_processor(folder, tmp_path)
+    extract_many = processor.engine.extract_many
+
+    def removing(sources, workers=1, ordered=False):
+        for result in extract_many(sources, workers, ordered):
+            if result.name == 'b.pdf':
+                result.path.unlink()
+            yield result
+
+    processor.engine.extract_many = removing
+    processor.process_all_documents()
+    assert manifest_status(tmp_path) == {'a.pdf': STATUS_OK, 'b.pdf': STATUS_ERROR, 'c.pdf': STATUS_OK}
+    rows = (tmp_path / 'risultati.csv').read_text(encoding='utf-8-sig').splitlines()
+    header = rows[0].split(';')
+    errors = {row.split(';')[header.index('Nome_File')]: row.split(';')[header.index('Errore')]
+              for row in rows[1:]}
+    assert errors['b.pdf'].startswith('File non più disponibile')
+    assert errors['a.pdf'] == errors['c.pdf'] == ''
+
+def test_file_removed_before_extraction_does_not_stop_batch(tmp_path, text_pdf):
+    folder = make_folder(tmp_path, text_pdf)
+    processor = make_processor(folder, tmp_path)
+    sources = processor.sources
+
+    def removing(files):
+        for label, file_path in sources(files):
+            if file_path.name == 'b.pdf':
+                file_path.unlink()
+            yield label, file_path
+
+    processor.sources = removing
+    processor.process_all_documents()
+    assert manifest_status(tmp_path) == {'a.pdf': STATUS_OK, 'b.pdf': STATUS_ERROR, 'c.pdf': STATUS_OK}
+
+class FakeWatcher:
+    """Consegna i giri indicati, poi simula Ctrl+C dopo qualche giro vuoto"""
+
+    rounds = []
+    mode = 'test'
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def iter_ready(self):
+        for ready in self.rounds:
+            yield [str(path) for path in ready]
+        for _ in range(200):
+            yield []
+        raise KeyboardInterrupt
+
+def test_watch_skips_files_removed_after_being_seen(tmp_path, text_pdf, monkeypatch):
+    import folder_watcher
+    folder = make_folder(tmp_path, text_pdf)
+    make_processor(folder, tmp_path).process_all_documents()
+
+    # b.pdf già elaborato e poi archiviato, d.pdf file temporaneo rinominato subito
+    (folder / 'b.pdf').unlink()
+    (folder / 'c.pdf').write_bytes(text_pdf([("Camera di Commercio", "Visura aggiornata",
+                                              "Partita IVA: 01234567890")]))
+    FakeWatcher.rounds = [[folder / 'a.pdf', folder / 'b.pdf', folder / 'd.pdf'],
+                          [folder / 'c.pdf']]
+    monkeypatch.setattr(folder_watcher, 'FolderWatcher', FakeWatcher)
+    processor = make_processor(folder, tmp_path)
+    processor.watch_folder()
+    # Solo c.pdf (modificato) viene rielaborato; il ciclo non si interrompe
+    assert manifest_status(tmp_path) == {'a.pdf': STATUS_OK, 'b.pdf': STATUS_OK, 'c.pdf': STATUS_OK}
+    lines = (tmp_path / 'risultati.manifest.jsonl').read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 4
+
+def test_extraction_starts_before_discovery_ends(tmp_path, text_pdf, monkeypatch, capsys):
+    import batch_processor
+    folder = make_folder(tmp_path, text_pdf)
+    events = []
+
+    def discovering(root, recursive=False):
+        for file_path in sorted(folder.iterdir()):
+            events.append(('trovato', file_path.name))
+            yield file_path
+
+    monkeypatch.setattr(batch_processor, 'iter_documents', discovering)
+    processor = make_processor(folder, tmp_path)
+    extract = processor.engine.extract
+
+    def recording(source, name=None, doc_type=None):
+        events.append(('estratto', name))
+        return extract(source, name, doc_type)
+
+    processor.engine.extract = recording
+    processor.process_all_documents()
+    assert events.index(('estratto', 'a.pdf')) < events.index(('trovato', 'c.pdf'))
+    output = capsys.readouterr().out
+    assert '[3] Elaborazione: c.pdf' in output
+    assert 'Trovati 3 documenti, 3 elaborati' in output
@@ -0,0 +1,40 @@
+"""Test della classificazione dei documenti e dell'uscita anticipata"""
+
+from document_classifier import classify_document, DECISIVE_HITS, DOC_IDENTITA, DOC_VISURA
+
+def test_visura_recognized():
+    result = classify_document("Camera di Commercio - Visura ordinaria\nPartita IVA 01234567890")
+    assert result.doc_type == DOC_VISURA
+    assert result.confidence == 0.75
+
+def test_identity_document_recognized():
+    result = classify_document("CARTA IDENTITA\nLuogo di nascita ROMA\nData di nascita 01/02/1980")
+    assert result.doc_type == DOC_IDENTITA
+
+def test_one_keyword_is_not_enough():
+    result = classify_document("fattura n. 12 - residenza del cliente")
+    assert result.doc_type is None
+    assert result.confidence == 0.0
+
+def test_visura_has_priority_over_identity_keywords():
+    text = "visura camera di commercio\nresidenza comune di Roma data di nascita"
+    assert classify_document(text).doc_type == DOC_VISURA
+
+def test_scan_stops_after_decisive_hits():
+    # Tre parole chiave della visura nel primo blocco: il resto non viene letto
+    head = "visura camera di commercio partita iva".ljust(100)
+    tail = "rea residenza comune di data di nascita cittadinanza ".ljust(300)
+    result = classify_document(head + tail, chunk_chars=100)
+    assert DECISIVE_HITS == 3
+    assert result.doc_type == DOC_VISURA
+    assert result.scores[DOC_VISURA] == 0.75
+    assert result.scores[DOC_IDENTITA] == 0.0
+
+def test_below_decisive_hits_scan_continues():
+    head = "visura camera di commercio".ljust(100)
+    result = classify_document(head + "partita iva e rea", chunk_chars=100)
+    assert result.scores[DOC_VISURA] == 1.0
+
+def test_keyword_split_between_chunks():
+    text = "x" * 95 + "camera di commercio visura"
+    assert classify_document(text, chunk_chars=100).doc_type == DOC_VISURA
@@ -0,0 +1,64 @@
+"""Test dell'abbinamento tra visure e documenti d'identità"""
+
+from document_matching import (match_documents, match_report, STRATEGY_CF, STRATEGY_FILENAME,
+                               STRATEGY_NONE, STRATEGY_ORDER)
+
+def visura(name, cf='', piva=''):
+    return {'Nome_File': name, 'Codice_Fiscale': cf, 'Partita_IVA': piva}
+
+def documento(name, cf=''):
+    return {'Nome_File': name, 'CF_Persona': cf}
+
+def strategies(pairs):
+    return {(pair.visura.get('Nome_File'), pair.documento.get('Nome_File')): pair.strategy
+            for pair in pairs}
+
+def test_match_by_codice_fiscale():
+    visure = [visura('v1.pdf', cf='RSSMRA85T10A562S'), visura('v2.pdf', cf='BNCLGU70A01F205X')]
+    documenti = [documento('d1.jpg', cf='BNCLGU70A01F205X'), documento('d2.jpg', cf='RSSMRA85T10A562S')]
+    assert strategies(match_documents(visure, documenti)) == {
+        ('v1.pdf', 'd2.jpg'): STRATEGY_CF,
+        ('v2.pdf', 'd1.jpg'): STRATEGY_CF,
+    }
+
+def test_match_by_partita_iva_in_filename():
+    visure = [visura('v1.pdf', cf='00743110157', piva='00743110157'),
+              visura('v2.pdf', piva='12345678903')]
+    documenti = [documento('CI_12345678903.jpg'), documento('00743110157-fronte.jpg')]
+    assert strategies(match_documents(visure, documenti)) == {
+        ('v1.pdf', '00743110157-fronte.jpg'): STRATEGY_FILENAME,
+        ('v2.pdf', 'CI_12345678903.jpg'): STRATEGY_FILENAME,
+    }
+
+def test_filename_match_ignores_case():
+    visure = [visura('v1.pdf', cf='RSSMRA85T10A562S')]
+    documenti = [documento('altro.jpg'), documento('ci_rssmra85t10a562s.png'), documento('x.jpg')]
+    pairs = match_documents(visure, documenti)
+    assert strategies(pairs)[('v1.pdf', 'ci_rssmra85t10a562s.png')] == STRATEGY_FILENAME
+
+def test_document_used_only_once():
+    visure = [visura('v1.pdf', piva='12345678903'), visura('v2.pdf', piva='12345678903')]
+    documenti = [documento('12345678903.jpg')]
+    result = strategies(match_documents(visure, documenti))
+    assert result[('v1.pdf', '12345678903.jpg')] == STRATEGY_FILENAME
+    assert result[('v2.pdf', None)] == STRATEGY_NONE
+
+def test_cf_has_priority_over_filename():
+    visure = [visura('v1.pdf', cf='RSSMRA85T10A562S', piva='12345678903')]
+    documenti = [documento('12345678903.jpg'), documento('d2.jpg', cf='RSSMRA85T10A562S')]
+    result = strategies(match_documents(visure, documenti))
+    assert result[('v1.pdf', 'd2.jpg')] == STRATEGY_CF
+
+def test_fallback_by_upload_order():
+    visure = [visura('v1.pdf'), visura('v2.pdf')]
+    documenti = [documento('d1.jpg'), documento('d2.jpg')]
+    assert strategies(match_documents(visure, documenti)) == {
+        ('v1.pdf', 'd1.jpg'): STRATEGY_ORDER,
+        ('v2.pdf', 'd2.jpg'): STRATEGY_ORDER,
+    }
+
+def test_unmatched_documents_returned_alone():
+    pairs = match_documents([visura('v1.pdf')], [documento('d1.jpg'), documento('d2.jpg')])
+    assert [pair.strategy for pair in pairs] == [STRATEGY_NONE] * 3
+    report = match_report(pairs)
+    assert report[0] == {'File Visura': 'v1.pdf', 'File Documento': '', 'Strategia': STRATEGY_NONE}
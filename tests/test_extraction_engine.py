@@ -0,0 +1,62 @@
+"""Test dell'API pubblica del motore di estrazione"""
+
+import pytest
+
+from document_classifier import DOC_IDENTITA, DOC_VISURA
+from extraction_engine import ExtractionEngine
+
+DOCUMENTO_LINES = ("REPUBBLICA ITALIANA - CARTA IDENTITA", "Cognome: ROSSI", "Nome: MARIO",
+                   "Data di nascita: 01/01/1980", "Luogo di nascita: ROMA",
+                   "Codice fiscale: RSSMRA80A01H501U")
+VISURA_PAGE = ("CAMERA DI COMMERCIO", "VISURA ORDINARIA", "Partita IVA: 01234567890")
+ALTRO_LINES = ("Fattura n. 12 del 03/02/2024", "Totale da pagare: 100,00 euro")
+
+def sources(text_pdf, count=6):
+    """Coppie (nome, contenuto): visure e documenti alternati, un file non valido al centro"""
+    items = []
+    for index in range(count):
+        content = text_pdf() if index % 2 else text_pdf([DOCUMENTO_LINES])
+        items.append((f"doc{index}.pdf", content))
+    items.insert(count // 2, ('rotto.pdf', b'non sono un documento'))
+    return items
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_extract_many_ordered(workers, text_pdf):
+    items = sources(text_pdf)
+    results = list(ExtractionEngine(use_cache=False).extract_many(items, workers, ordered=True))
+    assert [result.name for result in results] == [name for name, _ in items]
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_extract_many_unordered_returns_every_document(workers, text_pdf):
+    items = sources(text_pdf)
+    results = list(ExtractionEngine(use_cache=False).extract_many(items, workers, ordered=False))
+    assert sorted(result.name for result in results) == sorted(name for name, _ in items)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failing_document_does_not_affect_neighbours(workers, text_pdf):
+    results = ExtractionEngine(use_cache=False).extract_many(sources(text_pdf), workers, ordered=True)
+    by_name = {result.name: result for result in results}
+    broken = by_name.pop('rotto.pdf')
+    assert broken.error.startswith('Formato non supportato') and broken.doc_type is None
+    for result in by_name.values():
+        assert result.error is None
+        assert result.doc_type == (DOC_VISURA if int(result.name[3]) % 2 else DOC_IDENTITA)
+    assert by_name['doc1.pdf'].data['Partita_IVA'] == '01234567890'
+
+def test_classification_result(text_pdf):
+    engine = ExtractionEngine(use_cache=False)
+    visura = engine.extract(text_pdf(), 'visura.pdf')
+    assert (visura.doc_type, visura.confidence) == (DOC_VISURA, 1.0)
+    documento = engine.extract(text_pdf([DOCUMENTO_LINES]), 'carta.pdf')
+    assert documento.doc_type == DOC_IDENTITA and 0 < documento.confidence < 1
+    # Con doc_type il tipo non viene riconosciuto dal testo (nessuna confidenza)
+    forced = engine.extract(text_pdf([ALTRO_LINES]), 'altro.pdf', doc_type=DOC_VISURA)
+    assert (forced.doc_type, forced.confidence) == (DOC_VISURA, None)
+
+def test_unrecognised_document_with_and_without_triage(text_pdf):
+    content = text_pdf([ALTRO_LINES, VISURA_PAGE])
+    read = ExtractionEngine(use_cache=False).extract(content, 'altro.pdf')
+    assert read.doc_type == DOC_VISURA and 'Fattura' in read.text
+    # Triage: la prima pagina non è riconosciuta, il resto del PDF non viene letto
+    discarded = ExtractionEngine(use_cache=False, triage=True).extract(content, 'altro.pdf')
+    assert discarded.doc_type is None and discarded.text is None and discarded.error is None
@@ -0,0 +1,30 @@
+"""Test del rilevamento dei file pronti nella modalità continua (polling)"""
+
+from itertools import islice
+
+from folder_watcher import FolderWatcher
+
+def ready_files(watcher, rounds=3):
+    """File consegnati nei primi giri del polling"""
+    return sorted(path for ready in islice(watcher.iter_ready(), rounds) for path in ready)
+
+def make_tree(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF-1.4')
+    (tmp_path / 'sub' / 'b.pdf').write_bytes(b'%PDF-1.4')
+    (tmp_path / 'nota.txt').write_text('testo')
+    return str(tmp_path / 'a.pdf'), str(tmp_path / 'sub' / 'b.pdf')
+
+def is_pdf(path):
+    return path.endswith('.pdf')
+
+def test_top_level_only_by_default(tmp_path):
+    top, _ = make_tree(tmp_path)
+    watcher = FolderWatcher(tmp_path, is_pdf, poll_interval=0, settle_time=0, use_events=False)
+    assert ready_files(watcher) == [top]
+
+def test_recursive_includes_subfolders(tmp_path):
+    top, nested = make_tree(tmp_path)
+    watcher = FolderWatcher(tmp_path, is_pdf, poll_interval=0, settle_time=0, use_events=False,
+                            recursive=True)
+    assert ready_files(watcher) == sorted([top, nested])
@@ -0,0 +1,33 @@
+"""Test della lettura a zone: pool di thread condiviso tra le carte"""
+
+import threading
+
+from PIL import Image
+
+from id_card_layout import (CARD_WIDTH, LAYOUT_CIE_FRONTE, LAYOUTS, REGION_WORKERS,
+                            read_regions, region_executor)
+
+class RecordingEngine:
+    """Motore OCR finto che annota i thread in cui viene chiamato"""
+
+    def __init__(self):
+        self.threads = set()
+
+    def image_to_string(self, image, lang='ita', config=''):
+        self.threads.add(threading.get_ident())
+        return ' VALORE \n'
+
+def test_regions_read_and_cleaned():
+    card = Image.new('L', (CARD_WIDTH, 638), 230)
+    layout = LAYOUTS[LAYOUT_CIE_FRONTE]
+    values = read_regions(card, layout, RecordingEngine())
+    assert values == {region.field: 'VALORE' for region in layout.regions}
+
+def test_threads_reused_across_cards():
+    # Con tesserocr ogni thread tiene le sue API: i thread non devono cambiare a ogni carta
+    card = Image.new('L', (CARD_WIDTH, 638), 230)
+    engine = RecordingEngine()
+    for _ in range(10):
+        read_regions(card, LAYOUTS[LAYOUT_CIE_FRONTE], engine)
+    assert len(engine.threads) <= REGION_WORKERS
+    assert region_executor() is region_executor(REGION_WORKERS)
@@ -0,0 +1,32 @@
+"""Test del preprocessing delle immagini: attivazione e risoluzione presunta"""
+
+from PIL import Image
+
+from image_preprocessing import (FULL_PREPROCESS, NO_PREPROCESS, assumed_long_side_mm,
+                                 preprocess_image, preprocess_key)
+
+def test_disabled_preprocessing_only_converts_to_gray():
+    image = Image.new('RGB', (4000, 3000), 'white')
+    result = preprocess_image(image, NO_PREPROCESS)
+    assert result.mode == 'L'
+    assert result.size == image.size
+    assert preprocess_key(NO_PREPROCESS) == ''
+
+def test_assumed_long_side_by_orientation():
+    assert assumed_long_side_mm(Image.new('L', (1600, 1000)), FULL_PREPROCESS) == 85.6
+    assert assumed_long_side_mm(Image.new('L', (2480, 3508)), FULL_PREPROCESS) == 297
+
+def test_card_photo_without_dpi_reduced_to_card_resolution():
+    # Carta orizzontale senza DPI (foto del telefono): 85,6 mm a 300 DPI sono circa 1011 pixel
+    photo = Image.new('L', (4000, 2520), 255)
+    photo.info['dpi'] = (72, 72)
+    result = preprocess_image(photo, FULL_PREPROCESS._replace(crop=False, deskew=False,
+                                                              binarize=False))
+    assert abs(result.size[0] - 1011) <= 1
+
+def test_page_scan_without_dpi_reduced_to_page_resolution():
+    # Pagina A4 verticale senza DPI: 297 mm a 300 DPI sono circa 3508 pixel
+    scan = Image.new('L', (4961, 7016), 255)
+    result = preprocess_image(scan, FULL_PREPROCESS._replace(crop=False, deskew=False,
+                                                             binarize=False))
+    assert abs(result.size[1] - 3508) <= 1
@@ -0,0 +1,40 @@
+"""Test dei tempi per fase: righe per documento e limite delle righe in memoria"""
+
+from metrics import StageMetrics, STAGE_OCR, STAGE_TOTAL, stage
+
+def test_stage_times_are_recorded_per_document():
+    metrics = StageMetrics()
+    metrics.enabled = True
+    with metrics.document('a.pdf'):
+        with stage(STAGE_OCR):
+            pass
+    record, = metrics.records
+    assert record['documento'] == 'a.pdf'
+    assert STAGE_OCR in record['fasi']
+    assert metrics.samples[STAGE_TOTAL].count == 1
+
+def test_disabled_metrics_record_nothing():
+    metrics = StageMetrics()
+    with metrics.document('a.pdf'):
+        with stage(STAGE_OCR):
+            pass
+    assert metrics.records == []
+    assert metrics.samples == {}
+
+def test_max_records_keeps_latest_rows():
+    metrics = StageMetrics(max_records=3)
+    metrics.enabled = True
+    for index in range(5):
+        with metrics.document(f"{index}.pdf"):
+            pass
+    assert [record['documento'] for record in metrics.records] == ['2.pdf', '3.pdf', '4.pdf']
+    # I percentili restano calcolati su tutti i documenti
+    assert metrics.samples[STAGE_TOTAL].count == 5
+
+def test_separate_metrics_do_not_share_rows():
+    first, second = StageMetrics(), StageMetrics()
+    first.enabled = second.enabled = True
+    with first.document('a.pdf'):
+        pass
+    assert len(first.records) == 1
+    assert second.records == []
@@ -0,0 +1,89 @@
+"""Test della lettura della MRZ: cifre di controllo TD1 (CIE) e TD3 (passaporti)"""
+
+from PIL import Image
+
+from id_card_layout import looks_like_card
+from mrz import MRZ_TD1, MRZ_TD3, check_digit, parse_mrz, parse_td1, parse_td3
+
+def td1_lines(number='CA12345AB', birth='800201', sex='M', expiry='300201'):
+    line1 = f"C<ITA{number}{check_digit(number)}".ljust(30, '<')
+    line2 = f"{birth}{check_digit(birth)}{sex}{expiry}{check_digit(expiry)}ITA".ljust(29, '<')
+    line2 += check_digit(line1[5:30] + line2[0:7] + line2[8:15] + line2[18:29])
+    return [line1, line2, "ROSSI<<MARIO".ljust(30, '<')]
+
+def td3_lines(number='YA1234567', birth='750715', sex='F', expiry='290714'):
+    line1 = "P<ITABIANCHI<<LAURA<MARIA".ljust(44, '<')
+    line2 = (f"{number}{check_digit(number)}ITA{birth}{check_digit(birth)}{sex}"
+             f"{expiry}{check_digit(expiry)}").ljust(42, '<')
+    line2 += check_digit('<' * 14)
+    line2 += check_digit(line2[0:10] + line2[13:20] + line2[21:43])
+    return [line1, line2]
+
+def replace(line, index, char):
+    return line[:index] + char + line[index + 1:]
+
+def test_check_digit():
+    # Esempio del documento ICAO 9303
+    assert check_digit('L898902C3') == '6'
+    assert check_digit('740812') == '2'
+    assert check_digit('<<<<') == '0'
+
+def test_td1_valid():
+    fields = parse_td1(td1_lines())
+    assert fields['Numero_Documento'] == 'CA12345AB'
+    assert fields['Cognome'] == 'ROSSI'
+    assert fields['Nome'] == 'MARIO'
+    assert fields['Data_Nascita'] == '01/02/1980'
+    assert fields['Data_Scadenza'] == '01/02/2030'
+    assert fields['Sesso'] == 'M'
+    assert fields['Cittadinanza'] == 'ITALIANA'
+    assert fields['Tipo_Documento'] == "CARTA D'IDENTITA"
+
+def test_td1_wrong_document_number():
+    lines = td1_lines()
+    lines[0] = replace(lines[0], 6, 'B')
+    assert parse_td1(lines) is None
+
+def test_td1_wrong_composite_digit():
+    lines = td1_lines()
+    lines[1] = replace(lines[1], 29, str((int(lines[1][29]) + 1) % 10))
+    assert parse_td1(lines) is None
+
+def test_td1_letters_read_as_digits_are_fixed():
+    lines = td1_lines()
+    # O al posto dello 0 nella data di nascita
+    lines[1] = lines[1].replace('800201', '8OO2O1', 1)
+    assert parse_td1(lines)['Data_Nascita'] == '01/02/1980'
+
+def test_td3_valid():
+    fields = parse_td3(td3_lines())
+    assert fields['Tipo_Documento'] == 'PASSAPORTO'
+    assert fields['Numero_Documento'] == 'YA1234567'
+    assert fields['Cognome'] == 'BIANCHI'
+    assert fields['Nome'] == 'LAURA MARIA'
+    assert fields['Data_Nascita'] == '15/07/1975'
+    assert fields['Data_Scadenza'] == '14/07/2029'
+
+def test_td3_wrong_birth_digit():
+    lines = td3_lines()
+    lines[1] = replace(lines[1], 19, str((int(lines[1][19]) + 1) % 10))
+    assert parse_td3(lines) is None
+
+def test_td3_invalid_date():
+    assert parse_td3(td3_lines(birth='751315')) is None
+
+def test_parse_mrz_in_ocr_text():
+    text = "REPUBBLICA ITALIANA\n" + "\n".join(td3_lines()).replace('<<<<', '< <<<') + "\n"
+    reading = parse_mrz(text)
+    assert reading.format == MRZ_TD3
+    assert parse_mrz("\n".join(td1_lines())[:-1]).format == MRZ_TD1
+
+def test_parse_mrz_rejects_wrong_check_digits():
+    lines = td1_lines()
+    lines[1] = replace(lines[1], 6, str((int(lines[1][6]) + 1) % 10))
+    assert parse_mrz("\n".join(lines)) is None
+
+def test_looks_like_card():
+    assert looks_like_card(Image.new('L', (4000, 3000)))
+    assert looks_like_card(Image.new('L', (1012, 638)))
+    assert not looks_like_card(Image.new('L', (2480, 3508)))
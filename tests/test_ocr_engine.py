@@ -0,0 +1,56 @@
+"""Test dei motori OCR: opzioni di tesseract e stesso testo con tesserocr e pytesseract"""
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from ocr_engine import (BACKEND_PYTESSERACT, PytesseractEngine, TesserocrEngine,
+                        parse_tesseract_config, resolve_backend)
+
+LINES = ("CAMERA DI COMMERCIO", "VISURA ORDINARIA", "PARTITA IVA 01234567890",
+         "CODICE FISCALE RSSMRA85T10A562S")
+
+def test_parse_tesseract_config():
+    oem, psm, variables = parse_tesseract_config('--oem 1 --psm 6 -c tessedit_char_whitelist=0123')
+    assert (oem, psm) == (1, 6)
+    assert variables == {'tessedit_char_whitelist': '0123'}
+    assert parse_tesseract_config('') == (None, None, {})
+
+def test_resolve_backend():
+    assert resolve_backend(BACKEND_PYTESSERACT) == BACKEND_PYTESSERACT
+    with pytest.raises(ValueError):
+        resolve_backend('easyocr')
+
+@pytest.fixture
+def text_image():
+    """Pagina sintetica con righe di testo nero su bianco"""
+    image = Image.new('L', (1400, 80 + 70 * len(LINES)), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=40)
+    for index, line in enumerate(LINES):
+        draw.text((40, 40 + 70 * index), line, fill=0, font=font)
+    return image
+
+@pytest.fixture
+def tesseract():
+    """Salta il test se tesserocr o l'eseguibile tesseract (con la lingua italiana) mancano"""
+    pytest.importorskip('tesserocr')
+    pytesseract = pytest.importorskip('pytesseract')
+    try:
+        if 'ita' not in pytesseract.get_languages():
+            pytest.skip("modello ita di tesseract non installato")
+    except Exception:
+        pytest.skip("tesseract non installato")
+
+@pytest.mark.parametrize('config', ['', '--psm 6', '--oem 3 --psm 6'])
+def test_tesserocr_matches_pytesseract(tesseract, text_image, config):
+    expected = PytesseractEngine().image_to_string(text_image, 'ita', config)
+    found = TesserocrEngine().image_to_string(text_image, 'ita', config)
+    assert found.split() == expected.split()
+    assert all(line in ' '.join(found.split()) for line in LINES)
+
+def test_tesserocr_restores_variables(tesseract, text_image):
+    engine = TesserocrEngine()
+    digits = engine.image_to_string(text_image, 'ita', '--psm 6 -c tessedit_char_whitelist=0123456789')
+    assert not any(char.isalpha() for char in digits)
+    # La whitelist vale solo per l'immagine richiesta
+    assert 'VISURA' in engine.image_to_string(text_image, 'ita', '--psm 6')
@@ -0,0 +1,26 @@
+"""Test dei livelli dell'OCR a livelli"""
+
+from PIL import Image
+
+from image_preprocessing import FULL_PREPROCESS, NO_PREPROCESS, preprocess_image
+from ocr_escalation import FAST_DPI, HIGH_DPI, SPARSE_PSM, build_tiers
+
+def test_tiers_with_preprocessing():
+    tiers = build_tiers(FULL_PREPROCESS)
+    assert [tier.name for tier in tiers] == ['rapido', 'standard', 'testo sparso', 'alta risoluzione']
+    assert tiers[0].preprocess.target_dpi == FAST_DPI
+    assert tiers[2].psm == SPARSE_PSM
+    assert tiers[3].preprocess.target_dpi == HIGH_DPI
+
+def test_fast_tier_downscales_without_preprocessing():
+    tiers = build_tiers(NO_PREPROCESS)
+    assert [tier.name for tier in tiers] == ['rapido', 'standard', 'testo sparso']
+    fast = tiers[0].preprocess
+    assert fast.enabled and fast.target_dpi == FAST_DPI
+    assert not (fast.crop or fast.deskew or fast.binarize)
+    # Foto di una carta (85,6 mm) a 1200 DPI: ridotta a 200 DPI, grigi conservati
+    photo = Image.new('RGB', (4044, 2550), (200, 180, 160))
+    reduced = preprocess_image(photo, fast)
+    assert reduced.mode == 'L' and reduced.size[0] == 674
+    assert len(reduced.getcolors()) == 1
+    assert preprocess_image(photo, tiers[1].preprocess).size == photo.size
@@ -0,0 +1,47 @@
+"""Test dell'estrazione del testo dai PDF scansionati con triage e uscita anticipata"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from pdf_text import extract_pdf_document_text
+
+VISURA_PAGE = "Camera di Commercio\nVisura ordinaria\nPartita IVA 01234567890"
+
+@pytest.fixture
+def scanned_pdf():
+    """PDF di tre pagine scansionate (solo immagini, senza strato di testo)"""
+    pages = [Image.new('L', (1240, 1754), 255) for _ in range(3)]
+    buffer = io.BytesIO()
+    pages[0].save(buffer, 'PDF', save_all=True, append_images=pages[1:], resolution=150)
+    return buffer.getvalue()
+
+def counting_ocr(text):
+    calls = []
+    def ocr_image(image):
+        calls.append(image.size)
+        return text
+    return ocr_image, calls
+
+@pytest.mark.parametrize('early_stop', [False, True])
+def test_triage_pages_are_not_read_twice(scanned_pdf, early_stop):
+    ocr_image, calls = counting_ocr(VISURA_PAGE)
+    text = extract_pdf_document_text(scanned_pdf, ocr_image, triage=True, early_stop=early_stop)
+    assert text.startswith(VISURA_PAGE)
+    # Senza uscita anticipata tutte le pagine, ciascuna una volta sola
+    assert len(calls) <= 3
+    if not early_stop:
+        assert len(calls) == 3
+        assert text.count(VISURA_PAGE) == 3
+
+def test_triage_discards_unknown_documents_after_first_page(scanned_pdf):
+    ocr_image, calls = counting_ocr("Fattura n. 12 del 01/02/2024 e altro testo")
+    assert extract_pdf_document_text(scanned_pdf, ocr_image, triage=True) is None
+    assert len(calls) == 1
+
+def test_without_triage_all_pages_are_read(scanned_pdf):
+    ocr_image, calls = counting_ocr(VISURA_PAGE)
+    text = extract_pdf_document_text(scanned_pdf, ocr_image)
+    assert text.count(VISURA_PAGE) == 3
+    assert len(calls) == 3
@@ -0,0 +1,33 @@
+"""Test della profilazione: tracce dei documenti lenti senza sovrascritture"""
+
+from profiling import DocumentProfiler
+
+def profile_documents(tmp_path, paths):
+    profiler = DocumentProfiler()
+    profiler.configure(tmp_path / 'profiles', threshold=0)
+    for path in paths:
+        with profiler.document(path.name, path=path):
+            sum(range(1000))
+    return profiler
+
+def test_same_name_in_different_folders_kept_apart(tmp_path):
+    paths = [tmp_path / 'a' / 'visura.pdf', tmp_path / 'b' / 'visura.pdf']
+    profiler = profile_documents(tmp_path, paths)
+    traces = sorted((tmp_path / 'profiles').glob('*.prof'))
+    assert profiler.saved == 2
+    assert len(traces) == 2
+    assert all(trace.name.startswith('visura.pdf-') for trace in traces)
+
+def test_trace_name_is_stable_for_a_path(tmp_path):
+    profiler = DocumentProfiler()
+    profiler.configure(tmp_path)
+    path = tmp_path / 'cartella con spazi' / 'doc 1.pdf'
+    base = profiler.trace_base('doc 1.pdf', path)
+    assert base == profiler.trace_base('doc 1.pdf', path)
+    assert base.name.startswith('doc_1.pdf-')
+
+def test_summary_reports_path(tmp_path):
+    path = tmp_path / 'sub' / 'lento.pdf'
+    profile_documents(tmp_path, [path])
+    summary, = (tmp_path / 'profiles').glob('*.txt')
+    assert f"Percorso: {path}" in summary.read_text(encoding='utf-8')
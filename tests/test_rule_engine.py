@@ -0,0 +1,82 @@
+"""Test del motore di regole: ancore, priorità dei pattern ed estrazione della visura"""
+
+import re
+
+from rule_engine import (AnchorIndex, FieldRule, RuleSet, anchored, match_at_anchors,
+                         parse_visura_camerale, read_until_settled, VISURA_RULES)
+
+VISURA = """VISURA ORDINARIA SOCIETA' DI CAPITALE
+
+ROSSI COSTRUZIONI S.R.L.
+Denominazione: ROSSI COSTRUZIONI S.R.L.
+Forma giuridica: società a responsabilità limitata
+Sede legale: Via Roma 12 CAP 20121 Milano (MI)
+Codice fiscale e n.iscr. al Registro Imprese: 01234567890
+Partita IVA: 01234567890
+Numero REA: MI - 1234567
+Data atto di costituzione: 15/03/2005
+Codice ATECO: 41.20.00
+Amministratore Unico: MARIO ROSSI
+"""
+
+def test_anchor_positions_are_merged_in_order():
+    index = AnchorIndex("iva ... rea ... iva ... rea")
+    assert list(index.iter_positions(['rea', 'iva'])) == [0, 8, 16, 24]
+
+def test_anchor_positions_with_missing_keyword():
+    index = AnchorIndex("solo iva qui")
+    assert list(index.iter_positions(['iva', 'assente'])) == [5]
+
+def test_match_at_anchors_uses_lookbehind():
+    text = "xx P. IVA: 01234567890"
+    regex = re.compile(r"P\.\s*IVA:\s*(\d{11})")
+    # L'ancora 'iva' è dentro il match: senza lookbehind non si trova l'inizio
+    positions = [text.lower().find('iva')]
+    assert match_at_anchors(regex, text, positions) is None
+    match = match_at_anchors(regex, text, positions, lookbehind=8)
+    assert match.group(1) == '01234567890'
+
+def test_later_pattern_used_when_value_rejected():
+    rule = FieldRule('Codice', [r"Codice:\s*(\w+)", r"Alt:\s*(\w+)"],
+                     accept=lambda value: len(value) == 4)
+    assert rule.apply("Codice: AB Alt: ABCD") == {'Codice': 'ABCD'}
+
+def test_try_next_false_stops_at_first_match():
+    rule = FieldRule('Codice', [r"Codice:\s*(\w+)", r"Alt:\s*(\w+)"],
+                     accept=lambda value: len(value) == 4, try_next=False)
+    assert rule.apply("Codice: AB Alt: ABCD") == {}
+
+def test_anchored_rule_matches_only_at_keywords():
+    rules = RuleSet('prova', [FieldRule('Numero', [anchored('numero', r"numero:\s*(\d+)")])])
+    assert rules.extract("testo numero: 42", stats=None) == {'Numero': '42'}
+    assert rules.extract("testo senza ancora: 42", stats=None) == {}
+
+def test_single_scan_matches_full_scan():
+    text = VISURA + "\n".join(f"riga di riempimento {n} con iva e rea" for n in range(50))
+    assert (VISURA_RULES.extract(text, stats=None) ==
+            VISURA_RULES.extract(text, stats=None, single_scan=False))
+
+def test_visura_fields():
+    data = parse_visura_camerale(VISURA)
+    assert data['Partita_IVA'] == '01234567890'
+    assert data['Numero_REA'] == 'MI - 1234567'
+    assert data['CAP'] == '20121'
+
+def test_read_until_settled_stops_after_key_fields():
+    pages = iter([VISURA, "pagina due", "pagina tre", "pagina quattro"])
+    text = read_until_settled(pages, fields=('Partita_IVA', 'Numero_REA'))
+    # Il campo trovato nella prima pagina è certo solo dopo aver letto la successiva
+    assert text == VISURA + "\n" + "pagina due\n"
+    assert next(pages) == "pagina tre"
+
+def test_read_until_settled_reads_everything_when_field_missing():
+    pages = ["Partita IVA: 01234567890", "altro", "fine"]
+    text = read_until_settled(iter(pages), fields=('Partita_IVA', 'Numero_REA'))
+    assert text == "".join(page + "\n" for page in pages)
+
+def test_read_until_settled_waits_for_match_across_pages():
+    # Il valore inizia nell'ultima pagina letta: serve la pagina successiva per confermarlo
+    pages = iter(["intestazione", "Partita IVA:", "01234567890", "resto", "non letta"])
+    text = read_until_settled(pages, fields=('Partita_IVA',))
+    assert parse_visura_camerale(text)['Partita_IVA'] == '01234567890'
+    assert next(pages) == "non letta"
@@ -0,0 +1,23 @@
+"""Test della mappatura sul template di import"""
+
+from template_mapping import map_records_to_template
+
+VISURA = {'Denominazione': 'ROSSI S.R.L.', 'Partita_IVA': '01234567890',
+          'Amministratore_Nome': 'MARIO', 'Amministratore_Cognome': 'ROSSI'}
+DOCUMENTO = {'Nome': 'MARIO', 'Cognome': 'ROSSI', 'CF_Persona': 'RSSMRA80A01H501U'}
+
+def test_custom_template_with_few_columns():
+    pairs = [(VISURA, DOCUMENTO), (VISURA, {}), ({}, DOCUMENTO)]
+    df = map_records_to_template(pairs, ['Ragionesociale'])
+    assert list(df.columns) == ['Ragionesociale']
+    assert list(df['Ragionesociale']) == ['ROSSI S.R.L.', 'ROSSI S.R.L.', None]
+
+def test_fixed_columns_filled_when_present():
+    columns = ['Pers Soc', 'Partita Iva Azienda', 'Carica 1', 'Nome 1', 'Codfisc 1']
+    df = map_records_to_template([(VISURA, DOCUMENTO), (VISURA, {})], columns)
+    assert df.to_dict('records') == [
+        {'Pers Soc': 'S', 'Partita Iva Azienda': '01234567890', 'Carica 1': 'TITOLARE',
+         'Nome 1': 'MARIO', 'Codfisc 1': 'RSSMRA80A01H501U'},
+        {'Pers Soc': 'S', 'Partita Iva Azienda': '01234567890', 'Carica 1': 'AMMINISTRATORE UNICO',
+         'Nome 1': 'MARIO', 'Codfisc 1': None},
+    ]
@@ -0,0 +1,69 @@
+"""Test delle chiavi e dell'eviction LRU della cache del testo estratto"""
+
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+import text_cache
+from text_cache import TextCache, ocr_config_key, pdf_config_key
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Orologio finto: ogni lettura avanza di un secondo (ordine LRU deterministico)"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(text_cache, 'time', SimpleNamespace(time=lambda: float(next(ticks))))
+
+def make_cache(tmp_path, max_bytes=1024 * 1024):
+    return TextCache(cache_dir=tmp_path, max_mb=max_bytes / (1024 * 1024), enabled=True)
+
+def test_key_depends_on_content_and_config():
+    cache = TextCache(enabled=False)
+    key = cache.make_key(b'abc', 'cfg')
+    assert key == cache.make_key(b'abc', 'cfg')
+    assert key != cache.make_key(b'abd', 'cfg')
+    assert key != cache.make_key(b'abc', 'cfg2')
+
+def test_ocr_config_key_parts():
+    assert ocr_config_key('ita') == 'ocr|tesseract|lang=ita|'
+    assert ocr_config_key('ita', '--psm 6', 'pp', 'tesserocr') == 'ocr|tesserocr|lang=ita|--psm 6|pp'
+
+def test_pdf_config_key_separates_early_stop():
+    ocr_key = ocr_config_key('ita')
+    assert pdf_config_key(ocr_key) != pdf_config_key(ocr_key, early_stop=True)
+    assert pdf_config_key(ocr_key).endswith(ocr_key)
+
+def test_get_or_compute_calls_compute_once(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+    compute = lambda: calls.append(1) or 'testo'
+    assert cache.get_or_compute(b'file', 'cfg', compute) == 'testo'
+    assert cache.get_or_compute(b'file', 'cfg', compute) == 'testo'
+    assert len(calls) == 1
+
+def test_none_result_is_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get_or_compute(b'file', 'cfg', lambda: None) is None
+    assert cache.get_or_compute(b'file', 'cfg', lambda: 'dopo') == 'dopo'
+
+def test_disabled_cache_always_computes(tmp_path):
+    cache = TextCache(cache_dir=tmp_path, enabled=False)
+    cache.put('k', 'testo')
+    assert cache.get('k') is None
+    assert not (tmp_path / 'text_cache.sqlite3').exists()
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = make_cache(tmp_path, max_bytes=25)
+    cache.put('a', 'x' * 10)
+    cache.put('b', 'y' * 10)
+    # 'a' letto di recente: l'eviction deve togliere 'b'
+    assert cache.get('a') == 'x' * 10
+    cache.put('c', 'z' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 10
+    assert cache.get('c') == 'z' * 10
+
+def test_text_larger_than_limit_is_not_stored(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=5)
+    cache.put('a', 'troppo lungo')
+    assert cache.get('a') is None
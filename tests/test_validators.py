@@ -0,0 +1,58 @@
+"""Test dei controlli di validità dei campi estratti"""
+
+from datetime import date
+
+from validators import (codice_fiscale_azienda_valid, codice_fiscale_check_char,
+                        codice_fiscale_valid, parse_date, partita_iva_valid, plausible_date)
+
+TODAY = date(2024, 6, 15)
+
+def test_codice_fiscale_valid():
+    assert codice_fiscale_valid('RSSMRA85T10A562S')
+    assert codice_fiscale_valid(' rssmra85t10a562s ')
+    assert codice_fiscale_check_char('RSSMRA85T10A562') == 'S'
+
+def test_codice_fiscale_wrong_check_char():
+    assert not codice_fiscale_valid('RSSMRA85T10A562T')
+
+def test_codice_fiscale_ocr_errors():
+    # O al posto di 0 nel giorno, lunghezza errata, mese inesistente
+    assert not codice_fiscale_valid('RSSMRA85T1OA562S')
+    assert not codice_fiscale_valid('RSSMRA85T10A562')
+    assert not codice_fiscale_valid('RSSMRA85F10A562S')
+
+def test_codice_fiscale_omocodia():
+    # Ultima cifra del codice catastale sostituita dalla lettera corrispondente (2 -> N)
+    code = 'RSSMRA85T10A56N'
+    assert codice_fiscale_valid(code + codice_fiscale_check_char(code))
+
+def test_partita_iva_valid():
+    assert partita_iva_valid('12345678903')
+    assert partita_iva_valid('00743110157')
+
+def test_partita_iva_invalid():
+    assert not partita_iva_valid('12345678901')
+    assert not partita_iva_valid('1234567890')
+    assert not partita_iva_valid('1234567890A')
+
+def test_codice_fiscale_azienda():
+    assert codice_fiscale_azienda_valid('00743110157')
+    assert codice_fiscale_azienda_valid('RSSMRA85T10A562S')
+    assert not codice_fiscale_azienda_valid('00743110158')
+
+def test_parse_date():
+    assert parse_date('01/02/1980') == date(1980, 2, 1)
+    assert parse_date('1.2.1980') == date(1980, 2, 1)
+    assert parse_date('01-02-1980') == date(1980, 2, 1)
+    assert parse_date('31/02/1980') is None
+    assert parse_date('01/02/80') is None
+
+def test_plausible_birth_date():
+    assert plausible_date('01/02/1980', today=TODAY)
+    assert not plausible_date('01/02/1880', today=TODAY)
+    assert not plausible_date('16/06/2024', today=TODAY)
+
+def test_plausible_expiry_date():
+    assert plausible_date('16/06/2030', future=True, today=TODAY)
+    assert plausible_date('15/06/2039', future=True, today=TODAY)
+    assert not plausible_date('01/01/2040', future=True, today=TODAY)
@@ -0,0 +1,163 @@
+"""
+Cache persistente su disco del testo estratto dai documenti
+Condivisa da app desktop, elaborazione batch e app Streamlit: la chiave è lo
+SHA-256 del contenuto del file più la configurazione di estrazione/OCR, quindi
+un file già elaborato con la stessa configurazione non viene riletto né
+ri-OCR-izzato. Le voci meno usate di recente vengono eliminate oltre il limite.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+# Configurazione tramite variabili d'ambiente
+DEFAULT_CACHE_DIR = Path(os.environ.get(
+    'DOC_EXTRACTOR_CACHE_DIR', Path.home() / '.cache' / 'visura-doc-extractor'))
+DEFAULT_MAX_MB = int(os.environ.get('DOC_EXTRACTOR_CACHE_MAX_MB', '256'))
+CACHE_ENABLED = os.environ.get('DOC_EXTRACTOR_CACHE', '1').lower() not in ('0', 'false', 'no')
+
+# Configurazioni di estrazione usate nelle chiavi della cache
+PDF_TEXT_CONFIG = 'pdf|PyPDF2|ocr-pagine-senza-testo'
+# Le visure lette solo fino ai campi principali hanno un testo parziale
+PDF_EARLY_STOP_CONFIG = 'stop-campi-visura'
+
+def ocr_config_key(lang, config='', preprocess='', engine='tesseract'):
+    """Costruisce la parte di chiave relativa alla configurazione OCR
+    (preprocess: chiave del preprocessing delle immagini, vuota se disattivato;
+    engine: etichetta del motore OCR)"""
+    key = f"ocr|{engine}|lang={lang}|{config}"
+    return f"{key}|{preprocess}" if preprocess else key
+
+def pdf_config_key(ocr_key, early_stop=False):
+    """Chiave per i PDF: il testo dipende anche dall'OCR delle pagine scansionate"""
+    if early_stop:
+        return f"{PDF_TEXT_CONFIG}|{PDF_EARLY_STOP_CONFIG}|{ocr_key}"
+    return f"{PDF_TEXT_CONFIG}|{ocr_key}"
+
+def image_bytes(image):
+    """Restituisce una rappresentazione in bytes di un'immagine PIL per la chiave"""
+    header = f"{image.mode}|{image.size[0]}x{image.size[1]}|".encode()
+    return header + image.tobytes()
+
+class TextCache:
+    """Cache testo estratto su SQLite con limite di dimensione ed eviction LRU"""
+
+    def __init__(self, cache_dir=None, max_mb=None, enabled=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = (max_mb if max_mb is not None else DEFAULT_MAX_MB) * 1024 * 1024
+        self.enabled = CACHE_ENABLED if enabled is None else enabled
+        self.db_path = self.cache_dir / 'text_cache.sqlite3'
+        self._initialized = False
+
+    def make_key(self, content, config):
+        """Chiave = SHA-256 del contenuto + configurazione di estrazione"""
+        digest = hashlib.sha256(content).hexdigest()
+        return hashlib.sha256(f"{digest}|{config}".encode()).hexdigest()
+
+    def _connect(self):
+        """Apre una connessione (una per operazione, sicura tra thread e processi)"""
+        if not self._initialized:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def get(self, key):
+        """Restituisce il testo in cache o None"""
+        if not self.enabled:
+            return None
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT text FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                    conn.commit()
+                return row[0] if row else None
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError):
+            # La cache non deve mai bloccare l'estrazione
+            return None
+
+    def put(self, key, text):
+        """Salva il testo in cache ed elimina le voci più vecchie oltre il limite"""
+        if not self.enabled:
+            return
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, text, size, time.time()))
+                self._evict(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError):
+            pass
+
+    def _evict(self, conn):
+        """Elimina le voci usate meno di recente finché la cache rientra nel limite"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def get_or_compute(self, content, config, compute):
+        """Restituisce il testo dalla cache oppure lo calcola con compute() e lo salva
+        (se compute() restituisce None il risultato non viene salvato)"""
+        if not self.enabled:
+            return compute()
+        key = self.make_key(content, config)
+        text = self.get(key)
+        if text is None:
+            text = compute()
+            if text is not None:
+                self.put(key, text)
+        return text
+
+    def clear(self):
+        """Svuota la cache"""
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM entries")
+                conn.commit()
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError):
+            pass
+
+_default_cache = None
+
+def get_default_cache():
+    """Restituisce la cache condivisa configurata dalle variabili d'ambiente"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TextCache()
+    return _default_cache
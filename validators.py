@@ -0,0 +1,83 @@
+"""
+Controlli di validità dei campi estratti
+Codice fiscale (carattere di controllo), partita IVA (cifra di controllo) e date
+plausibili: un campo che non passa il controllo è quasi sempre un errore di OCR.
+"""
+
+import re
+from datetime import date, datetime
+
+# Codice fiscale delle persone, con le lettere dell'omocodia al posto delle cifre
+_CF_FORMAT = re.compile(r'^[A-Z]{6}[0-9LMNPQRSTUV]{2}[ABCDEHLMPRST][0-9LMNPQRSTUV]{2}'
+                        r'[A-Z][0-9LMNPQRSTUV]{3}[A-Z]$')
+# Valori dei caratteri in posizione dispari (1a, 3a, ...) per il carattere di controllo
+_CF_ODD = dict(zip('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                   (1, 0, 5, 7, 9, 13, 15, 17, 19, 21,
+                    1, 0, 5, 7, 9, 13, 15, 17, 19, 21, 2, 4, 18, 20, 11, 3, 6, 8, 12, 14, 16,
+                    10, 22, 25, 24, 23)))
+# In posizione pari cifre e lettere valgono 0-9 e 0-25
+_CF_EVEN = {**{str(digit): digit for digit in range(10)},
+            **{chr(ord('A') + index): index for index in range(26)}}
+_DATE = re.compile(r'^(\d{1,2})[/\.\-](\d{1,2})[/\.\-](\d{4})$')
+
+# Date plausibili: nessun documento o nascita prima di questo anno, scadenze
+# al massimo tra questo numero di anni
+MIN_YEAR = 1900
+MAX_EXPIRY_YEARS = 15
+
+def codice_fiscale_check_char(code):
+    """Carattere di controllo dei primi 15 caratteri di un codice fiscale"""
+    total = sum(_CF_ODD[char] if index % 2 == 0 else _CF_EVEN[char]
+                for index, char in enumerate(code[:15]))
+    return chr(ord('A') + total % 26)
+
+def codice_fiscale_valid(code):
+    """True se il codice fiscale (persona fisica, 16 caratteri) è ben formato e il
+    carattere di controllo torna"""
+    code = code.strip().upper()
+    return bool(_CF_FORMAT.match(code)) and codice_fiscale_check_char(code) == code[15]
+
+def partita_iva_valid(number):
+    """True se la partita IVA (o il codice fiscale numerico di una società) ha 11 cifre
+    e la cifra di controllo torna"""
+    number = number.strip()
+    if len(number) != 11 or not number.isdigit():
+        return False
+    total = 0
+    for index, char in enumerate(number[:10]):
+        digit = int(char)
+        if index % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return (10 - total % 10) % 10 == int(number[10])
+
+def codice_fiscale_azienda_valid(code):
+    """Codice fiscale di un'impresa: 11 cifre (come la partita IVA) o 16 caratteri
+    (ditte individuali)"""
+    code = code.strip().upper()
+    return partita_iva_valid(code) if code.isdigit() else codice_fiscale_valid(code)
+
+def parse_date(value):
+    """Data gg/mm/aaaa (anche con . o -) come datetime.date, None se non valida"""
+    match = _DATE.match(value.strip())
+    if not match:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+def plausible_date(value, future=False, today=None):
+    """True se la data esiste ed è plausibile: dal MIN_YEAR a oggi, oppure fino a
+    MAX_EXPIRY_YEARS anni nel futuro per le scadenze (future=True)"""
+    parsed = parse_date(value)
+    if parsed is None:
+        return False
+    today = today or datetime.now().date()
+    latest = today.year + MAX_EXPIRY_YEARS if future else today.year
+    if parsed.year < MIN_YEAR or parsed.year > latest:
+        return False
+    return future or parsed <= today